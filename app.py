@@ -1,96 +1,111 @@
 # app.py
 
 import streamlit as st
-from utils.pdf_extractor import extract_text_from_pdf, extract_images_from_pdf, extract_table_from_text
-from utils.utils import save_figure
-from sql_queries.save_table_to_db import save_table_to_db
-import os
+from utils.metrics import logged_spans, stage_summary, start_metrics_server
+from utils.job_queue import job_queue, start_workers, upload_path
+from utils.report_parser import peaks_to_frame
+import time
 from config import read_config
 from utils.logger import app_logger as logger
 
 # Load config
 config = read_config()
-UPLOAD_DIR = config["paths"]["upload_dir"]
-IMAGE_DIR = config["paths"]["image_dir"]
 TABLE_NAME = config["database"]['table_name']
+QUEUE_CONFIG = config["queue"]
 
 st.title("📄 PDF Processor: Extract Images & Data")
 
+start_metrics_server()  # Only when [METRICS] PORT is set
+
+# Uploads are processed by the background job queue, so the page stays responsive
+# (each worker process loads the layout model while the user picks a file)
+if QUEUE_CONFIG["embedded_workers"]:
+    st.sidebar.caption(f"Job workers: {start_workers()} processes")
+
 # File Upload
 uploaded_file = st.file_uploader("Upload a PDF file", type=["pdf"])
 
 if uploaded_file:
-    try:
-
-        # Save uploaded file
-        pdf_path = os.path.join(UPLOAD_DIR, uploaded_file.name)
-        with open(pdf_path, "wb") as f:
-            f.write(uploaded_file.read())
-        logger.info(f"PDF file saved: {pdf_path}")
-
-
-        # Extract first page image
-        image_path = extract_images_from_pdf(pdf_path)
-        if image_path:
-            logger.info(f"Image extracted: {image_path}")
-        else:
-            logger.warning("No images found in PDF.")
+    # Every rerun sees the same uploaded file; queue it only once
+    upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+    if st.session_state.get("upload_key") != upload_key:
+        try:
+            # Save uploaded file
+            pdf_path = upload_path(uploaded_file.name)
+            with open(pdf_path, "wb") as f:
+                f.write(uploaded_file.read())
+            logger.info(f"PDF file saved: {pdf_path}")
+
+            # Extract and save in the background; identical PDFs are served from the result cache
+            job_id = job_queue.enqueue(pdf_path, TABLE_NAME)
+            if job_id is None:
+                st.warning("⚠ The server is busy processing other reports. Please try again in a minute.")
+            else:
+                st.session_state.upload_key = upload_key
+                st.session_state.job_id = job_id
 
-        # Detect and extract figure
-        figure_path = save_figure(os.path.basename(image_path)) if image_path else None
-        if figure_path:
-            logger.info(f"Figure extracted: {figure_path}")
-        else:
-            logger.warning("No figure detected in the extracted image.")
+        except Exception as e:
+            logger.error(f"Error queueing PDF: {e}")
+            st.error(f"An error occurred: {e}")
 
-        # Extract text and table
-        text = extract_text_from_pdf(pdf_path)
-        df, sample_id, report_generated = extract_table_from_text(text)
-        table_saved = False
+job = job_queue.get(st.session_state.job_id) if st.session_state.get("job_id") else None
 
+if job is not None and job["status"] == "queued":
+    st.info(f"⏳ Waiting to be processed ({job['position']} report(s) ahead)")
 
-        if df is not None:
-            
-            logger.info("Table extracted successfully.")
-            table_saved = save_table_to_db(sample_id, report_generated, df, TABLE_NAME)
+elif job is not None and job["status"] == "running":
+    st.info(f"⚙ Processing... ({time.time() - job['started_at']:.0f}s)")
 
+elif job is not None and job["status"] == "failed":
+    st.error(f"An error occurred: {job['error']}")
 
-            if table_saved:
-                logger.info("Data saved to the Database")
-                
-            else:
-                logger.error("Data not saved to Database")
-                
+elif job is not None:
+    result = job["result"]
+    table_saved = result["table_saved"]
+    samples = result["samples"]  # A run PDF holds several samples
+    st.caption(f"Report ID: {result['correlation_id']}")
+    if len(samples) > 1:
+        st.write(f"**{len(samples)} samples** in this report")
 
-        else:
-            logger.warning("No tabular data detected in the PDF.")
+    for sample in samples:
+        if len(samples) > 1:
+            st.subheader(f"Sample {sample['sample_id']} (page {(sample.get('page_number') or 0) + 1})")
 
         # Layout for Table (Left) & Image (Right)
         col1, col2 = st.columns([1, 1])
 
-        with col1:  # Left: Table  
+        with col1:  # Left: Table
             st.subheader("Sample Details")
-            st.write(f"**Sample ID:** {sample_id}")
-            st.write(f"**Report Generated:** {report_generated}")
-            if df is not None:
-                st.dataframe(df)
-
-                if table_saved:
-                    st.success("Data saved to the database")
-                else:
-                    st.error("⚠ Table data was extracted but could not be saved to the database.")
-
+            st.write(f"**Sample ID:** {sample['sample_id']}")
+            st.write(f"**Report Generated:** {sample['report_generated']}")
+            if sample["peaks"]:
+                st.dataframe(peaks_to_frame(sample["peaks"]))
             else:
                 st.warning("⚠ No tabular data detected.")
 
         with col2:  # Right: Figure
             st.subheader("📷 Extracted Figure")
-            if figure_path:
-                st.image(figure_path, caption="Extracted Figure", use_container_width =True)
+            if sample["figure_path"]:
+                st.image(sample["figure_path"], caption="Extracted Figure", use_container_width =True)
             else:
                 st.warning("⚠ No figure detected.")
 
-    except Exception as e:
-        logger.error(f"Error processing PDF: {e}")
-        st.error(f"An error occurred: {e}")
-
+    if any(sample["peaks"] for sample in samples):
+        if table_saved:
+            st.success("Data saved to the database")
+        else:
+            st.error("⚠ Table data was extracted but could not be saved to the database.")
+
+# Pipeline stats (all processes, most recent spans)
+with st.sidebar.expander("Pipeline stats"):
+    summary = stage_summary(spans=logged_spans())
+    if summary:
+        st.dataframe(summary, hide_index=True)
+    else:
+        st.caption("No pipeline activity yet.")
+    st.caption(f"Job queue: {job_queue.counts()}")
+
+# Poll until the queued job finishes
+if job is not None and job["status"] in ("queued", "running"):
+    time.sleep(1)
+    st.rerun()
@@ -2,99 +2,104 @@
 
 import streamlit as st
 import os
-import pandas as pd
+import time
 
-from utils.pdf_extractor import extract_text_from_pdf, extract_images_from_pdf, extract_table_from_text
-from utils.utils import save_figure
+from utils.metrics import logged_spans, stage_summary, start_metrics_server
+from utils.job_queue import job_queue, start_workers, upload_path
+from utils.image_store import image_store
 
-from sql_queries.save_table_to_db import save_table_to_db
-from sql_queries.fetch_data_from_database import fetch_data_from_db
+from sql_queries.dashboard_cache import get_date_range, get_sample_ids, get_sample_rows
 
 from utils.logger import app_logger as logger
 from config import read_config
 
 # Load config
 config = read_config()
-UPLOAD_DIR = config["paths"]["upload_dir"]
-IMAGE_DIR = config["paths"]["image_dir"]
 TABLE_NAME = config["database"]['table_name']
+QUEUE_CONFIG = config["queue"]
 
 # Initialize Streamlit App
 st.set_page_config(layout="wide")
 st.title("📊 Biorad Variant Turbo II - Results")
 
+start_metrics_server()  # Only when [METRICS] PORT is set
+
 # **Initialize Session State** for UI Refresh
 if "refresh_data" not in st.session_state:
     st.session_state.refresh_data = False
 
-# **File Upload Section**
-uploaded_file = st.file_uploader("Upload a PDF file", type=["pdf"])
-
-# **Process Uploaded File**
-if uploaded_file:
-    try:
-        # Save the uploaded PDF
-        pdf_path = os.path.join(UPLOAD_DIR, uploaded_file.name)
-        with open(pdf_path, "wb") as f:
-            f.write(uploaded_file.read())
-        logger.info(f"PDF saved: {pdf_path}")
-
-        # # Extract first page image
-        # image_path = extract_images_from_pdf(pdf_path)
-        # figure_path = save_figure(os.path.basename(image_path)) if image_path else None
-
-        # Extract the Image
-        image_path = extract_images_from_pdf(pdf_path)
-
-        # If an image path is successfully extracted, detect the image and save the figure
-        if image_path is not None:
-            figure_path = save_figure(os.path.basename(image_path))
-        else:
-            figure_path = None # Incase no figure is found
-
-
-        # Extract Text & Table
-        text = extract_text_from_pdf(pdf_path)
-        df_extracted, sample_id, report_generated = extract_table_from_text(text)
-
-        table_saved = False
-
-        # Check if the extracted data is valid before saving to the database
-        data_is_valid = (
-            df_extracted is not None  # Ensure the extracted table is not empty
-            and sample_id is not None  # Ensure a sample ID was found
-            and report_generated is not None  # Ensure a report date was found
-        )
-
-        if data_is_valid:
-            table_saved = save_table_to_db(sample_id, report_generated, df_extracted, TABLE_NAME)
-
-            if table_saved:
-                logger.info("Data successfully saved to the database.")
-                st.session_state.refresh_data = True  # Trigger UI refresh
+# **Background Processing** (worker processes load the layout model and process reports;
+# the dashboard stays usable meanwhile)
+if QUEUE_CONFIG["embedded_workers"]:
+    st.sidebar.caption(f"Job workers: {start_workers()} processes")
+
+# **File Upload Section** (a whole tray of reports can be selected at once)
+uploaded_files = st.file_uploader("Upload PDF files", type=["pdf"], accept_multiple_files=True)
+
+# **Queue Uploaded Files**
+if uploaded_files:
+    # Every rerun sees the same uploaded files; queue them only once
+    upload_key = ",".join(f"{uploaded_file.name}:{uploaded_file.size}" for uploaded_file in uploaded_files)
+    if st.session_state.get("upload_key") != upload_key:
+        try:
+            # Save the uploaded PDFs (unique names: two files of a batch may share one)
+            pdf_paths = []
+            for uploaded_file in uploaded_files:
+                pdf_path = upload_path(uploaded_file.name)
+                with open(pdf_path, "wb") as f:
+                    f.write(uploaded_file.read())
+                pdf_paths.append(pdf_path)
+                logger.info(f"PDF saved: {pdf_path}")
+
+            # Extract and save in the background; several files are processed in parallel and saved together.
+            # Identical PDFs are served from the result cache
+            if len(pdf_paths) == 1:
+                job_id = job_queue.enqueue(pdf_paths[0], TABLE_NAME)
             else:
-                logger.error("Failed to save data to the database.")
-        else:
-            logger.warning("⚠ Missing required data (table, sample ID, or report date).")
-
-
-    except Exception as e:
-        logger.error(f"Error processing PDF: {e}")
-        st.error(f"An error occurred: {e}")
-
-
-# **Fetch Data from Database**
-db_data = fetch_data_from_db(TABLE_NAME)
-
-if db_data:
-    df_db = pd.DataFrame(db_data)  # Convert to DataFrame
+                job_id = job_queue.enqueue_batch(pdf_paths, TABLE_NAME)
+            if job_id is None:
+                st.warning("⚠ The server is busy processing other reports. Please try again in a minute.")
+            else:
+                st.session_state.upload_key = upload_key
+                st.session_state.job_id = job_id
+
+        except Exception as e:
+            logger.error(f"Error queueing PDF: {e}")
+            st.error(f"An error occurred: {e}")
+
+# **Job Status**
+job = job_queue.get(st.session_state.job_id) if st.session_state.get("job_id") else None
+if job is not None:
+    label = os.path.basename(job["pdf_path"]) if not job["pdf_paths"] else f"{len(job['pdf_paths'])} reports"
+    if job["status"] == "queued":
+        st.info(f"⏳ {label}: waiting ({job['position']} job(s) ahead)")
+    elif job["status"] == "running":
+        st.info(f"⚙ {label}: processing ({time.time() - job['started_at']:.0f}s)")
+    if job["progress"]:
+        # Live per-file status of a multi-file upload
+        st.dataframe(job["progress"], hide_index=True)
+
+    if job["status"] in ("done", "failed"):
+        if job["status"] == "failed":
+            st.error(f"An error occurred: {job['error']}")
+        elif job["pdf_paths"]:
+            if any(row["status"] == "saved" for row in job["progress"] or []):
+                st.session_state.refresh_data = True
+            if any(row["status"] in ("failed", "save failed") for row in job["progress"] or []):
+                st.error("⚠ Some reports could not be processed or saved.")
+        elif job["result"]["table_saved"] and not job["result"]["cached"]:
+            st.session_state.refresh_data = True  # Trigger UI refresh
+            sample_ids = [sample["sample_id"] for sample in job["result"]["samples"]]
+            st.caption(f"Report ID: {job['result']['correlation_id']} · Sample ID(s): {', '.join(sample_ids)}")
+        st.session_state.job_id = None  # Report the outcome once
+
+
+# **Fetch Data from Database** (only what is rendered; cached until the TTL expires or new rows are saved)
+min_date, max_date = get_date_range(TABLE_NAME)
+
+if min_date is not None:
 
     # **Date Range Selection**
-    df_db["InRs_ReqDate"] = pd.to_datetime(df_db["InRs_ReqDate"], errors='coerce')
-    df_db = df_db.dropna(subset=["InRs_ReqDate"])
-
-    min_date = df_db["InRs_ReqDate"].min().date()
-    max_date = df_db["InRs_ReqDate"].max().date()
 
     col1, col2 = st.columns([1, 1])
     with col1:
@@ -106,18 +111,12 @@ if db_data:
     if start_date > end_date:
         st.error("'From Date' cannot be later than 'To Date'.")
     else:
-        # **Filter Data by Date Range**
-        df_filtered = df_db[
-            (df_db["InRs_ReqDate"].dt.date >= start_date) &
-            (df_db["InRs_ReqDate"].dt.date <= end_date)
-        ]
-
-        # **Sample ID Selection**
-        sample_ids = df_filtered["InRs_ReqNo"].unique()
+        # **Sample ID Selection** (distinct IDs in the date range)
+        sample_ids = get_sample_ids(TABLE_NAME, start_date, end_date)
         selected_sample_id = st.selectbox("Select Sample ID", sample_ids)
 
-        # **Filter Data by Sample ID**
-        df_sample_details = df_filtered[df_filtered["InRs_ReqNo"] == selected_sample_id].copy()
+        # **Fetch the selected sample only**
+        df_sample_details = get_sample_rows(TABLE_NAME, selected_sample_id, start_date, end_date)
         df_sample_results = df_sample_details[["InRs_Map_code", "InRs_Ret_Time"]].copy()
 
         # Rename columns for UI clarity
@@ -137,16 +136,35 @@ if db_data:
 
         with col3:
             st.subheader("📈 Chromatogram")
-            chromatogram_path = f"{IMAGE_DIR}/{selected_sample_id}_graph.jpg"
-            if os.path.exists(chromatogram_path):
-                st.image(chromatogram_path, caption="Extracted Figure", use_container_width =True)
+            # Figures are stored by content hash; the store's index maps sample IDs to them
+            chromatogram = image_store.figure_for_sample(selected_sample_id)
+            if chromatogram is not None:
+                # The thumbnail loads fast; the full-resolution figure only on request
+                if st.checkbox("Full resolution", key="chromatogram_full"):
+                    st.image(chromatogram["path"], caption="Extracted Figure", use_container_width =True)
+                else:
+                    st.image(chromatogram["thumb_path"], caption="Extracted Figure", use_container_width =True)
             else:
                 st.warning("⚠ No chromatogram available.")
 
 else:
     st.warning("⚠ No data available in the database. Please upload a PDF.")
 
+# **Pipeline Stats** (all processes, most recent spans)
+with st.sidebar.expander("Pipeline stats"):
+    summary = stage_summary(spans=logged_spans())
+    if summary:
+        st.dataframe(summary, hide_index=True)
+    else:
+        st.caption("No pipeline activity yet.")
+    st.caption(f"Job queue: {job_queue.counts()}")
+
 # **Success Message if Data is Saved**
 if "refresh_data" in st.session_state and st.session_state.refresh_data:
     st.success("Data saved successfully! Refresh to see updated results.")
     st.session_state.refresh_data = False  # Reset UI trigger
+
+# **Poll** until the queued report is processed
+if job is not None and job["status"] in ("queued", "running"):
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,163 @@
+# batch_ingest.py
+
+import argparse
+import glob
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+# Load config
+config = read_config()
+TABLE_NAME = config["database"]["table_name"]
+
+
+class FileTimeoutError(Exception):
+    """Raised inside a worker when a single PDF exceeds its time budget."""
+
+
+def _raise_timeout(signum, frame):
+    raise FileTimeoutError("Processing timed out")
+
+
+def init_worker():
+    """Runs once per worker process: imports the pipeline and loads the layout model, which the worker keeps."""
+    # Ctrl+C is handled by the parent process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import utils.pipeline  # noqa: F401
+    from utils.model import get_model
+    get_model()
+    logger.info(f"Worker {os.getpid()} ready")
+
+
+def ingest_file(pdf_path, table_name, timeout, pool_workers=1):
+    """
+    Runs extraction and the DB save for one PDF inside one of pool_workers
+    workers. Returns a small, picklable summary.
+    """
+    from utils.pipeline import ingest_pdf, pooled_page_workers
+
+    started = time.perf_counter()
+    summary = {"path": pdf_path, "status": "failed", "sample_id": None, "rows": 0, "error": None,
+               "correlation_id": None}
+
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+
+    try:
+        result = ingest_pdf(pdf_path, table_name, pooled_page_workers(pool_workers))
+        summary["sample_id"] = result["sample_id"]
+        summary["correlation_id"] = result["correlation_id"]  # Finds this file's spans in the JSON metrics log
+
+        if not result["data_is_valid"]:
+            summary["status"] = "skipped"
+            summary["error"] = "Missing required data (table, sample ID, or report date)"
+        elif result["cached"] and result["table_saved"]:
+            summary["status"] = "skipped"
+            summary["error"] = "Already ingested (identical PDF)"
+        elif result["table_saved"]:
+            summary["status"] = "ok"
+            summary["rows"] = result["row_count"]
+        else:
+            summary["error"] = "Failed to save data to the database"
+
+    except FileTimeoutError:
+        summary["status"] = "timeout"
+        summary["error"] = f"Exceeded {timeout}s"
+    except Exception as e:
+        summary["error"] = str(e)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def collect_pdfs(inputs, recursive=False):
+    """Expands directories, glob patterns and file paths into a sorted, de-duplicated list of PDFs."""
+    pdf_paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*.pdf") if recursive else os.path.join(item, "*.pdf")
+            matches = glob.glob(pattern, recursive=recursive)
+        else:
+            matches = glob.glob(item, recursive=recursive)
+        pdf_paths.update(os.path.abspath(path) for path in matches if path.lower().endswith(".pdf"))
+    return sorted(pdf_paths)
+
+
+def run_batch(pdf_paths, workers, timeout, table_name=TABLE_NAME):
+    """Processes the PDFs across a pool of pre-warmed workers and returns the per-file summaries."""
+    if timeout and not hasattr(signal, "SIGALRM"):
+        logger.warning("Per-file timeouts are not supported on this platform and will be ignored.")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = {executor.submit(ingest_file, path, table_name, timeout, workers): path for path in pdf_paths}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:  # Worker crashed (e.g. killed by the OS)
+                summary = {"path": futures[future], "status": "failed", "sample_id": None,
+                           "rows": 0, "error": str(e), "seconds": 0.0}
+            results.append(summary)
+
+            if summary["status"] == "ok":
+                logger.info(f"[{len(results)}/{len(pdf_paths)}] {summary['path']} -> "
+                            f"{summary['rows']} rows ({summary['seconds']:.2f}s)")
+            else:
+                logger.error(f"[{len(results)}/{len(pdf_paths)}] {summary['path']} -> "
+                             f"{summary['status']}: {summary['error']}")
+    return results
+
+
+def print_summary(results, elapsed):
+    """Prints throughput and the list of files that did not make it into the database."""
+    counts = {}
+    for summary in results:
+        counts[summary["status"]] = counts.get(summary["status"], 0) + 1
+
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    print("")
+    print(f"Processed {len(results)} files in {elapsed:.1f}s ({rate:.2f} files/s)")
+    print(f"  ok: {counts.get('ok', 0)}  skipped: {counts.get('skipped', 0)}  "
+          f"failed: {counts.get('failed', 0)}  timeout: {counts.get('timeout', 0)}")
+    print(f"  rows inserted: {sum(summary['rows'] for summary in results)}")
+
+    problems = [summary for summary in results if summary["status"] != "ok"]
+    for summary in sorted(problems, key=lambda s: s["path"]):
+        print(f"  {summary['status'].upper():8} {summary['path']}: {summary['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-ingest Variant Turbo II PDF reports into the database.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("-t", "--timeout", type=int, default=120, help="Per-file timeout in seconds (0 disables)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+    parser.add_argument("--table", default=TABLE_NAME, help="Target table name")
+    args = parser.parse_args(argv)
+
+    pdf_paths = collect_pdfs(args.inputs, args.recursive)
+    if not pdf_paths:
+        logger.error("No PDF files found.")
+        return 2
+
+    logger.info(f"Ingesting {len(pdf_paths)} PDFs with {args.workers} workers")
+    started = time.perf_counter()
+    results = run_batch(pdf_paths, max(1, args.workers), args.timeout, args.table)
+    print_summary(results, time.perf_counter() - started)
+
+    # Skipped files had nothing to save; only failures and timeouts are errors
+    return 1 if any(summary["status"] in ("failed", "timeout") for summary in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
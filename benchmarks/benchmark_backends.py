@@ -0,0 +1,67 @@
+# benchmarks/benchmark_backends.py
+#
+# Pages/sec of an inference backend against eager PyTorch on CPU, plus a
+# parity check that the first "Figure" box of every page matches eager within
+# a tolerance (exit code 1 if it does not). Run from the repository root:
+#   python -m benchmarks.benchmark_backends --backend onnx --quantize --threads 4
+#   python -m benchmarks.benchmark_backends --backend torchscript --max-input-size 800 images/*.jpg
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+from config import read_config
+from utils.inference import EagerBackend, check_parity, configure_threads, get_backend, get_predictor
+from utils.model import get_model
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(__file__), "..", "images", "V2TURBO_A1c_1_358_4912_0100924200.jpg")
+
+
+def pages_per_second(backend, images, repeats):
+    backend.predict(images[:1])  # Warm-up: first call pays for lazy initialisation
+    started = time.perf_counter()
+    for _ in range(repeats):
+        backend.predict(images)
+    return repeats * len(images) / (time.perf_counter() - started)
+
+
+def run(args):
+    configure_threads(args.threads, args.interop_threads)
+    model = get_model()
+    if model is None or get_predictor(model) is None:
+        print("A layoutparser Detectron2 model is required (see PATHS.MODEL_PATH).")
+        return 1
+
+    images = [cv2.imread(path) for path in args.images]  # BGR, as the model is fed
+    options = {"max_input_size": args.max_input_size}
+    if args.backend == "onnx":
+        options.update(quantize=args.quantize, intra_op_threads=args.threads, inter_op_threads=args.interop_threads)
+
+    passed, deviations = check_parity(model, images, args.backend, args.tolerance, **options)
+    for path, deviation in zip(args.images, deviations):
+        shown = "figure missing on one side" if deviation is None else f"{deviation:.1f}px"
+        print(f"{os.path.basename(path)}: max box deviation {shown}")
+
+    eager = pages_per_second(EagerBackend(get_predictor(model), args.max_input_size), images, args.repeats)
+    candidate = pages_per_second(get_backend(model, images[0], args.backend, **options), images, args.repeats)
+    print(f"eager        {eager:6.2f} pages/s")
+    print(f"{args.backend:<12} {candidate:6.2f} pages/s  ({candidate / eager:.2f}x)")
+    print(f"Parity (tolerance {args.tolerance}px): {'PASS' if passed else 'FAIL'}")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    inference_configuration = read_config()["inference"]
+    parser = argparse.ArgumentParser(description="Compare an inference backend with eager PyTorch on CPU.")
+    parser.add_argument("images", nargs="*", default=[SAMPLE_IMAGE], help="Page images (default: bundled sample)")
+    parser.add_argument("--backend", choices=["eager", "torchscript", "onnx"], default=inference_configuration["backend"])
+    parser.add_argument("--quantize", action="store_true", default=inference_configuration["quantize"])
+    parser.add_argument("--max-input-size", type=int, default=inference_configuration["max_input_size"])
+    parser.add_argument("--threads", type=int, default=inference_configuration["intra_op_threads"])
+    parser.add_argument("--interop-threads", type=int, default=inference_configuration["inter_op_threads"])
+    parser.add_argument("--tolerance", type=float, default=inference_configuration["parity_tolerance"])
+    parser.add_argument("--repeats", type=int, default=5)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,45 @@
+# benchmarks/benchmark_detection.py
+#
+# Pages/sec of the figure detector at different batch sizes on CPU.
+# Run from the repository root:
+#   python -m benchmarks.benchmark_detection --pages 32 --batch-sizes 1 4 8 16
+
+import argparse
+import os
+import time
+
+import cv2
+import torch
+
+from utils.utils import detect_figure_boxes
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(__file__), "..", "images", "V2TURBO_A1c_1_358_4912_0100924200.jpg")
+
+
+def run(pages, batch_sizes, image_path, threads):
+    if threads:
+        torch.set_num_threads(threads)
+
+    image = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
+    images = [image.copy() for _ in range(pages)]
+    print(f"{pages} pages of {image.shape[1]}x{image.shape[0]}, torch threads: {torch.get_num_threads()}")
+
+    # Warm-up so the first measurement does not pay for lazy initialisation
+    detect_figure_boxes(images[:1], batch_size=1)
+
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        boxes = detect_figure_boxes(images, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        found = sum(box is not None for box in boxes)
+        print(f"batch_size={batch_size:>3}  {pages / elapsed:6.2f} pages/s  ({elapsed:.2f}s, {found}/{pages} figures)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched figure detection on CPU.")
+    parser.add_argument("--pages", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--image", default=SAMPLE_IMAGE, help="Page image to replicate")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    args = parser.parse_args()
+    run(args.pages, args.batch_sizes, args.image, args.threads)
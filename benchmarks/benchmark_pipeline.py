@@ -0,0 +1,216 @@
+# benchmarks/benchmark_pipeline.py
+#
+# End-to-end benchmark on synthetic reports (benchmarks/synthetic_reports.py).
+# Times the pipeline the apps and workers run: utils.pipeline._read_pages
+# (page reading, figure detection and saving) over all reports, then
+# utils.pipeline.ingest_pdf report by report. Reports p50/p95 latency per
+# report and per stage (from the pipeline's own spans), reports/sec and peak
+# RSS. Results are written as JSON so runs can be compared across commits.
+# Run from the repository root:
+#   python -m benchmarks.benchmark_pipeline --reports 50
+#   python -m benchmarks.benchmark_pipeline --reports 50 --compare benchmarks/results/<previous>.json
+#
+# The run uses a copy of config.ini with the stub database backend and every
+# store (result cache, images, local mirror, metrics) in a temporary folder.
+
+import argparse
+import configparser
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic_reports import generate_reports
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# Stores whose configured location is replaced by the default inside the temporary folder
+STORE_OPTIONS = (("PATHS", "TRACE_DIR"), ("QUEUE", "PATH"), ("METRICS", "JSON_LOG"), ("METRICS", "PROMETHEUS_FILE"),
+                 ("QC", "PATH"), ("MIRROR", "PATH"), ("IMAGES", "STORE_DIR"))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def write_benchmark_config(work_dir, batch_size=None):
+    """
+    Writes a copy of the configuration (model, detection and image settings
+    kept) that saves rows with the stub backend and keeps every store in
+    work_dir. Returns its path.
+    """
+    configuration = configparser.ConfigParser()
+    configuration.read(os.environ.get("BIORAD_CONFIG") or os.path.join(REPO_DIR, "config.ini"))
+    for section, option in STORE_OPTIONS:
+        if configuration.has_section(section):
+            configuration.remove_option(section, option)
+
+    overrides = {
+        "PATHS": {"UPLOAD_DIR": os.path.join(work_dir, "uploads"), "IMAGE_DIR": os.path.join(work_dir, "images")},
+        "database": {"backend": "stub"},
+        "CACHE": {"CACHE_DIR": os.path.join(work_dir, "cache")},
+        "MIRROR": {"ENABLED": "yes"},
+        "METRICS": {"ENABLED": "yes", "PORT": "0"},
+    }
+    if batch_size:
+        overrides["DETECTION"] = {"BATCH_SIZE": str(batch_size)}
+    for section, values in overrides.items():
+        if not configuration.has_section(section):
+            configuration.add_section(section)
+        for option, value in values.items():
+            configuration.set(section, option, value)
+
+    path = os.path.join(work_dir, "config.ini")
+    with open(path, "w", encoding="utf-8") as f:
+        configuration.write(f)
+    return path
+
+
+def _summary(samples):
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def _stage_seconds(json_log, correlation_ids):
+    """Span durations per stage (seconds) of the given reports, from every process's lines in the JSON log."""
+    stages = defaultdict(list)
+    with open(json_log, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            # A detect span covers a batch: "id1,id2,..."
+            if set((record["correlation_id"] or "").split(",")) & correlation_ids:
+                stages[record["stage"]].append(record["duration_ms"] / 1000)
+    return stages
+
+
+def run(args, work_dir):
+    """Times _read_pages and ingest_pdf on synthetic reports; the configuration must already point at work_dir."""
+    # Imported here: they read the benchmark configuration on import
+    from config import read_config
+    from utils.model import get_model
+    from utils.metrics import new_correlation_id
+    from utils.pipeline import ingest_pdf, _read_pages
+    from utils.utils import BATCH_SIZE, PAGE_WORKERS
+
+    config = read_config()
+    page_workers = args.page_workers or PAGE_WORKERS
+    paths = generate_reports(os.path.join(work_dir, "reports"), args.reports, args.seed)
+    model_loaded = get_model() is not None  # Loading the model is not part of any report's time
+
+    started = time.perf_counter()
+    tasks = [(path, 0, new_correlation_id()) for path in paths]
+    pages = sum(result is not None for _, result in _read_pages(tasks, BATCH_SIZE, page_workers))
+    read_seconds = time.perf_counter() - started
+
+    end_to_end, correlation_ids = [], set()
+    failures = 0
+    started = time.perf_counter()
+    for path in paths:
+        report_started = time.perf_counter()
+        result = ingest_pdf(path, config["database"]["table_name"], page_workers)
+        end_to_end.append(time.perf_counter() - report_started)
+        correlation_ids.add(result["correlation_id"])
+        failures += not result["table_saved"] or result["figure_path"] is None
+    elapsed = time.perf_counter() - started
+
+    stages = _stage_seconds(config["metrics"]["json_log"], correlation_ids)
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "reports": len(paths),
+        "seed": args.seed,
+        "model_loaded": model_loaded,
+        "vector_locator": config["detection"]["vector_locator"],
+        "batch_size": BATCH_SIZE,
+        "page_workers": page_workers,
+        "detect_dpi": config["detection"]["detect_dpi"],
+        "figure_dpi": config["detection"]["figure_dpi"],
+        "image_format": config["images"]["format"],
+        "failures": failures,
+        "read_pages": {"pages": pages, "seconds": round(read_seconds, 3),
+                       "pages_per_sec": round(pages / read_seconds, 3)},
+        "stages": {stage: _summary(samples) for stage, samples in sorted(stages.items())},
+        "end_to_end": _summary(end_to_end),
+        "reports_per_sec": round(len(paths) / elapsed, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def print_results(results, previous=None):
+    print(f"{results['reports']} reports, model loaded: {results['model_loaded']}, "
+          f"page workers: {results['page_workers']}, failures: {results['failures']}")
+    line = f"_read_pages: {results['read_pages']['pages_per_sec']:.2f} pages/s"
+    if previous and previous.get("read_pages"):
+        line += f"   (was {previous['read_pages']['pages_per_sec']:.2f} pages/s)"
+    print(line)
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for stage, summary in list(results["stages"].items()) + [("end_to_end", results["end_to_end"])]:
+        line = f"{stage:<12}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['mean_ms']:>10.2f}"
+        if previous:
+            before = previous["end_to_end"] if stage == "end_to_end" else previous["stages"].get(stage)
+            if before and before["p50_ms"]:
+                line += f"   p50 {100 * (summary['p50_ms'] / before['p50_ms'] - 1):+.1f}%"
+        print(line)
+    line = f"ingest_pdf: {results['reports_per_sec']:.2f} reports/s, peak RSS {results['peak_rss_mb']:.1f} MB"
+    if previous:
+        line += (f"   (was {previous['reports_per_sec']:.2f} reports/s, {previous['peak_rss_mb']:.1f} MB"
+                 f" at {previous.get('commit')})")
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic PDFs.")
+    parser.add_argument("--reports", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, help="Pages per detection batch (default [DETECTION] BATCH_SIZE)")
+    parser.add_argument("--page-workers", type=int,
+                        help="Page reader processes, 1 = prefetch thread (default [DETECTION] PAGE_WORKERS)")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/pipeline-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="biorad-bench-") as work_dir:
+        os.environ["BIORAD_CONFIG"] = write_benchmark_config(work_dir, args.batch_size)
+        results = run(args, work_dir)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    print_results(results, previous)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline-{results['commit'] or 'unknown'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
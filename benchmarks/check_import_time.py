@@ -0,0 +1,74 @@
+# benchmarks/check_import_time.py
+#
+# Fails (exit 1) if importing the modules the Streamlit apps load at startup
+# takes longer than a budget, or pulls in a module that must stay lazy
+# (torch, the PDF/vision stack). Uses `python -X importtime` in a fresh
+# interpreter. Run from the repository root:
+#   python -m benchmarks.check_import_time --budget 1.0
+
+import argparse
+import subprocess
+import sys
+
+# What app.py / app2.py import before the first render (streamlit itself excluded)
+STARTUP_MODULES = ["config", "utils.logger", "utils.model", "utils.metrics", "utils.job_queue",
+                   "sql_queries.dashboard_cache"]
+
+# Must only be imported once a PDF is processed or the model is needed
+LAZY_MODULES = ["torch", "detectron2", "layoutparser", "cv2", "fitz", "pdf2image"]
+
+
+def profile_imports(modules):
+    """Returns ({top-level package: cumulative seconds}, set of every imported module) for a fresh interpreter."""
+    statement = f"import {', '.join(modules)}" if modules else "pass"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError("Import failed:\n" + "\n".join(errors))
+
+    cumulative, imported = {}, set()
+    for line in completed.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        imported.add(name.strip())
+        if not name[1:].startswith(" "):  # Nested imports are indented below their parent
+            cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return cumulative, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the app startup path.")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds allowed for all startup imports")
+    parser.add_argument("--modules", nargs="+", default=STARTUP_MODULES)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to print")
+    args = parser.parse_args()
+
+    cumulative, imported = profile_imports(args.modules)
+    # Interpreter startup (site, encodings, ...) is not ours to budget
+    baseline, _ = profile_imports([])
+    cumulative = {name: seconds for name, seconds in cumulative.items() if name not in baseline}
+    total = sum(cumulative.values())
+
+    for name, seconds in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{seconds:8.3f}s  {name}")
+    print(f"Total: {total:.3f}s (budget {args.budget:.3f}s)")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total > args.budget:
+        print(f"FAIL: startup imports exceed the budget by {total - args.budget:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/synthetic_reports.py
+#
+# Generates synthetic Variant Turbo II reports with PyMuPDF: the Sample ID and
+# Report Generated header, a vector chromatogram with retention-time ticks and
+# the A1a/A1b/LA1c/A1c/P3/P4/Ao peak table, laid out like the analyser export.
+# Output is fully determined by the seed. Run from the repository root:
+#   python -m benchmarks.synthetic_reports /tmp/reports --count 50 --seed 1
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+import fitz  # PyMuPDF
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, points
+PLOT_RECT = fitz.Rect(80, 160, 540, 380)
+TIME_AXIS_MAX = 1.6  # minutes
+TRACE_SEGMENTS = 400
+
+# Peak name -> typical retention time (min), area % and peak area
+PEAKS = [
+    ("A1a", 0.163, 0.9, 11234),
+    ("A1b", 0.234, 1.2, 15234),
+    ("LA1c", 0.394, 1.8, 20321),
+    ("A1c", 0.513, None, 55000),
+    ("P3", 0.794, 3.3, 40000),
+    ("P4", 0.862, 1.1, 13000),
+    ("Ao", 1.385, 85.7, 990000),
+]
+
+
+def _peak_rows(rng):
+    """Peak table rows with jittered values, formatted as the analyser prints them."""
+    rows = []
+    for name, retention_time, area_percent, peak_area in PEAKS:
+        retention_time = retention_time * rng.uniform(0.97, 1.03)
+        peak_area = int(peak_area * rng.uniform(0.8, 1.2))
+        if name == "A1c":
+            ngsp, area = f"{rng.uniform(4.5, 9.5):.1f}", "---"
+        else:
+            ngsp, area = "---", f"{area_percent * rng.uniform(0.8, 1.2):.1f}"
+        rows.append((name, ngsp, area, f"{retention_time:.3f}", str(peak_area)))
+    return rows
+
+
+def _trace_points(rows):
+    """Chromatogram polyline in page coordinates: one Gaussian per peak on a flat baseline."""
+    largest = max(int(row[4]) for row in rows)
+    points = []
+    for i in range(TRACE_SEGMENTS + 1):
+        minutes = TIME_AXIS_MAX * i / TRACE_SEGMENTS
+        signal = 0.02
+        for _, _, _, retention_time, peak_area in rows:
+            # Small peaks are drawn taller than their share so they stay visible
+            height = 0.15 + 0.8 * (int(peak_area) / largest) ** 0.5
+            signal += height * 2.718281828 ** (-((minutes - float(retention_time)) / 0.018) ** 2)
+        x = PLOT_RECT.x0 + PLOT_RECT.width * minutes / TIME_AXIS_MAX
+        y = PLOT_RECT.y1 - PLOT_RECT.height * min(signal, 1.0)
+        points.append(fitz.Point(x, y))
+    return points
+
+
+def make_report(path, sample_id, report_generated, rng):
+    """Writes one single-page report PDF to path and returns its peak rows."""
+    rows = _peak_rows(rng)
+    with fitz.open() as doc:
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_text((72, 60), "VARIANT II TURBO   HbA1c Kit - 2.0", fontsize=12)
+        page.insert_text((72, 90), f"Sample ID: {sample_id}", fontsize=11)
+        page.insert_text((72, 110), f"Report Generated: {report_generated}", fontsize=11)
+
+        # Axes, then the trace as a single path (as the analyser draws it)
+        shape = page.new_shape()
+        shape.draw_line(PLOT_RECT.bl, PLOT_RECT.br)
+        shape.draw_line(PLOT_RECT.bl, PLOT_RECT.tl)
+        for tick in range(9):
+            x = PLOT_RECT.x0 + PLOT_RECT.width * tick / 8
+            shape.draw_line((x, PLOT_RECT.y1), (x, PLOT_RECT.y1 + 4))
+        shape.finish(color=(0, 0, 0), width=1)
+        shape.draw_polyline(_trace_points(rows))
+        shape.finish(color=(0, 0, 0.6), width=0.8, closePath=False)
+        shape.commit()
+        for tick in range(9):
+            x = PLOT_RECT.x0 + PLOT_RECT.width * tick / 8
+            page.insert_text((x - 10, PLOT_RECT.y1 + 16), f"{TIME_AXIS_MAX * tick / 8:.2f}", fontsize=8)
+        page.insert_text((PLOT_RECT.x0 + PLOT_RECT.width / 2 - 25, PLOT_RECT.y1 + 32), "Time (min.)", fontsize=9)
+
+        # Peak table
+        columns = [72, 150, 220, 290, 420]
+        y = 440
+        for x, header in zip(columns, ["Peak Name", "NGSP %", "Area %", "Retention Time (min)", "Peak Area"]):
+            page.insert_text((x, y), header, fontsize=10)
+        for row in rows:
+            y += 18
+            for x, value in zip(columns, row):
+                page.insert_text((x, y), value, fontsize=10)
+
+        doc.save(path, garbage=3, deflate=True)
+    return rows
+
+
+def generate_reports(directory, count, seed=0):
+    """Writes count reports into directory (same seed, same files). Returns the PDF paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    first_report = datetime(2024, 9, 10, 8, 0)
+    paths = []
+    for i in range(count):
+        sample_id = str(100000000 + rng.randrange(900000000))
+        report_generated = (first_report + timedelta(minutes=3 * i)).strftime("%d/%m/%Y %H:%M")
+        path = os.path.join(directory, f"V2TURBO_A1c_{i:05d}_{sample_id}.pdf")
+        make_report(path, sample_id, report_generated, rng)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Variant Turbo II report PDFs.")
+    parser.add_argument("directory")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"Wrote {len(generate_reports(args.directory, args.count, args.seed))} reports to {args.directory}")
@@ -2,18 +2,26 @@
 
 
 import configparser
+import functools
 import os
 from utils.logger import app_logger as logger
 
+
+@functools.lru_cache(maxsize=None)
 def read_config():
+    """
+    Loads and validates config.ini (or the file named by BIORAD_CONFIG) once
+    per process; later calls return the same dict. Treat it as read-only.
+    read_config.cache_clear() forces a reload. See config.sample.ini.
+    """
     # Initialize the config parser
     configuration = configparser.ConfigParser()
-    configuration_path = os.path.join(os.path.dirname(__file__), 'config.ini')
+    configuration_path = os.environ.get("BIORAD_CONFIG") or os.path.join(os.path.dirname(__file__), 'config.ini')
 
     # Validate if config.ini exists
     if not os.path.exists(configuration_path):
-        logger.error("config.ini file not found!")
-        raise FileNotFoundError("config.ini file not found!")
+        logger.error(f"{configuration_path} not found! Copy config.sample.ini to config.ini.")
+        raise FileNotFoundError(f"{configuration_path} not found!")
 
     # Read the configuration file
     configuration.read(configuration_path)
@@ -23,19 +31,26 @@ def read_config():
         UPLOAD_DIR = configuration["PATHS"]["UPLOAD_DIR"]
         IMAGE_DIR = configuration["PATHS"]["IMAGE_DIR"]
         MODEL_PATH = configuration["PATHS"]["MODEL_PATH"]
+        TRACE_DIR = configuration["PATHS"].get("TRACE_DIR", os.path.join(IMAGE_DIR, "traces"))
 
         # Ensure directories exist
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         os.makedirs(IMAGE_DIR, exist_ok=True)
+        os.makedirs(TRACE_DIR, exist_ok=True)
         logger.info("Directories validated and created if not existing.")
 
         # Extract database configurations
-        database_configuration = {
-            "server": configuration["database"]["server"],
-            "database": configuration["database"]["database"],
-            "driver": configuration["database"]["driver"],
-            "table_name": configuration["database"]["table_name"],
-        }
+        # BACKEND = stub saves rows to a local SQLite file instead of SQL Server (local testing without a server)
+        database_backend = configuration.get("database", "backend", fallback="sqlserver")
+        if database_backend not in ("sqlserver", "stub"):
+            raise ValueError(f"database.backend must be 'sqlserver' or 'stub', got {database_backend!r}")
+        database_configuration = {"backend": database_backend,
+                                  "table_name": configuration["database"]["table_name"]}
+        for key in ("server", "database", "driver"):
+            if database_backend == "sqlserver":
+                database_configuration[key] = configuration["database"][key]
+            else:
+                database_configuration[key] = configuration["database"].get(key, "")
 
         # Check if username and password exist (SQL Authentication)
         if "username" in configuration["database"] and "password" in configuration["database"]:
@@ -44,16 +59,205 @@ def read_config():
         else:
             database_configuration["trusted_connection"] = configuration["database"].get("trusted_connection", "yes")
 
+        # Optional connection pool settings
+        pool_configuration = {
+            "max_size": configuration.getint("database", "pool_max_size", fallback=5),
+            "idle_timeout": configuration.getfloat("database", "pool_idle_timeout", fallback=300.0),
+            "health_check_after": configuration.getfloat("database", "pool_health_check_after", fallback=30.0),
+            "checkout_timeout": configuration.getfloat("database", "pool_checkout_timeout", fallback=30.0),
+        }
+
+        # Optional watch-folder settings; watch_folder.py needs EXPORT_DIR, the instrument's export folder
+        watch_configuration = {
+            "export_dir": configuration.get("WATCH", "EXPORT_DIR", fallback=None),
+            "state_file": configuration.get("WATCH", "STATE_FILE",
+                                            fallback=os.path.join(UPLOAD_DIR, ".ingested.json")),
+            "workers": configuration.getint("WATCH", "WORKERS", fallback=2),
+            "settle_seconds": configuration.getfloat("WATCH", "SETTLE_SECONDS", fallback=2.0),
+            "poll_interval": configuration.getfloat("WATCH", "POLL_INTERVAL", fallback=1.0),
+        }
+
+        # Optional result cache settings
+        cache_configuration = {
+            "cache_dir": configuration.get("CACHE", "CACHE_DIR", fallback=os.path.join(UPLOAD_DIR, ".cache")),
+            "max_mb": configuration.getfloat("CACHE", "MAX_MB", fallback=256.0),
+            "max_age_days": configuration.getfloat("CACHE", "MAX_AGE_DAYS", fallback=30.0),
+            "dashboard_ttl": configuration.getfloat("CACHE", "DASHBOARD_TTL", fallback=300.0),
+        }
+
+        # Optional background job queue for the apps
+        queue_configuration = {
+            "path": configuration.get("QUEUE", "PATH", fallback=os.path.join(cache_configuration["cache_dir"], "jobs.sqlite")),
+            "workers": configuration.getint("QUEUE", "WORKERS", fallback=2),
+            # Uploads are refused while this many jobs are waiting (admission control)
+            "max_pending": configuration.getint("QUEUE", "MAX_PENDING", fallback=20),
+            "poll_interval": configuration.getfloat("QUEUE", "POLL_INTERVAL", fallback=0.5),
+            # Start the worker processes from the Streamlit process; set to no when `python -m utils.job_queue` runs them
+            "embedded_workers": configuration.getboolean("QUEUE", "EMBEDDED_WORKERS", fallback=True),
+            "keep_days": configuration.getfloat("QUEUE", "KEEP_DAYS", fallback=7.0),
+            # A job whose worker process died this many times is failed instead of requeued
+            "max_attempts": configuration.getint("QUEUE", "MAX_ATTEMPTS", fallback=3),
+        }
+
+        # Optional pipeline metrics (per-stage spans)
+        metrics_directory = os.path.join(cache_configuration["cache_dir"], "metrics")
+        metrics_configuration = {
+            "enabled": configuration.getboolean("METRICS", "ENABLED", fallback=True),
+            # JSON lines, one per span, appended by every process
+            "json_log": configuration.get("METRICS", "JSON_LOG", fallback=os.path.join(metrics_directory, "spans.jsonl")),
+            # Rotated at this size, keeping JSON_LOG_BACKUPS older files (spans.jsonl.1, ...)
+            "json_log_max_mb": configuration.getfloat("METRICS", "JSON_LOG_MAX_MB", fallback=50.0),
+            "json_log_backups": configuration.getint("METRICS", "JSON_LOG_BACKUPS", fallback=3),
+            # Prometheus text format (node_exporter textfile collector)
+            "prometheus_file": configuration.get("METRICS", "PROMETHEUS_FILE",
+                                                 fallback=os.path.join(metrics_directory, "pipeline.prom")),
+            "port": configuration.getint("METRICS", "PORT", fallback=0),  # /metrics endpoint, 0 = off
+            "recent_spans": configuration.getint("METRICS", "RECENT_SPANS", fallback=1000),
+        }
+
+        # Optional daily QC aggregates (trend page), updated by every save
+        qc_configuration = {
+            "enabled": configuration.getboolean("QC", "ENABLED", fallback=True),
+            "path": configuration.get("QC", "PATH", fallback=os.path.join(cache_configuration["cache_dir"],
+                                                                          "qc_aggregates.sqlite")),
+        }
+
+        # Optional headless HTTP ingestion service (ingest_server.py)
+        service_configuration = {
+            "host": configuration.get("SERVICE", "HOST", fallback="0.0.0.0"),
+            "port": configuration.getint("SERVICE", "PORT", fallback=8080),
+            # Uploads received at the same time; more are answered with 503
+            "max_uploads": configuration.getint("SERVICE", "MAX_UPLOADS", fallback=4),
+            "max_upload_mb": configuration.getfloat("SERVICE", "MAX_UPLOAD_MB", fallback=50.0),
+            # A client that sends nothing for this long is disconnected
+            "read_timeout": configuration.getfloat("SERVICE", "READ_TIMEOUT", fallback=30.0),
+            "retry_after": configuration.getint("SERVICE", "RETRY_AFTER", fallback=5),  # Seconds, on 429/503
+        }
+
+        # Optional local mirror of the results table
+        mirror_configuration = {
+            "enabled": configuration.getboolean("MIRROR", "ENABLED", fallback=False),
+            "path": configuration.get("MIRROR", "PATH", fallback=os.path.join(UPLOAD_DIR, ".mirror", "results.sqlite")),
+            # Where the dashboard reads from: "server" or "mirror"
+            "dashboard_source": configuration.get("MIRROR", "DASHBOARD_SOURCE", fallback="server"),
+        }
+        if mirror_configuration["dashboard_source"] not in ("server", "mirror"):
+            raise ValueError(f"MIRROR.DASHBOARD_SOURCE must be 'server' or 'mirror', "
+                             f"got {mirror_configuration['dashboard_source']!r}")
+
+        # Optional figure detection settings
+        detection_configuration = {
+            "batch_size": configuration.getint("DETECTION", "BATCH_SIZE", fallback=4),
+            # Processes reading/rendering pages ahead of detection (PyMuPDF is not thread-safe); 1 = one prefetch thread.
+            # Shared by the workers of a job queue, batch or watch-folder pool (at least one prefetch thread each)
+            "page_workers": configuration.getint("DETECTION", "PAGE_WORKERS", fallback=2),
+            # Locate the chromatogram from the PDF's vector drawings before running the model
+            "vector_locator": configuration.getboolean("DETECTION", "VECTOR_LOCATOR", fallback=True),
+            "locator_min_iou": configuration.getfloat("DETECTION", "LOCATOR_MIN_IOU", fallback=0.7),
+            # Pages are rendered at DETECT_DPI for the layout model; only the figure is rendered at FIGURE_DPI
+            "detect_dpi": configuration.getint("DETECTION", "DETECT_DPI", fallback=96),
+            "figure_dpi": configuration.getint("DETECTION", "FIGURE_DPI", fallback=300),
+        }
+
+        # Optional image store settings (chromatogram crops, page renders and thumbnails)
+        images_configuration = {
+            "store_dir": configuration.get("IMAGES", "STORE_DIR", fallback=os.path.join(IMAGE_DIR, "store")),
+            # "webp" or "png"; WebP is lossless unless LOSSLESS = no (then QUALITY applies)
+            "format": configuration.get("IMAGES", "FORMAT", fallback="webp"),
+            "lossless": configuration.getboolean("IMAGES", "LOSSLESS", fallback=True),
+            "quality": configuration.getint("IMAGES", "QUALITY", fallback=90),
+            "thumbnail_px": configuration.getint("IMAGES", "THUMBNAIL_PX", fallback=320),
+            # Full-page renders are deleted after this many days; figures too when FIGURE_RETENTION_DAYS > 0
+            "page_retention_days": configuration.getfloat("IMAGES", "PAGE_RETENTION_DAYS", fallback=30.0),
+            "figure_retention_days": configuration.getfloat("IMAGES", "FIGURE_RETENTION_DAYS", fallback=0.0),
+        }
+        if images_configuration["format"] not in ("webp", "png"):
+            raise ValueError(f"IMAGES.FORMAT must be 'webp' or 'png', got {images_configuration['format']!r}")
+        if not 1 <= images_configuration["quality"] <= 100:
+            raise ValueError(f"IMAGES.QUALITY must be between 1 and 100, got {images_configuration['quality']}")
+
+        # Optional report parser settings
+        parser_configuration = {
+            # Peak names of the report's peak table (comma-separated)
+            "peaks": [name.strip() for name in configuration.get(
+                "PARSER", "PEAKS", fallback="A1a, A1b, LA1c, A1c, P3, P4, Ao").split(",") if name.strip()],
+        }
+        if not parser_configuration["peaks"]:
+            raise ValueError("PARSER.PEAKS must list at least one peak name")
+
+        # Optional CPU inference settings for the layout model
+        inference_configuration = {
+            # "eager" (PyTorch), "torchscript" (traced export) or "onnx" (ONNX Runtime)
+            "backend": configuration.get("INFERENCE", "BACKEND", fallback="eager"),
+            "quantize": configuration.getboolean("INFERENCE", "QUANTIZE", fallback=False),  # int8, onnx only
+            "intra_op_threads": configuration.getint("INFERENCE", "INTRA_OP_THREADS", fallback=0),  # 0 = default
+            "inter_op_threads": configuration.getint("INFERENCE", "INTER_OP_THREADS", fallback=0),
+            # Cap on the longest edge of the model input in pixels (0 = the model's own resize only)
+            "max_input_size": configuration.getint("INFERENCE", "MAX_INPUT_SIZE", fallback=0),
+            "export_dir": configuration.get("INFERENCE", "EXPORT_DIR",
+                                            fallback=os.path.join(os.path.dirname(MODEL_PATH), "exports")),
+            "parity_tolerance": configuration.getfloat("INFERENCE", "PARITY_TOLERANCE", fallback=8.0),
+        }
+        if inference_configuration["backend"] not in ("eager", "torchscript", "onnx"):
+            raise ValueError(f"INFERENCE.BACKEND must be 'eager', 'torchscript' or 'onnx', "
+                             f"got {inference_configuration['backend']!r}")
+        for setting in ("intra_op_threads", "inter_op_threads", "max_input_size"):
+            if inference_configuration[setting] < 0:
+                raise ValueError(f"INFERENCE.{setting.upper()} cannot be negative, got {inference_configuration[setting]}")
+
+        if metrics_configuration["json_log_max_mb"] <= 0:
+            raise ValueError(f"METRICS.JSON_LOG_MAX_MB must be positive, got {metrics_configuration['json_log_max_mb']}")
+
+        # The apps queue what they save in UPLOAD_DIR; watching it would ingest every upload twice
+        if watch_configuration["export_dir"] and \
+                os.path.abspath(watch_configuration["export_dir"]) == os.path.abspath(UPLOAD_DIR):
+            raise ValueError("WATCH.EXPORT_DIR must be the instrument's export folder, not PATHS.UPLOAD_DIR")
+
+        # Validate numeric settings that must be positive
+        for setting, value in (("database.pool_max_size", pool_configuration["max_size"]),
+                               ("WATCH.WORKERS", watch_configuration["workers"]),
+                               ("DETECTION.BATCH_SIZE", detection_configuration["batch_size"]),
+                               ("DETECTION.PAGE_WORKERS", detection_configuration["page_workers"]),
+                               ("DETECTION.DETECT_DPI", detection_configuration["detect_dpi"]),
+                               ("DETECTION.FIGURE_DPI", detection_configuration["figure_dpi"]),
+                               ("METRICS.RECENT_SPANS", metrics_configuration["recent_spans"]),
+                               ("METRICS.JSON_LOG_BACKUPS", metrics_configuration["json_log_backups"]),
+                               ("QUEUE.WORKERS", queue_configuration["workers"]),
+                               ("QUEUE.MAX_PENDING", queue_configuration["max_pending"]),
+                               ("QUEUE.MAX_ATTEMPTS", queue_configuration["max_attempts"]),
+                               ("SERVICE.PORT", service_configuration["port"]),
+                               ("SERVICE.MAX_UPLOADS", service_configuration["max_uploads"]),
+                               ("IMAGES.THUMBNAIL_PX", images_configuration["thumbnail_px"])):
+            if value < 1:
+                raise ValueError(f"{setting} must be at least 1, got {value}")
+
         logger.info("Configuration successfully loaded.")
         return {
             "paths": {
                 "upload_dir": UPLOAD_DIR,
                 "image_dir": IMAGE_DIR,
                 "model_path": MODEL_PATH,
+                "trace_dir": TRACE_DIR,
             },
             "database": database_configuration,
+            "pool": pool_configuration,
+            "watch": watch_configuration,
+            "cache": cache_configuration,
+            "detection": detection_configuration,
+            "images": images_configuration,
+            "parser": parser_configuration,
+            "mirror": mirror_configuration,
+            "qc": qc_configuration,
+            "inference": inference_configuration,
+            "metrics": metrics_configuration,
+            "queue": queue_configuration,
+            "service": service_configuration,
         }
     
     except KeyError as e:
         logger.error(f"Missing key in config.ini: {e}")
         raise ValueError(f"Missing key in config.ini: {e}")
+
+    except ValueError as e:
+        logger.error(f"Invalid value in config.ini: {e}")
+        raise
@@ -1,6 +1,11 @@
 # db_connection.py
 
-import pyodbc
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 from config import read_config
 from utils.logger import app_logger as logger  # Import logger
 
@@ -32,7 +37,9 @@ def connect_to_database():
             )
             auth_type = "Windows Authentication"
 
-        # Establish Connection
+        # Establish Connection (the ODBC driver is only needed for SQL Server, not the stub backend)
+        import pyodbc
+
         conn = pyodbc.connect(connection_string)
         logger.info(f"Successfully connected to SQL Server ({auth_type}) - {database_configuration['server']}/{database_configuration['database']}")
         return conn
@@ -41,6 +48,158 @@ def connect_to_database():
         logger.error(f"Database connection error: {e}")
         return None
 
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pyodbc connections.
+    - At most max_size connections are open (idle + borrowed) at any time.
+    - Idle connections older than idle_timeout are closed.
+    - A connection idle for longer than health_check_after is pinged before reuse.
+    - Connections marked broken (invalidate) are closed instead of being returned.
+    """
+
+    def __init__(self, factory, max_size=5, idle_timeout=300.0, health_check_after=30.0, checkout_timeout=30.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()      # (connection, last used), most recently used on the right
+        self._borrowed = 0
+        self._broken = set()      # id() of borrowed connections that must not be reused
+        self._condition = threading.Condition()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check, reconnecting: {e}")
+            return False
+
+    def _expire_idle(self):
+        # Oldest connections sit on the left
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            self._close(self._idle.popleft()[0])
+
+    def acquire(self):
+        """Borrows a connection, opening one if needed. Returns None if no connection could be made."""
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._condition:
+            while True:
+                self._expire_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._borrowed < self.max_size:
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error(f"No database connection available after {self.checkout_timeout}s")
+                    return None
+                self._condition.wait(remaining)
+            self._borrowed += 1
+
+        # Network work happens outside the lock
+        if conn is not None and time.monotonic() - last_used > self.health_check_after and not self._is_healthy(conn):
+            self._close(conn)
+            conn = None
+        if conn is None:
+            conn = self.factory()
+        if conn is None:
+            with self._condition:
+                self._borrowed -= 1
+                self._condition.notify()
+        return conn
+
+    def invalidate(self, conn):
+        """Marks a borrowed connection as broken; it is closed when released."""
+        with self._condition:
+            self._broken.add(id(conn))
+
+    def release(self, conn):
+        """Returns a borrowed connection to the pool (or closes it if it was invalidated)."""
+        broken = False
+        try:
+            conn.rollback()  # Never hand out a connection with an open (implicit) transaction
+        except Exception:
+            broken = True
+
+        with self._condition:
+            self._borrowed -= 1
+            if broken or id(conn) in self._broken:
+                self._broken.discard(id(conn))
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        """Closes every idle connection (borrowed ones are closed when released)."""
+        with self._condition:
+            while self._idle:
+                self._close(self._idle.popleft()[0])
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool_configuration = read_config()["pool"]
+            _pool = ConnectionPool(
+                connect_to_database,
+                max_size=pool_configuration["max_size"],
+                idle_timeout=pool_configuration["idle_timeout"],
+                health_check_after=pool_configuration["health_check_after"],
+                checkout_timeout=pool_configuration["checkout_timeout"],
+            )
+            atexit.register(_pool.close_all)
+        return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrows a connection from the pool for the duration of a with-block.
+    Yields None if the database is unreachable. An exception escaping the
+    block discards the connection so the next caller gets a fresh one.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    if conn is None:
+        yield None
+        return
+    try:
+        yield conn
+    except Exception:
+        pool.invalidate(conn)
+        raise
+    finally:
+        pool.release(conn)
+
+
+def invalidate_connection(conn):
+    """Call from an error handler when a borrowed connection may be unusable (reconnect on next use)."""
+    get_pool().invalidate(conn)
+
+
 # Test Connection when running this file directly
 if __name__ == "__main__":
     connect_to_database()
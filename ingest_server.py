@@ -0,0 +1,323 @@
+# ingest_server.py
+#
+# Headless HTTP ingestion for the LIS and the instruments (asyncio, standard library only):
+#   POST /reports          body: one PDF, optionally ?filename=<name>.pdf (Content-Length or chunked)
+#                          -> 202 {"job_id": 12, "status_url": "/jobs/12"}
+#   GET  /jobs/<id>        job status and, once done, the extracted result
+#   GET  /samples/<id>     saved rows of a sample and its chromatogram
+#   GET  /health           job counts and uploads in progress
+# Bodies are streamed to UPLOAD_DIR in chunks and handed to the persistent job
+# queue, whose workers run the extraction, figure saving and DB write. While
+# [SERVICE] MAX_UPLOADS bodies are being received a new upload gets 503; while
+# [QUEUE] MAX_PENDING reports are waiting it gets 429. Both carry Retry-After.
+#
+#   python ingest_server.py --port 8080
+#
+# With [database] BACKEND = stub rows are saved to a local SQLite file instead of SQL Server.
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config import read_config
+from sql_queries.dashboard_cache import get_sample_rows
+from utils.image_store import image_store
+from utils.job_queue import job_queue, start_workers, stop_workers, upload_path
+from utils.metrics import start_metrics_server
+from utils.report_parser import TABLE_COLUMNS
+from utils.logger import app_logger as logger
+
+# Load config
+config = read_config()
+UPLOAD_DIR = config["paths"]["upload_dir"]
+TABLE_NAME = config["database"]["table_name"]
+QUEUE_CONFIG = config["queue"]
+SERVICE_CONFIG = config["service"]
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADERS = 100
+
+
+class HttpError(Exception):
+    """Ends the request with this status; retry_after is sent as Retry-After (seconds)."""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _peak_rows(sample):
+    return dict(sample, peaks=[dict(zip(TABLE_COLUMNS, peak.as_tuple())) for peak in sample["peaks"]])
+
+
+def _job_payload(job):
+    """Job dict from the queue as JSON-ready data; peaks become {column: value} rows."""
+    payload = {key: job[key] for key in ("id", "status", "position", "created_at", "started_at", "finished_at",
+                                         "error", "progress")}
+    result = job["result"]
+    if result is not None:
+        result = _peak_rows(result)
+        result["samples"] = [_peak_rows(sample) for sample in result["samples"]]
+    payload["result"] = result
+    return payload
+
+
+class IngestService:
+    """
+    Receives report uploads over HTTP and queues them for the job workers.
+    At most max_uploads bodies are received at the same time; the job queue
+    decides whether a received report is admitted. Runs on one event loop;
+    every blocking call (SQLite, result lookups, writing body chunks to disk)
+    goes to the default executor.
+    """
+
+    def __init__(self, upload_dir=UPLOAD_DIR, table_name=TABLE_NAME, max_uploads=SERVICE_CONFIG["max_uploads"],
+                 max_upload_mb=SERVICE_CONFIG["max_upload_mb"], read_timeout=SERVICE_CONFIG["read_timeout"],
+                 retry_after=SERVICE_CONFIG["retry_after"]):
+        self.upload_dir = upload_dir
+        self.table_name = table_name
+        self.max_uploads = max_uploads
+        self.max_bytes = int(max_upload_mb * 1024 * 1024)
+        self.read_timeout = read_timeout
+        self.retry_after = retry_after
+        self.active_uploads = 0  # Only changed on the event loop, so no lock is needed
+
+    async def _read(self, awaitable):
+        """Awaits one read from the client; a client that stalls for read_timeout is dropped."""
+        return await asyncio.wait_for(awaitable, self.read_timeout)
+
+    async def _in_executor(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _read_head(self, reader):
+        request_line = await self._read(reader.readline())
+        if not request_line:
+            raise ConnectionResetError("Client closed the connection")
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HttpError(400, "Malformed request line")
+        method, target, _ = parts
+
+        headers = {}
+        for _ in range(MAX_HEADERS):
+            line = await self._read(reader.readline())
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, separator, value = line.decode("latin-1").partition(":")
+            if not separator:
+                raise HttpError(400, "Malformed header")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HttpError(400, "Too many headers")
+
+        url = urlsplit(target)
+        return method.upper(), unquote(url.path), parse_qs(url.query), headers
+
+    async def _read_exactly(self, reader, size):
+        """Yields the next size bytes of the body in chunks of at most CHUNK_SIZE."""
+        if size < 0:
+            raise HttpError(400, "Negative body size")  # reader.read(-1) would buffer everything up to EOF
+        while size:
+            chunk = await self._read(reader.read(min(CHUNK_SIZE, size)))
+            if not chunk:
+                raise HttpError(400, "Request body ended early")
+            size -= len(chunk)
+            yield chunk
+
+    async def _body(self, reader, headers):
+        """Yields the request body chunk by chunk (Content-Length or chunked transfer encoding)."""
+        if "chunked" not in headers.get("transfer-encoding", "").lower():
+            async for chunk in self._read_exactly(reader, int(headers["content-length"])):
+                yield chunk
+            return
+        while True:
+            size_line = await self._read(reader.readline())
+            try:
+                size = int(size_line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, "Malformed chunk size")
+            if size == 0:
+                while await self._read(reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # Trailers are ignored
+                return
+            async for chunk in self._read_exactly(reader, size):
+                yield chunk
+            await self._read(reader.readexactly(2))  # CRLF after each chunk
+
+    def _check_upload_headers(self, headers):
+        # Content-Type is not checked (clients send all sorts); the body must start with %PDF-
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            return
+        if "content-length" not in headers:
+            raise HttpError(411, "Content-Length or chunked transfer encoding is required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > self.max_bytes:
+            raise HttpError(413, f"Reports are limited to {self.max_bytes} bytes")
+
+    async def _upload(self, query, headers, reader, writer):
+        if self.active_uploads >= self.max_uploads:
+            raise HttpError(503, "Too many uploads in progress", self.retry_after)
+        self.active_uploads += 1
+        try:
+            return await self._receive(query, headers, reader, writer)
+        finally:
+            self.active_uploads -= 1
+
+    async def _receive(self, query, headers, reader, writer):
+        self._check_upload_headers(headers)
+        # Refuse before the body is sent when the queue is already full
+        if await self._in_executor(job_queue.pending_reports) >= job_queue.max_pending:
+            raise HttpError(429, "Job queue is full", self.retry_after)
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+
+        # Instruments often reuse file names; upload_path keeps concurrent uploads apart
+        pdf_path = upload_path(query.get("filename", [headers.get("x-filename", "report.pdf")])[0], self.upload_dir)
+        name = os.path.basename(pdf_path)
+        part_path = f"{pdf_path}.part"
+        received, head = 0, b""
+        try:
+            with open(part_path, "wb") as f:
+                async for chunk in self._body(reader, headers):
+                    received += len(chunk)
+                    if received > self.max_bytes:
+                        raise HttpError(413, f"Reports are limited to {self.max_bytes} bytes")
+                    head += chunk[:5 - len(head)]
+                    await self._in_executor(f.write, chunk)
+            if not head.startswith(b"%PDF-"):
+                raise HttpError(415, "Request body is not a PDF")
+            os.replace(part_path, pdf_path)  # The workers never see a partial file
+        except BaseException:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            raise
+
+        job_id = await self._in_executor(job_queue.enqueue, pdf_path, self.table_name)
+        if job_id is None:
+            os.remove(pdf_path)
+            raise HttpError(429, "Job queue is full", self.retry_after)
+        logger.info(f"Upload {name} ({received} bytes) queued as job {job_id}")
+        return 202, {"job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+    async def _route(self, method, path, query, headers, reader, writer):
+        if path == "/reports":
+            if method != "POST":
+                raise HttpError(405, "Use POST to upload a report")
+            return await self._upload(query, headers, reader, writer)
+        if method != "GET":
+            raise HttpError(405, "Only GET is supported here")
+
+        match = re.fullmatch(r"/jobs/(\d+)", path)
+        if match:
+            job = await self._in_executor(job_queue.get, int(match.group(1)))
+            if job is None:
+                raise HttpError(404, "Unknown job")
+            return 200, _job_payload(job)
+
+        match = re.fullmatch(r"/samples/([^/]+)", path)
+        if match:
+            sample_id = match.group(1)
+            rows = await self._in_executor(get_sample_rows, self.table_name, sample_id)
+            if rows.empty:
+                raise HttpError(404, "No results for this sample")
+            figure = await self._in_executor(image_store.figure_for_sample, sample_id)
+            return 200, {"sample_id": sample_id, "figure": figure,
+                         "rows": json.loads(rows.to_json(orient="records", date_format="iso"))}
+
+        if path == "/health":
+            counts = await self._in_executor(job_queue.counts)
+            return 200, {"jobs": counts, "uploads_in_progress": self.active_uploads,
+                         "max_uploads": self.max_uploads, "max_pending": job_queue.max_pending}
+        raise HttpError(404, "Not found")
+
+    async def _respond(self, writer, status, payload, retry_after=None):
+        body = json.dumps(payload, default=str).encode()
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        if retry_after:
+            head.append(f"Retry-After: {retry_after}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        """One request per connection."""
+        method, path = "-", "-"
+        try:
+            try:
+                method, path, query, headers = await self._read_head(reader)
+                status, payload = await self._route(method, path, query, headers, reader, writer)
+                await self._respond(writer, status, payload)
+            except HttpError as e:
+                if e.status in (429, 503):
+                    logger.warning(f"{method} {path}: {e.status} {e}")
+                await self._respond(writer, e.status, {"error": str(e)}, e.retry_after)
+            except ValueError as e:  # Header line longer than the stream limit
+                await self._respond(writer, 400, {"error": str(e)})
+            except asyncio.TimeoutError:
+                logger.warning(f"{method} {path}: client sent nothing for {self.read_timeout}s")
+                await self._respond(writer, 408, {"error": "Request timed out"})
+            except Exception as e:
+                logger.error(f"{method} {path} failed: {e}")
+                await self._respond(writer, 500, {"error": "Internal error"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # Client went away; nothing to answer
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host=SERVICE_CONFIG["host"], port=SERVICE_CONFIG["port"]):
+        """Serves until SIGINT/SIGTERM."""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info(f"Ingestion service listening on http://{host}:{port}")
+        async with server:
+            await stop.wait()
+        logger.info("Ingestion service stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service that accepts PDF reports and queues them.")
+    parser.add_argument("--host", default=SERVICE_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVICE_CONFIG["port"])
+    parser.add_argument("--max-uploads", type=int, default=SERVICE_CONFIG["max_uploads"],
+                        help="Uploads received at the same time before answering 503")
+    parser.add_argument("-w", "--workers", type=int, default=QUEUE_CONFIG["workers"],
+                        help="Job worker processes started by this service (unless [QUEUE] EMBEDDED_WORKERS = no)")
+    args = parser.parse_args(argv)
+
+    if QUEUE_CONFIG["embedded_workers"]:
+        start_workers(args.workers)
+    start_metrics_server()  # Only when [METRICS] PORT is set
+
+    try:
+        asyncio.run(IngestService(max_uploads=args.max_uploads).serve(args.host, args.port))
+    finally:
+        stop_workers()  # Let each worker finish its current report
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# pages/QC_Trends.py
+
+import datetime
+
+import streamlit as st
+
+from sql_queries.dashboard_cache import get_qc_machines, get_qc_trend
+from sql_queries.qc_aggregates import combine_stats
+from config import read_config
+
+# Load config
+config = read_config()
+PEAK_NAMES = list(config["parser"]["peaks"])
+
+METRICS = {"NGSP": "NGSP (%)", "InRs_Result": "Area (%)", "InRs_Ret_Time": "Retention Time (min)"}
+ALL_MACHINES = "All machines"
+DEFAULT_DAYS = 90
+
+# Initialize Streamlit Page (reads only the daily QC aggregates, never the results table)
+st.set_page_config(layout="wide")
+st.title("📈 QC Trends")
+
+# **Selection**
+col1, col2, col3 = st.columns([1, 1, 1])
+with col1:
+    peak = st.selectbox("Peak", PEAK_NAMES, index=PEAK_NAMES.index("A1c") if "A1c" in PEAK_NAMES else 0)
+with col2:
+    metric = st.selectbox("Metric", list(METRICS), format_func=METRICS.get)
+with col3:
+    machine = st.selectbox("Machine", [ALL_MACHINES] + list(get_qc_machines()))
+
+today = datetime.date.today()
+col1, col2 = st.columns([1, 1])
+with col1:
+    start_date = st.date_input("From Date", today - datetime.timedelta(days=DEFAULT_DAYS), format="DD/MM/YYYY")
+with col2:
+    end_date = st.date_input("To Date", today, format="DD/MM/YYYY")
+
+if start_date > end_date:
+    st.error("'From Date' cannot be later than 'To Date'.")
+    st.stop()
+
+df = get_qc_trend(peak, metric, None if machine == ALL_MACHINES else machine, start_date, end_date)
+if df is None:
+    st.error("❌ QC aggregates could not be read.")
+    st.stop()
+if df.empty:
+    st.warning("⚠ No QC data for this selection. Upload reports or rebuild the aggregates.")
+    st.stop()
+
+# **Summary** (daily statistics pooled over the range)
+count, mean, sd = combine_stats(df)
+col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+col1.metric("Results", count)
+col2.metric("Mean", f"{mean:.3f}")
+col3.metric("SD", f"{sd:.3f}" if sd is not None else "–")
+col4.metric("CV", f"{100 * sd / mean:.1f}%" if sd is not None and mean else "–")
+
+# **Levey-Jennings Chart** (daily mean per machine with the range mean and ±2/±3 SD limits)
+chart = df.pivot_table(index="day", columns="machine", values="mean")
+chart.columns = [f"Mean {column}" for column in chart.columns]
+if sd is not None:
+    for k in (-3, -2, 2, 3):
+        chart[f"{k:+d} SD"] = mean + k * sd
+chart["Range mean"] = mean
+st.line_chart(chart)
+
+# **Daily Statistics** (days whose mean is more than 2 SD from the range mean are flagged)
+table = df[["day", "machine", "count", "mean", "sd", "min", "max"]].copy()
+table["day"] = table["day"].dt.date
+table["flag"] = ""
+if sd:
+    deviation = (table["mean"] - mean).abs() / sd
+    table.loc[deviation > 2, "flag"] = "> 2 SD"
+    table.loc[deviation > 3, "flag"] = "> 3 SD"
+st.subheader("🗓 Daily Statistics")
+st.dataframe(table.rename(columns={"day": "Day", "machine": "Machine", "count": "Count", "mean": "Mean", "sd": "SD",
+                                   "min": "Min", "max": "Max", "flag": "Flag"}), hide_index=True)
@@ -0,0 +1,119 @@
+# sql_queries/dashboard_cache.py
+
+import os
+import threading
+import time
+
+import pandas as pd
+
+from config import read_config
+from sql_queries import dashboard_queries, local_mirror, qc_aggregates
+from utils.metrics import span
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+CACHE_CONFIG = config["cache"]
+DASHBOARD_TTL = CACHE_CONFIG["dashboard_ttl"]
+
+# The dashboard reads either SQL Server or the local mirror; both expose the same functions.
+# The stub database backend saves into the mirror file, so it is read from there too.
+use_mirror = config["mirror"]["dashboard_source"] == "mirror" or config["database"]["backend"] == "stub"
+source = local_mirror if use_mirror else dashboard_queries
+
+# Touched by every writer (any process) after a commit; readers compare its mtime
+VERSION_FILE = os.path.join(CACHE_CONFIG["cache_dir"], "results.version")
+
+SAMPLE_COLUMNS = ["InRs_ReqNo", "InRs_ReqDate", "InRs_Machine", "InRs_Result", "InRs_Map_code", "InRs_Ret_Time"]
+
+_cache = {}  # key -> (expires at, data version, value)
+_cache_lock = threading.Lock()
+
+
+def _data_version():
+    try:
+        return os.stat(VERSION_FILE).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def bump_data_version():
+    """Invalidates every cached dashboard query, in this and other processes. Call after committing rows."""
+    with _cache_lock:
+        _cache.clear()
+    try:
+        os.makedirs(os.path.dirname(VERSION_FILE), exist_ok=True)
+        with open(VERSION_FILE, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+    except OSError as e:
+        logger.error(f"Could not bump dashboard data version: {e}")
+
+
+def _cached(key, loader, source_name=None):
+    """Returns the cached value for key if it is fresh and no write happened since; otherwise reloads it."""
+    version = _data_version()
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] > now and entry[1] == version:
+        return entry[2]
+
+    source_name = source_name or source.__name__.rsplit(".", 1)[-1]
+    with span("db_fetch", query=key[0], source=source_name) as stage:
+        value = loader()
+        if value is None:
+            stage["outcome"] = "no_result"  # Failed query or empty table
+    if value is not None:  # Never cache a failed query
+        with _cache_lock:
+            _cache[key] = (now + DASHBOARD_TTL, version, value)
+    return value
+
+
+def get_date_range(table_name):
+    """(first, last) report date as datetime.date, or (None, None)."""
+    def load():
+        first, last = source.fetch_date_range(table_name)
+        if first is None:
+            return None
+        return pd.to_datetime(first).date(), pd.to_datetime(last).date()
+    return _cached(("date_range", table_name), load) or (None, None)
+
+
+def get_sample_ids(table_name, start_date, end_date):
+    """Distinct sample IDs in the date range (tuple)."""
+    def load():
+        sample_ids = source.fetch_sample_ids(table_name, start_date, end_date)
+        return tuple(sample_ids) if sample_ids is not None else None
+    return _cached(("sample_ids", table_name, start_date, end_date), load) or ()
+
+
+def get_sample_rows(table_name, sample_id, start_date=None, end_date=None):
+    """Rows of one sample as a DataFrame with a typed InRs_ReqDate column. Returns a copy the caller may modify."""
+    if sample_id is None:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+
+    def load():
+        df = source.fetch_result_frame(table_name, SAMPLE_COLUMNS, start_date=start_date, end_date=end_date,
+                                       sample_id=sample_id)
+        if df is None:
+            return None
+        df["InRs_ReqDate"] = pd.to_datetime(df["InRs_ReqDate"], errors="coerce")
+        return df
+    df = _cached(("sample_rows", table_name, sample_id, start_date, end_date), load)
+    return df.copy() if df is not None else pd.DataFrame(columns=SAMPLE_COLUMNS)
+
+
+def get_qc_machines():
+    """Machines that have QC aggregates (tuple)."""
+    def load():
+        machines = qc_aggregates.fetch_machines()
+        return tuple(machines) if machines is not None else None
+    return _cached(("qc_machines",), load, "qc_aggregates") or ()
+
+
+def get_qc_trend(peak, metric, machine=None, start_date=None, end_date=None):
+    """Daily QC statistics of one peak and metric (see qc_aggregates.fetch_daily_stats), or None on error."""
+    def load():
+        return qc_aggregates.fetch_daily_stats(peak, metric, machine, start_date, end_date)
+    df = _cached(("qc_trend", peak, metric, machine, start_date, end_date), load, "qc_aggregates")
+    return df.copy() if df is not None else None
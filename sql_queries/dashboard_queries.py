@@ -0,0 +1,190 @@
+# sql_queries/dashboard_queries.py
+
+from datetime import datetime, time, timedelta
+
+import pandas as pd
+
+from db_connection import pooled_connection, invalidate_connection
+from utils.logger import app_logger as logger
+
+# Columns returned to the dashboard (same as fetch_data_from_db)
+RESULT_COLUMNS = [
+    "InRs_Machine", "InRs_ReqDate", "InRs_ReqNo", "InRs_Map_code",
+    "InRs_Test_Code", "InRs_Test_Sub_Code", "InRs_Result",
+    "InRs_Act_Result", "InRs_ResDate", "InRs_ResTime", "InRs_Status",
+    "InRs_Status_DT", "InRs_Accept_Status", "InRs_Ret_Time", "InRs_SlNo",
+]
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _run_query(query, params=()):
+    """Executes a parameterised SELECT on a pooled connection. Returns (columns, rows) or None on error."""
+    with pooled_connection() as conn:
+        if conn is None:
+            logger.error("Database connection failed. Cannot run query.")
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, *params)
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
+            cursor.close()
+            return columns, rows
+        except Exception as e:
+            logger.error(f"Error executing query: {e}")
+            invalidate_connection(conn)
+            return None
+
+
+def _day_start(value, next_day=False):
+    """Midnight of a date (or of the following day); datetimes are used as given."""
+    if isinstance(value, datetime):
+        return value
+    if next_day:
+        value = value + timedelta(days=1)
+    return datetime.combine(value, time.min)
+
+
+def build_filters(start_date=None, end_date=None, sample_id=None, machine=None):
+    """WHERE clauses and parameters for the common filters. Dates are inclusive calendar days."""
+    clauses, params = [], []
+    if start_date is not None:
+        clauses.append("InRs_ReqDate >= ?")
+        params.append(_day_start(start_date))
+    if end_date is not None:
+        # Half-open range so the whole end day is included and the index stays usable
+        clauses.append("InRs_ReqDate < ?")
+        params.append(_day_start(end_date, next_day=True))
+    if sample_id is not None:
+        clauses.append("InRs_ReqNo = ?")
+        params.append(sample_id)
+    if machine is not None:
+        clauses.append("InRs_Machine = ?")
+        params.append(machine)
+    return clauses, params
+
+
+def fetch_date_range(table_name, machine=None):
+    """Earliest and latest InRs_ReqDate, as (min, max), or (None, None) if the table is empty."""
+    clauses, params = build_filters(machine=machine)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    result = _run_query(f"SELECT MIN(InRs_ReqDate), MAX(InRs_ReqDate) FROM {table_name} {where}", params)
+    if result is None or not result[1]:
+        return None, None
+    return tuple(result[1][0])
+
+
+def fetch_sample_ids(table_name, start_date=None, end_date=None, machine=None):
+    """Distinct sample IDs in the date range, newest report first (for the sample selectbox)."""
+    clauses, params = build_filters(start_date, end_date, machine=machine)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    result = _run_query(
+        f"""
+        SELECT InRs_ReqNo, MAX(InRs_ReqDate) AS Last_ReqDate
+        FROM {table_name}
+        {where}
+        GROUP BY InRs_ReqNo
+        ORDER BY Last_ReqDate DESC, InRs_ReqNo
+        """,
+        params,
+    )
+    if result is None:
+        return None
+    return [row[0] for row in result[1]]
+
+
+def fetch_results(table_name, start_date=None, end_date=None, sample_id=None, machine=None,
+                  after=None, page_size=DEFAULT_PAGE_SIZE, columns=None):
+    """
+    One page of result rows ordered by (InRs_ReqDate, InRs_SlNo), as a list of dicts.
+    Keyset pagination: pass the returned next key as `after` to get the following
+    page. Returns (rows, next_key); next_key is None on the last page, rows is
+    None on a database error.
+    """
+    columns = list(columns or RESULT_COLUMNS)
+    # The keyset columns are always selected so the next key can be built
+    selected = columns + [col for col in ("InRs_ReqDate", "InRs_SlNo") if col not in columns]
+
+    clauses, params = build_filters(start_date, end_date, sample_id, machine)
+    if after is not None:
+        clauses.append("(InRs_ReqDate > ? OR (InRs_ReqDate = ? AND InRs_SlNo > ?))")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    result = _run_query(
+        f"""
+        SELECT TOP (?) {", ".join(selected)}
+        FROM {table_name}
+        {where}
+        ORDER BY InRs_ReqDate, InRs_SlNo
+        """,
+        [page_size] + params,
+    )
+    if result is None:
+        return None, None
+
+    names, rows = result
+    records = [dict(zip(names, row)) for row in rows]
+    next_key = None
+    if len(records) == page_size:
+        last = records[-1]
+        next_key = (last["InRs_ReqDate"], last["InRs_SlNo"])
+    return [{col: record[col] for col in columns} for record in records], next_key
+
+
+def iter_results(table_name, page_size=DEFAULT_PAGE_SIZE, **filters):
+    """Yields every matching row, fetching one keyset page at a time."""
+    after = None
+    while True:
+        rows, after = fetch_results(table_name, after=after, page_size=page_size, **filters)
+        if rows is None:
+            return
+        yield from rows
+        if after is None:
+            return
+
+
+def iter_result_frames(table_name, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, start_date=None, end_date=None,
+                       sample_id=None, machine=None, order_by="InRs_ReqDate, InRs_SlNo"):
+    """
+    Streams matching rows as DataFrames of at most chunk_size rows, reading
+    with cursor.fetchmany so the full result never sits in Python objects.
+    Only the requested columns are selected. DECIMAL columns become float64
+    and DATETIME columns datetime64. Database errors are raised to the
+    consumer (the borrowed connection is discarded).
+    """
+    columns = list(columns or RESULT_COLUMNS)
+    clauses, params = build_filters(start_date, end_date, sample_id, machine)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = f"ORDER BY {order_by}" if order_by else ""
+    query = f"SELECT {', '.join(columns)} FROM {table_name} {where} {order}"
+
+    with pooled_connection() as conn:
+        if conn is None:
+            raise ConnectionError("Database connection failed. Cannot run query.")
+        cursor = conn.cursor()
+        cursor.arraysize = chunk_size
+        cursor.execute(query, *params)
+        names = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            # pyodbc Rows are not tuples; coerce_float turns Decimal into float64
+            yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=names, coerce_float=True)
+        cursor.close()
+
+
+def fetch_result_frame(table_name, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """All matching rows as one DataFrame (built chunk by chunk, see iter_result_frames), or None on error."""
+    columns = list(columns or RESULT_COLUMNS)
+    try:
+        frames = list(iter_result_frames(table_name, columns, chunk_size, **filters))
+    except Exception as e:
+        logger.error(f"Error streaming query results: {e}")
+        return None
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
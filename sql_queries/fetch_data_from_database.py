@@ -1,20 +1,23 @@
 
-# Import the database connection function
-from db_connection import connect_to_database  
+# Import the pooled database connection
+from db_connection import pooled_connection, invalidate_connection
 
 
 
 def fetch_data_from_db(table_name = "AI_InRs_Interface_Result_T" ):
 
     
-    # Step 1: Connect to the database
-    conn = connect_to_database()
-    
-    if conn is None:
-        print(" Failed to connect to the database.")
-        return None  # If connection fails, return None
-    else:
-        print("Database connection successful!")
+    # Step 1: Borrow a connection from the pool
+    with pooled_connection() as conn:
+
+        if conn is None:
+            print(" Failed to connect to the database.")
+            return None  # If connection fails, return None
+
+        return _fetch_rows(conn, table_name)
+
+
+def _fetch_rows(conn, table_name):
 
     # Step 2: Try executing the query
     try:
@@ -50,9 +53,8 @@ def fetch_data_from_db(table_name = "AI_InRs_Interface_Result_T" ):
             for row in rows:
                 result.append(dict(zip(columns, row)))
             
-            # Close the connection before returning data
+            # Close the cursor before returning data (the connection goes back to the pool)
             cursor.close()
-            conn.close()
             
             print(f"Successfully fetched {len(rows)} rows from table: {table_name}")
             return result  # Return the fetched data
@@ -60,11 +62,11 @@ def fetch_data_from_db(table_name = "AI_InRs_Interface_Result_T" ):
         else:
             print(f"No data found in table: {table_name}")
             cursor.close()
-            conn.close()
             return []  # Return an empty list if no data is found
 
     except Exception as e:
         print(f"Error executing query: {e}")
+        invalidate_connection(conn)  # Reconnect on next use
         return None  # Return None if an error occurs
 
 # Run this script directly to test fetching data
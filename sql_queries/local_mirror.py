@@ -0,0 +1,198 @@
+# sql_queries/local_mirror.py
+#
+# Local SQLite copy of the results table. save_tables_to_db writes through
+# to it, and sync_from_server() catches up on rows inserted elsewhere using
+# InRs_SlNo as a high-water mark. The read functions mirror the signatures
+# of sql_queries.dashboard_queries so the dashboard can use either source.
+#
+#   python -m sql_queries.local_mirror --sync
+
+import argparse
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+
+from config import read_config
+from sql_queries.dashboard_queries import RESULT_COLUMNS, DEFAULT_CHUNK_SIZE, build_filters
+from utils.report_parser import parse_report_date
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+MIRROR_CONFIG = config["mirror"]
+TABLE_NAME = config["database"]["table_name"]
+
+MIRROR_COLUMNS = RESULT_COLUMNS + ["NGSP", "Peak_Area"]
+DATE_COLUMNS = ["InRs_ReqDate", "InRs_ResDate", "InRs_Status_DT"]
+KEY_COLUMNS = ["InRs_Machine", "InRs_ReqNo", "InRs_ReqDate", "InRs_Map_code"]
+
+_initialised = False
+
+
+@contextmanager
+def _connect():
+    global _initialised
+    os.makedirs(os.path.dirname(MIRROR_CONFIG["path"]), exist_ok=True)
+    conn = sqlite3.connect(MIRROR_CONFIG["path"], timeout=30)
+    try:
+        with conn:  # Commits on success, rolls back on error
+            if not _initialised:
+                _create_schema(conn)
+                _initialised = True
+            yield conn
+    finally:
+        conn.close()
+
+
+def _create_schema(conn):
+    conn.execute("PRAGMA journal_mode=WAL")  # Readers (dashboard) do not block the writer (sync)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS results ({', '.join(MIRROR_COLUMNS)}, "
+                 f"UNIQUE ({', '.join(KEY_COLUMNS)}))")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_results_reqdate ON results (InRs_ReqDate, InRs_SlNo)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_results_reqno ON results (InRs_ReqNo, InRs_ReqDate)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_results_slno ON results (InRs_SlNo)")
+
+
+def _to_sqlite(value):
+    """Dates as sortable ISO text, DECIMAL as float."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _upsert(conn, columns, rows):
+    update = ", ".join(f"{col} = excluded.{col}" for col in columns if col not in KEY_COLUMNS)
+    conn.executemany(
+        f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET {update}",
+        rows,
+    )
+
+
+def mirror_rows(columns, rows):
+    """Write-through from save_tables_to_db: upserts rows (tuples in `columns` order) into the mirror."""
+    if MIRROR_CONFIG["enabled"]:
+        store_rows(columns, rows)
+
+
+def store_rows(columns, rows):
+    """Upserts rows (tuples in `columns` order) into the mirror file. Returns True on success."""
+    date_index = columns.index("InRs_ReqDate")
+    prepared = []
+    for row in rows:
+        row = list(row)
+        # Datetimes from save_tables_to_db or day-first text, stored the way synced rows are
+        parsed = parse_report_date(row[date_index])
+        row[date_index] = _to_sqlite(parsed) if parsed is not None else row[date_index]
+        prepared.append(tuple(_to_sqlite(value) for value in row))
+    try:
+        with _connect() as conn:
+            _upsert(conn, columns, prepared)
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Could not write rows to the local mirror: {e}")
+        return False
+
+
+def sync_from_server(table_name=TABLE_NAME, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Copies server rows with InRs_SlNo above the mirror's high-water mark. Returns the number of rows copied."""
+    from db_connection import pooled_connection  # Only needed when a server is configured
+
+    with _connect() as conn:
+        high_water_mark = conn.execute("SELECT COALESCE(MAX(InRs_SlNo), 0) FROM results").fetchone()[0]
+
+    copied = 0
+    with pooled_connection() as server:
+        if server is None:
+            logger.error("Database connection failed. Cannot sync the local mirror.")
+            return 0
+        cursor = server.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(MIRROR_COLUMNS)} FROM {table_name} WHERE InRs_SlNo > ? ORDER BY InRs_SlNo",
+            high_water_mark,
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            # One local transaction per chunk: an interrupted sync resumes from the last chunk
+            with _connect() as conn:
+                _upsert(conn, MIRROR_COLUMNS, [tuple(_to_sqlite(value) for value in row) for row in rows])
+            copied += len(rows)
+        cursor.close()
+
+    logger.info(f"Local mirror synced: {copied} new rows (high-water mark was InRs_SlNo {high_water_mark})")
+    return copied
+
+
+def _where(start_date=None, end_date=None, sample_id=None, machine=None):
+    clauses, params = build_filters(start_date, end_date, sample_id, machine)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, [_to_sqlite(param) for param in params]
+
+
+def fetch_date_range(table_name=None, machine=None):
+    """Earliest and latest InRs_ReqDate in the mirror, or (None, None)."""
+    where, params = _where(machine=machine)
+    try:
+        with _connect() as conn:
+            first, last = conn.execute(f"SELECT MIN(InRs_ReqDate), MAX(InRs_ReqDate) FROM results {where}",
+                                       params).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading the local mirror: {e}")
+        return None, None
+    if first is None:
+        return None, None
+    return pd.to_datetime(first).to_pydatetime(), pd.to_datetime(last).to_pydatetime()
+
+
+def fetch_sample_ids(table_name=None, start_date=None, end_date=None, machine=None):
+    """Distinct sample IDs in the date range, newest report first."""
+    where, params = _where(start_date, end_date, machine=machine)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT InRs_ReqNo, MAX(InRs_ReqDate) AS Last_ReqDate FROM results {where} "
+                f"GROUP BY InRs_ReqNo ORDER BY Last_ReqDate DESC, InRs_ReqNo",
+                params,
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading the local mirror: {e}")
+        return None
+    return [row[0] for row in rows]
+
+
+def fetch_result_frame(table_name=None, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, start_date=None,
+                       end_date=None, sample_id=None, machine=None):
+    """Matching mirror rows as a DataFrame (None on error); filters are pushed down to the indexed SQLite columns."""
+    columns = list(columns or RESULT_COLUMNS)
+    where, params = _where(start_date, end_date, sample_id, machine)
+    try:
+        with _connect() as conn:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM results {where} ORDER BY InRs_ReqDate, InRs_SlNo",
+                conn,
+                params=params,
+                parse_dates=[col for col in columns if col in DATE_COLUMNS],
+            )
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        logger.error(f"Error reading the local mirror: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the local SQLite mirror of the results table.")
+    parser.add_argument("--sync", action="store_true", help="Copy new rows from SQL Server")
+    parser.add_argument("--table", default=TABLE_NAME)
+    args = parser.parse_args()
+
+    if args.sync:
+        sync_from_server(args.table)
+    first, last = fetch_date_range()
+    print(f"Mirror {MIRROR_CONFIG['path']}: reports from {first} to {last}")
@@ -0,0 +1,279 @@
+# sql_queries/qc_aggregates.py
+#
+# Daily QC aggregates for Levey-Jennings style trend views: per machine, day,
+# peak and metric (InRs_Result, NGSP, InRs_Ret_Time) the count, mean, M2
+# (sum of squared deviations), min and max of the saved values. They are kept
+# in a local SQLite store and updated incrementally with Welford's algorithm
+# by save_tables_to_db, so trend charts never scan the results table.
+# Re-saving a row replaces its previous value in the statistics; when that
+# value was the day's min or max, they are recomputed from the stored row
+# values. To build the store from the rows already on the server:
+#
+#   python -m sql_queries.qc_aggregates --rebuild
+
+import argparse
+import math
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+from config import read_config
+from utils.report_parser import parse_report_date
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+QC_CONFIG = config["qc"]
+TABLE_NAME = config["database"]["table_name"]
+
+METRIC_COLUMNS = ["InRs_Result", "NGSP", "InRs_Ret_Time"]
+SOURCE_COLUMNS = ["InRs_Machine", "InRs_ReqDate", "InRs_ReqNo", "InRs_Map_code"] + METRIC_COLUMNS
+
+_initialised = False
+
+
+@contextmanager
+def _connect(write=False):
+    """
+    Connection to the aggregate store. With write, the block is one
+    transaction taken with BEGIN IMMEDIATE, so concurrent writers (other
+    worker processes) never interleave their read-modify-write of a day.
+    """
+    global _initialised
+    os.makedirs(os.path.dirname(QC_CONFIG["path"]), exist_ok=True)
+    conn = sqlite3.connect(QC_CONFIG["path"], timeout=30, isolation_level=None)
+    try:
+        if not _initialised:
+            _create_schema(conn)
+            _initialised = True
+        if not write:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def _create_schema(conn):
+    conn.execute("PRAGMA journal_mode=WAL")  # The trend page reads while workers write
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            machine TEXT NOT NULL,
+            day TEXT NOT NULL,
+            peak TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            PRIMARY KEY (peak, metric, machine, day)
+        )
+        """
+    )
+    # Last value counted per result row, so a re-saved row replaces instead of adding
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS row_values (
+            machine TEXT NOT NULL,
+            req_no TEXT NOT NULL,
+            req_date TEXT NOT NULL,
+            peak TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (machine, req_no, req_date, peak, metric)
+        )
+        """
+    )
+    # The values of one day, when a replaced min or max must be recomputed
+    conn.execute("CREATE INDEX IF NOT EXISTS row_values_day ON row_values (machine, peak, metric, req_date)")
+
+
+def welford_add(stats, value):
+    """Adds value to [n, mean, m2, min, max] in place."""
+    stats[0] += 1
+    delta = value - stats[1]
+    stats[1] += delta / stats[0]
+    stats[2] += delta * (value - stats[1])
+    stats[3] = min(stats[3], value)
+    stats[4] = max(stats[4], value)
+
+
+def welford_remove(stats, value):
+    """
+    Removes a previously added value from [n, mean, m2, min, max] in place.
+    Returns True if value was the min or max, which the caller must then
+    recompute from the remaining values.
+    """
+    if stats[0] <= 1:
+        stats[:] = [0, 0.0, 0.0, math.inf, -math.inf]
+        return False
+    mean_with = stats[1]
+    stats[0] -= 1
+    stats[1] = (mean_with * (stats[0] + 1) - value) / stats[0]
+    stats[2] = max(0.0, stats[2] - (value - stats[1]) * (value - mean_with))
+    return value in (stats[3], stats[4])
+
+
+def _day_bounds(conn, row_key):
+    """Min and max of the other values of row_key's machine, peak, metric and day in row_values."""
+    machine, req_no, req_date, peak, metric = row_key
+    return conn.execute(
+        "SELECT MIN(value), MAX(value) FROM row_values WHERE machine = ? AND peak = ? AND metric = ? "
+        "AND req_date BETWEEN ? AND ? AND NOT (req_no = ? AND req_date = ?)",
+        (machine, peak, metric, f"{req_date[:10]} 00:00:00", f"{req_date[:10]} 23:59:59", req_no, req_date),
+    ).fetchone()
+
+
+def _timestamp(value):
+    """Report date as "YYYY-MM-DD HH:MM:SS" text (as the local mirror stores it), or None."""
+    parsed = parse_report_date(value)
+    return None if parsed is None else parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _apply(conn, columns, rows):
+    """Folds rows (tuples in `columns` order) into the daily statistics. Returns the number of values counted."""
+    index = {column: columns.index(column) for column in SOURCE_COLUMNS}
+    stats_cache = {}
+
+    def stats_for(key):
+        if key not in stats_cache:
+            row = conn.execute("SELECT n, mean, m2, min, max FROM daily_stats "
+                               "WHERE peak = ? AND metric = ? AND machine = ? AND day = ?", key).fetchone()
+            stats_cache[key] = list(row) if row else [0, 0.0, 0.0, math.inf, -math.inf]
+        return stats_cache[key]
+
+    timestamps = {}  # The rows of a report share its date; parse it once
+    counted = 0
+    for row in rows:
+        raw_date = row[index["InRs_ReqDate"]]
+        if raw_date not in timestamps:
+            timestamps[raw_date] = _timestamp(raw_date)
+        req_date = timestamps[raw_date]
+        if req_date is None:
+            continue
+        machine, req_no, peak = (str(row[index[column]])
+                                 for column in ("InRs_Machine", "InRs_ReqNo", "InRs_Map_code"))
+        for metric in METRIC_COLUMNS:
+            value = row[index[metric]]
+            value = None if value is None or pd.isna(value) else float(value)
+            row_key = (machine, req_no, req_date, peak, metric)
+            previous = conn.execute("SELECT value FROM row_values WHERE machine = ? AND req_no = ? AND req_date = ? "
+                                    "AND peak = ? AND metric = ?", row_key).fetchone()
+            if previous is not None and previous[0] == value:
+                continue
+
+            stats = stats_for((peak, metric, machine, req_date[:10]))
+            if previous is not None and welford_remove(stats, previous[0]):
+                stats[3], stats[4] = _day_bounds(conn, row_key)
+            if value is None:
+                conn.execute("DELETE FROM row_values WHERE machine = ? AND req_no = ? AND req_date = ? "
+                             "AND peak = ? AND metric = ?", row_key)
+                continue
+            welford_add(stats, value)
+            conn.execute("INSERT OR REPLACE INTO row_values (machine, req_no, req_date, peak, metric, value) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", row_key + (value,))
+            counted += 1
+
+    conn.executemany("DELETE FROM daily_stats WHERE peak = ? AND metric = ? AND machine = ? AND day = ?",
+                     [key for key, stats in stats_cache.items() if stats[0] == 0])
+    conn.executemany(
+        "INSERT OR REPLACE INTO daily_stats (peak, metric, machine, day, n, mean, m2, min, max) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [key + tuple(stats) for key, stats in stats_cache.items() if stats[0] > 0],
+    )
+    return counted
+
+
+def update_aggregates(columns, rows):
+    """Write-through from save_tables_to_db: folds committed rows (tuples in `columns` order) into the aggregates."""
+    if not QC_CONFIG["enabled"]:
+        return
+    try:
+        with _connect(write=True) as conn:
+            _apply(conn, list(columns), rows)
+    except sqlite3.Error as e:
+        logger.error(f"Could not update QC aggregates: {e}")
+
+
+def rebuild_from_server(table_name=TABLE_NAME):
+    """Recomputes the aggregates from every row of the results table, one chunk at a time. Returns the row count."""
+    from sql_queries.dashboard_queries import iter_result_frames  # Only needed when a server is configured
+
+    with _connect(write=True) as conn:
+        conn.execute("DELETE FROM daily_stats")
+        conn.execute("DELETE FROM row_values")
+    rows = 0
+    for frame in iter_result_frames(table_name, SOURCE_COLUMNS, order_by=None):
+        with _connect(write=True) as conn:
+            _apply(conn, SOURCE_COLUMNS, frame.itertuples(index=False, name=None))
+        rows += len(frame)
+    logger.info(f"QC aggregates rebuilt from {rows} rows of {table_name}")
+    return rows
+
+
+def fetch_machines():
+    """Machines with aggregates (list), or None on error."""
+    try:
+        with _connect() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT machine FROM daily_stats ORDER BY machine")]
+    except sqlite3.Error as e:
+        logger.error(f"Error reading QC aggregates: {e}")
+        return None
+
+
+def fetch_daily_stats(peak, metric, machine=None, start_date=None, end_date=None):
+    """
+    Daily statistics of one peak and metric as a DataFrame (day, machine,
+    count, mean, sd, min, max, m2), oldest first, or None on error. Dates are
+    inclusive calendar days.
+    """
+    clauses, params = ["peak = ?", "metric = ?"], [peak, metric]
+    for clause, value in (("machine = ?", machine), ("day >= ?", start_date), ("day <= ?", end_date)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(str(value))
+    try:
+        with _connect() as conn:
+            df = pd.read_sql_query(
+                f"SELECT day, machine, n AS count, mean, min, max, m2 FROM daily_stats "
+                f"WHERE {' AND '.join(clauses)} ORDER BY day, machine",
+                conn,
+                params=params,
+                parse_dates=["day"],
+            )
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        logger.error(f"Error reading QC aggregates: {e}")
+        return None
+    df["sd"] = (df["m2"] / (df["count"] - 1)).where(df["count"] > 1) ** 0.5
+    return df
+
+
+def combine_stats(df):
+    """Pools daily rows (count, mean, m2) into overall (count, mean, sd) with Chan's formula."""
+    total = int(df["count"].sum())
+    if total == 0:
+        return 0, None, None
+    mean = float((df["count"] * df["mean"]).sum() / total)
+    m2 = float(df["m2"].sum() + (df["count"] * (df["mean"] - mean) ** 2).sum())
+    return total, mean, math.sqrt(m2 / (total - 1)) if total > 1 else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the daily QC aggregates.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute from every row on SQL Server")
+    parser.add_argument("--table", default=TABLE_NAME)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_from_server(args.table)
+    print(f"QC aggregates {QC_CONFIG['path']}: machines {fetch_machines()}")
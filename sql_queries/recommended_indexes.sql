@@ -0,0 +1,19 @@
+-- sql_queries/recommended_indexes.sql
+--
+-- Indexes for the dashboard queries in sql_queries/dashboard_queries.py.
+-- Replace AI_InRs_Interface_Result_T with the table_name from config.ini.
+-- Assumes InRs_ReqDate is a DATETIME column (string dates cannot use range seeks).
+
+-- Date-range filters and keyset pagination: ORDER BY InRs_ReqDate, InRs_SlNo
+CREATE NONCLUSTERED INDEX IX_InRs_ReqDate_SlNo
+    ON AI_InRs_Interface_Result_T (InRs_ReqDate, InRs_SlNo)
+    INCLUDE (InRs_Machine, InRs_ReqNo, InRs_Map_code, InRs_Result, InRs_Ret_Time);
+
+-- Sample lookups (selectbox -> sample details)
+CREATE NONCLUSTERED INDEX IX_InRs_ReqNo_ReqDate
+    ON AI_InRs_Interface_Result_T (InRs_ReqNo, InRs_ReqDate)
+    INCLUDE (InRs_Machine, InRs_Map_code, InRs_Result, InRs_Ret_Time);
+
+-- Idempotent MERGE key used by save_tables_to_db
+CREATE NONCLUSTERED INDEX IX_InRs_Merge_Key
+    ON AI_InRs_Interface_Result_T (InRs_Machine, InRs_ReqNo, InRs_ReqDate, InRs_Map_code);
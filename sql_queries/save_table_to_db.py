@@ -1,68 +1,141 @@
 # sql_queries/save_table_to_db.py
 
-import numpy as np
-from db_connection import connect_to_database  
-import pandas as pd
+from config import read_config
+from db_connection import pooled_connection, invalidate_connection
+from sql_queries.dashboard_cache import bump_data_version
+from sql_queries.local_mirror import mirror_rows, store_rows
+from sql_queries.qc_aggregates import update_aggregates
+from utils.metrics import span
+from utils.report_parser import peaks_from_frame, parse_report_date
 from utils.logger import app_logger as logger
 
 import warnings
 warnings.filterwarnings("ignore")  # Suppress all warnings
 
-def save_table_to_db(sample_id, report_date, df, table_name):
-
-    conn = connect_to_database()
-    if conn is None:
-        logger.error("Database connection failed. Cannot save table.")
-        return False
-
-    try:
-        cursor = conn.cursor()
-        
-        # Rename extracted columns to match SQL Server schema
-        df = df.rename(columns={
-            "Peak Name": "InRs_Map_code",        
-            "NGSP %": "NGSP",                    
-            "Area %": "InRs_Result",             
-            "Retention Time (min)": "InRs_Ret_Time", 
-            "Peak Area": "Peak_Area"             
-        })
-
-        # Replace '---' and empty strings with NULL
-        df.replace({"---": None, "": None}, inplace=True)
-
-        # Convert numeric columns to FLOAT
-        numeric_columns = ["NGSP", "InRs_Result", "InRs_Ret_Time", "Peak_Area"]
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
-
-        # Ensure NULL values remain NULL for SQL insertion
-        df = df.replace({np.nan: None})
-
-        # Insert Data into SQL Server
-        for _, row in df.iterrows():
+# Load configuration
+config = read_config()
+DATABASE_BACKEND = config["database"]["backend"]
+
+MACHINE_NAME = "D10"  # Default machine name
+
+# Columns written per peak row, in INSERT order
+RESULT_COLUMNS = ["InRs_Machine", "InRs_ReqDate", "InRs_ReqNo", "InRs_Map_code",
+                  "InRs_Result", "InRs_Ret_Time", "NGSP", "Peak_Area"]
+# A peak row is identified by machine, sample, report date and peak name
+KEY_COLUMNS = ["InRs_Machine", "InRs_ReqNo", "InRs_ReqDate", "InRs_Map_code"]
+
+
+def _prepare_rows(sample_id, report_date, peaks):
+    """
+    Converts one report's peaks into INSERT-ready tuples (see RESULT_COLUMNS).
+    peaks is a list of PeakRecord, or a table in the extract_table_from_text layout.
+    The day-first report date is bound as a datetime, never as text that SQL
+    Server would read by its session DATEFORMAT. Returns [] if it cannot be read.
+    """
+    report_datetime = parse_report_date(report_date)
+    if report_datetime is None:
+        logger.warning(f"Skipping sample {sample_id}: unreadable report date {report_date!r}")
+        return []
+
+    if not isinstance(peaks, (list, tuple)):
+        peaks = peaks_from_frame(peaks)  # DataFrame from an older caller
+
+    # Values were converted to floats (None for '---') by the parser
+    return [
+        (MACHINE_NAME, report_datetime, sample_id, peak.name,
+         peak.area_percent, peak.retention_time, peak.ngsp, peak.peak_area)
+        for peak in peaks
+    ]
+
+
+def save_tables_to_db(samples, table_name):
+    """
+    Writes many reports in one transaction. samples is an iterable of
+    (sample_id, report_date, peaks). Rows are bulk-loaded into a temp staging
+    table with fast_executemany and MERGEd on (InRs_Machine, InRs_ReqNo,
+    InRs_ReqDate, InRs_Map_code), so re-running the same reports updates
+    the existing rows instead of inserting duplicates.
+    """
+
+    # De-duplicate on the key with the parsed date (last occurrence wins) so MERGE sees each target row once
+    rows_by_key = {}
+    for sample_id, report_date, peaks in samples:
+        for row in _prepare_rows(sample_id, report_date, peaks):
+            rows_by_key[(row[0], row[2], row[1], row[3])] = row
+    rows = list(rows_by_key.values())
+
+    if not rows:
+        logger.warning("No rows to save.")
+        return True
+
+    if DATABASE_BACKEND == "stub":
+        return _save_to_stub(rows)
+
+    with span("db_write", rows=len(rows)) as stage, pooled_connection() as conn:
+        if conn is None:
+            logger.error("Database connection failed. Cannot save table.")
+            stage["outcome"] = "no_connection"
+            return False
+
+        try:
+            cursor = conn.cursor()
+            column_list = ", ".join(RESULT_COLUMNS)
+
+            # Staging table with exactly the target's column types (pooled sessions may still hold one)
+            cursor.execute("IF OBJECT_ID('tempdb..#InRs_Staging') IS NOT NULL DROP TABLE #InRs_Staging")
+            cursor.execute(f"SELECT TOP 0 {column_list} INTO #InRs_Staging FROM {table_name}")
+
+            cursor.fast_executemany = True
+            cursor.executemany(
+                f"INSERT INTO #InRs_Staging ({column_list}) VALUES ({', '.join('?' * len(RESULT_COLUMNS))})",
+                rows,
+            )
+
+            match_condition = " AND ".join(f"target.{col} = source.{col}" for col in KEY_COLUMNS)
+            value_columns = [col for col in RESULT_COLUMNS if col not in KEY_COLUMNS]
             cursor.execute(
                 f"""
-                INSERT INTO {table_name} 
-                (InRs_Machine, InRs_ReqDate, InRs_ReqNo, InRs_Map_code, InRs_Result, InRs_Ret_Time, NGSP, Peak_Area)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, 
-                "D10",  # Default machine name
-                report_date,  # Store report date in InRs_ReqDate
-                sample_id,  # Store Sample ID in InRs_ReqNo
-                row["InRs_Map_code"],  
-                row["InRs_Result"],    
-                row["InRs_Ret_Time"],  
-                row["NGSP"],           
-                row["Peak_Area"]       
+                MERGE {table_name} WITH (HOLDLOCK) AS target
+                USING #InRs_Staging AS source
+                ON {match_condition}
+                WHEN MATCHED THEN
+                    UPDATE SET {", ".join(f"{col} = source.{col}" for col in value_columns)}
+                WHEN NOT MATCHED BY TARGET THEN
+                    INSERT ({column_list})
+                    VALUES ({", ".join(f"source.{col}" for col in RESULT_COLUMNS)});
+                """
             )
+            cursor.execute("DROP TABLE #InRs_Staging")
 
-        conn.commit()
-        logger.info(f"Data successfully inserted into {table_name}")
-        return True
+            conn.commit()
+            logger.info(f"Data successfully merged into {table_name} ({len(rows)} rows)")
+            mirror_rows(RESULT_COLUMNS, rows)  # Write-through to the local mirror (if enabled)
+            update_aggregates(RESULT_COLUMNS, rows)  # Daily QC statistics for the trend page
+            bump_data_version()  # Dashboard caches must not serve pre-commit results
+            return True
+
+        except Exception as e:
+            logger.error(f"Error saving table to database: {e}")
+            stage["outcome"] = "error"
+            try:
+                conn.rollback()
+            except Exception:
+                invalidate_connection(conn)  # Connection is gone; reconnect next time
+            return False
+
+
+def _save_to_stub(rows):
+    """Stub backend: upserts the rows into the local mirror file (same key) instead of SQL Server."""
+    with span("db_write", rows=len(rows), backend="stub") as stage:
+        if not store_rows(RESULT_COLUMNS, rows):
+            stage["outcome"] = "error"
+            return False
+    logger.info(f"Data saved to the stub database ({len(rows)} rows)")
+    update_aggregates(RESULT_COLUMNS, rows)
+    bump_data_version()
+    return True
 
-    except Exception as e:
-        logger.error(f"Error saving table to database: {e}")
-        return False
 
-    finally:
-        conn.close()
+def save_table_to_db(sample_id, report_date, peaks, table_name):
+    """Saves one report's peak table (idempotent, see save_tables_to_db)."""
+    return save_tables_to_db([(sample_id, report_date, peaks)], table_name)
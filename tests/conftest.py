@@ -0,0 +1,30 @@
+# tests/conftest.py
+#
+# Every test session reads its own config (stub database, all paths in a
+# temporary directory). BIORAD_CONFIG is set here, before any test module
+# imports code that calls read_config().
+
+import os
+import shutil
+import tempfile
+
+TEST_ROOT = tempfile.mkdtemp(prefix="biorad-tests-")
+
+with open(os.path.join(TEST_ROOT, "config.ini"), "w", encoding="utf-8") as f:
+    f.write(f"""[PATHS]
+UPLOAD_DIR = {TEST_ROOT}/uploads
+IMAGE_DIR = {TEST_ROOT}/images
+MODEL_PATH = {TEST_ROOT}/missing-model.pth
+
+[database]
+backend = stub
+table_name = AI_InRs_Interface_Result_T
+
+[MIRROR]
+ENABLED = yes
+""")
+os.environ["BIORAD_CONFIG"] = os.path.join(TEST_ROOT, "config.ini")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
@@ -0,0 +1,79 @@
+# tests/test_dashboard_cache.py
+
+import os
+from datetime import date
+
+from config import read_config
+from sql_queries import dashboard_cache
+from sql_queries.save_table_to_db import save_tables_to_db
+from utils.report_parser import PeakRecord
+
+TABLE_NAME = read_config()["database"]["table_name"]
+
+
+class _CountingSource:
+    """Stands in for the dashboard's data source and counts the queries that reach it."""
+
+    __name__ = "counting_source"
+
+    def __init__(self, sample_ids):
+        self.sample_ids = sample_ids
+        self.calls = 0
+
+    def fetch_sample_ids(self, table_name, start_date, end_date):
+        self.calls += 1
+        return self.sample_ids
+
+
+def _isolate(tmp_path, monkeypatch, source):
+    monkeypatch.setattr(dashboard_cache, "VERSION_FILE", str(tmp_path / "results.version"))
+    monkeypatch.setattr(dashboard_cache, "_cache", {})
+    monkeypatch.setattr(dashboard_cache, "source", source)
+
+
+def test_queries_are_served_from_the_cache_until_a_write(tmp_path, monkeypatch):
+    source = _CountingSource(["1001"])
+    _isolate(tmp_path, monkeypatch, source)
+
+    assert dashboard_cache.get_sample_ids(TABLE_NAME, None, None) == ("1001",)
+    assert dashboard_cache.get_sample_ids(TABLE_NAME, None, None) == ("1001",)
+    assert source.calls == 1
+
+    source.sample_ids = ["1002", "1001"]
+    dashboard_cache.bump_data_version()
+    assert dashboard_cache.get_sample_ids(TABLE_NAME, None, None) == ("1002", "1001")
+    assert source.calls == 2
+
+
+def test_a_write_in_another_process_invalidates_the_cache(tmp_path, monkeypatch):
+    source = _CountingSource(["1003"])
+    _isolate(tmp_path, monkeypatch, source)
+    dashboard_cache.bump_data_version()
+    dashboard_cache.get_sample_ids(TABLE_NAME, None, None)
+
+    # Another process only touches the version file; this process's entries stay in memory
+    stat = os.stat(dashboard_cache.VERSION_FILE)
+    os.utime(dashboard_cache.VERSION_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    dashboard_cache.get_sample_ids(TABLE_NAME, None, None)
+    assert source.calls == 2
+
+
+def test_failed_queries_are_not_cached(tmp_path, monkeypatch):
+    source = _CountingSource(None)
+    _isolate(tmp_path, monkeypatch, source)
+
+    assert dashboard_cache.get_sample_ids(TABLE_NAME, None, None) == ()
+    assert dashboard_cache.get_sample_ids(TABLE_NAME, None, None) == ()
+    assert source.calls == 2
+
+
+def test_saving_rows_shows_them_on_the_dashboard(tmp_path, monkeypatch):
+    monkeypatch.setattr(dashboard_cache, "VERSION_FILE", str(tmp_path / "results.version"))
+    monkeypatch.setattr(dashboard_cache, "_cache", {})
+    day = date(2024, 5, 6)
+
+    assert "1004" not in dashboard_cache.get_sample_ids(TABLE_NAME, day, day)
+    assert save_tables_to_db([("1004", "06/05/2024 11:30", [PeakRecord("A1c", 6.1, None, 0.51, 55000)])],
+                             TABLE_NAME)
+    assert "1004" in dashboard_cache.get_sample_ids(TABLE_NAME, day, day)
@@ -0,0 +1,72 @@
+# tests/test_dashboard_queries.py
+
+from datetime import datetime
+
+from sql_queries import dashboard_queries
+
+NAMES = ["InRs_ReqNo", "InRs_ReqDate", "InRs_SlNo"]
+
+
+def _table(monkeypatch, rows):
+    """Answers fetch_results' SELECT TOP (?) ... keyset query from rows; returns the parameters of each query."""
+    queries = []
+
+    def run_query(query, params=()):
+        queries.append(list(params))
+        page_size, params = params[0], list(params[1:])
+        selected = sorted(rows, key=lambda row: (row[1], row[2]))
+        if "InRs_SlNo > ?" in query:
+            after_date, _, after_slno = params[-3:]
+            selected = [row for row in selected if (row[1], row[2]) > (after_date, after_slno)]
+        return NAMES, selected[:page_size]
+
+    monkeypatch.setattr(dashboard_queries, "_run_query", run_query)
+    return queries
+
+
+def test_pages_follow_the_keyset_across_equal_dates(monkeypatch):
+    same_time = datetime(2024, 4, 3, 10, 15)
+    rows = [("901", same_time, 7), ("902", same_time, 3), ("903", datetime(2024, 4, 2, 9, 0), 9),
+            ("904", same_time, 5), ("905", datetime(2024, 4, 4, 8, 0), 1)]
+    queries = _table(monkeypatch, rows)
+
+    page, next_key = dashboard_queries.fetch_results("results", page_size=2, columns=["InRs_ReqNo"])
+    assert page == [{"InRs_ReqNo": "903"}, {"InRs_ReqNo": "902"}]  # Keyset columns are not returned unless asked
+    assert next_key == (same_time, 3)
+
+    page, next_key = dashboard_queries.fetch_results("results", after=next_key, page_size=2, columns=["InRs_ReqNo"])
+    assert page == [{"InRs_ReqNo": "904"}, {"InRs_ReqNo": "901"}]
+    assert queries[-1] == [2, same_time, same_time, 3]
+
+    page, next_key = dashboard_queries.fetch_results("results", after=next_key, page_size=2, columns=["InRs_ReqNo"])
+    assert page == [{"InRs_ReqNo": "905"}]
+    assert next_key is None  # A short page is the last one
+
+
+def test_iter_results_yields_every_row_once(monkeypatch):
+    rows = [(f"9{serial:02d}", datetime(2024, 4, 1 + serial % 3), serial) for serial in range(10)]
+    _table(monkeypatch, rows)
+
+    pages = dashboard_queries.iter_results("results", page_size=3, columns=["InRs_ReqNo"])
+    sample_ids = [row["InRs_ReqNo"] for row in pages]
+
+    assert sorted(sample_ids) == sorted(row[0] for row in rows)
+    assert len(sample_ids) == len(rows)
+
+
+def test_filters_come_before_the_keyset(monkeypatch):
+    queries = _table(monkeypatch, [])
+    after = (datetime(2024, 4, 3), 12)
+
+    rows, next_key = dashboard_queries.fetch_results("results", sample_id="901", machine="VARIANT", after=after,
+                                                     page_size=50)
+
+    assert (rows, next_key) == ([], None)
+    assert queries == [[50, "901", "VARIANT", after[0], after[0], after[1]]]
+
+
+def test_database_error_returns_no_rows(monkeypatch):
+    monkeypatch.setattr(dashboard_queries, "_run_query", lambda query, params=(): None)
+
+    assert dashboard_queries.fetch_results("results") == (None, None)
+    assert list(dashboard_queries.iter_results("results")) == []
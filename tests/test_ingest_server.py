@@ -0,0 +1,105 @@
+# tests/test_ingest_server.py
+
+import asyncio
+import json
+import os
+
+import ingest_server
+from ingest_server import IngestService
+from utils.job_queue import JobQueue
+
+PDF = b"%PDF-1.4\n%%EOF\n"
+
+
+def _service(tmp_path, monkeypatch, max_pending=20, **options):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_pending=max_pending)
+    monkeypatch.setattr(ingest_server, "job_queue", queue)
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    return IngestService(upload_dir=str(upload_dir), table_name="results", read_timeout=5, retry_after=7,
+                         **options), queue
+
+
+async def _request(port, head, body=b""):
+    """Sends one request and returns (status, headers, JSON payload)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(head.encode("latin-1") + b"\r\n\r\n" + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split()[1]), headers, json.loads(payload)
+
+
+def _serve(service, scenario):
+    """Runs scenario(port) against the service on a free local port."""
+    async def main():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        async with server:
+            return await scenario(server.sockets[0].getsockname()[1])
+    return asyncio.run(main())
+
+
+def test_upload_is_queued(tmp_path, monkeypatch):
+    service, queue = _service(tmp_path, monkeypatch)
+
+    status, _, payload = _serve(service, lambda port: _request(
+        port, f"POST /reports?filename=run.pdf HTTP/1.1\r\nContent-Length: {len(PDF)}", PDF))
+
+    assert status == 202
+    job = queue.get(payload["job_id"])
+    assert job["pdf_path"].endswith("-run.pdf")
+    with open(job["pdf_path"], "rb") as f:
+        assert f.read() == PDF
+
+
+def test_full_queue_answers_429(tmp_path, monkeypatch):
+    service, queue = _service(tmp_path, monkeypatch, max_pending=1)
+    queue.enqueue("waiting.pdf", "results")
+
+    status, headers, payload = _serve(service, lambda port: _request(
+        port, f"POST /reports HTTP/1.1\r\nContent-Length: {len(PDF)}", PDF))
+
+    assert status == 429
+    assert headers["Retry-After"] == "7"
+    assert os.listdir(service.upload_dir) == []
+
+
+def test_too_many_uploads_answers_503(tmp_path, monkeypatch):
+    service, _ = _service(tmp_path, monkeypatch, max_uploads=1)
+
+    async def scenario(port):
+        # The first client announces a body and stalls; its upload stays in progress
+        _, stalled = await asyncio.open_connection("127.0.0.1", port)
+        stalled.write(f"POST /reports HTTP/1.1\r\nContent-Length: {len(PDF)}\r\n\r\n%PDF".encode())
+        await stalled.drain()
+        while service.active_uploads < 1:
+            await asyncio.sleep(0.01)
+        try:
+            return await _request(port, f"POST /reports HTTP/1.1\r\nContent-Length: {len(PDF)}", PDF)
+        finally:
+            stalled.close()
+
+    status, headers, _ = _serve(service, scenario)
+
+    assert status == 503
+    assert headers["Retry-After"] == "7"
+
+
+def test_negative_sizes_are_rejected(tmp_path, monkeypatch):
+    service, queue = _service(tmp_path, monkeypatch)
+
+    async def scenario(port):
+        length = await _request(port, "POST /reports HTTP/1.1\r\nContent-Length: -1", PDF)
+        chunk = await _request(port, "POST /reports HTTP/1.1\r\nTransfer-Encoding: chunked",
+                               b"-5\r\n%PDF-\r\n0\r\n\r\n")
+        return length, chunk
+
+    (length_status, _, length_payload), (chunk_status, _, chunk_payload) = _serve(service, scenario)
+
+    assert (length_status, length_payload["error"]) == (400, "Invalid Content-Length")
+    assert (chunk_status, chunk_payload["error"]) == (400, "Negative body size")
+    assert queue.counts().get("queued", 0) == 0
+    assert os.listdir(service.upload_dir) == []
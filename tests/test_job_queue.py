@@ -0,0 +1,99 @@
+# tests/test_job_queue.py
+
+import multiprocessing
+import os
+import time
+
+from utils import job_queue
+from utils.job_queue import DONE, FAILED, QUEUED, JobQueue, upload_path
+
+_context = multiprocessing.get_context("fork")
+
+
+def _claim_and_die(queue):
+    """Claims a job in a worker process that then exits without finishing it."""
+    process = _context.Process(target=queue.claim)
+    process.start()
+    process.join()
+
+
+def test_full_queue_refuses_new_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_pending=3)
+
+    assert queue.enqueue_batch(["a.pdf", "b.pdf"], "results") is not None
+    assert queue.enqueue("c.pdf", "results") is not None
+    assert queue.enqueue("d.pdf", "results") is None  # A batch counts one slot per report
+
+    queue.claim()  # Running jobs no longer wait for a slot
+    assert queue.enqueue("d.pdf", "results") is not None
+    assert queue.enqueue_batch(["e.pdf", "f.pdf"], "results") is not None  # Admitted while a slot is free
+    assert queue.enqueue("g.pdf", "results") is None
+
+
+def test_upload_names_are_unique_and_safe(tmp_path):
+    paths = {upload_path("report.pdf", str(tmp_path)) for _ in range(100)}
+    assert len(paths) == 100
+    assert all(path.endswith("-report.pdf") for path in paths)
+
+    for name in ("../../etc/passwd", "C:\\exports\\..\\run 1.pdf", ".hidden"):
+        path = upload_path(name, str(tmp_path))
+        assert os.path.dirname(path) == str(tmp_path)
+        assert path.endswith(".pdf")
+    assert upload_path("C:\\exports\\run 1.pdf", str(tmp_path)).endswith("-run_1.pdf")
+
+
+def test_job_of_a_dead_worker_is_requeued_until_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=2)
+    job_id = queue.enqueue("poison.pdf", "results")
+
+    _claim_and_die(queue)
+    assert queue.requeue_stale() == 1
+    assert queue.get(job_id)["status"] == QUEUED
+
+    _claim_and_die(queue)
+    assert queue.requeue_stale() == 0
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert "died 2 times" in job["error"]
+
+
+def test_running_job_of_a_live_worker_is_kept(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_id = queue.enqueue("report.pdf", "results")
+    queue.claim()
+
+    assert queue.requeue_stale() == 0
+    assert queue.get(job_id)["status"] == "running"
+    queue.finish(job_id)
+    assert queue.get(job_id)["status"] == DONE
+
+
+def test_supervisor_restarts_dead_workers(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=2)
+
+    def crashing_work(index, pool_workers, poll_interval, stop):
+        while not stop.is_set():
+            job = queue.claim()
+            if job is not None and job[1] == "poison.pdf":
+                os._exit(1)  # Like a segfault in native code: no fail(), no cleanup
+            time.sleep(poll_interval)
+
+    monkeypatch.setattr(job_queue, "job_queue", queue)
+    monkeypatch.setattr(job_queue, "_work", crashing_work)
+    monkeypatch.setattr(job_queue, "_supervisor", None)
+    monkeypatch.setattr(job_queue, "SUPERVISE_INTERVAL", 0.1)
+
+    job_queue.start_workers(workers=1, poll_interval=0.05)
+    try:
+        job_id = queue.enqueue("poison.pdf", "results")
+        deadline = time.time() + 20
+        while queue.get(job_id)["status"] != FAILED and time.time() < deadline:
+            time.sleep(0.1)
+        assert queue.get(job_id)["status"] == FAILED  # Claimed, crashed, requeued, claimed again, crashed
+
+        healthy_id = queue.enqueue("report.pdf", "results")
+        time.sleep(0.5)
+        assert queue.get(healthy_id)["status"] == "running"  # Picked up by the replacement worker
+    finally:
+        job_queue.stop_workers(10)
+    assert job_queue._supervisor.exitcode == 0
@@ -0,0 +1,77 @@
+# tests/test_local_mirror.py
+
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import db_connection
+from sql_queries import local_mirror
+from sql_queries.local_mirror import MIRROR_COLUMNS
+
+
+def _use_mirror(tmp_path, monkeypatch):
+    monkeypatch.setitem(local_mirror.MIRROR_CONFIG, "path", str(tmp_path / "results.sqlite"))
+    monkeypatch.setattr(local_mirror, "_initialised", False)
+
+
+def _server_row(serial, sample_id, req_date):
+    row = dict.fromkeys(MIRROR_COLUMNS)
+    row.update(InRs_Machine="VARIANT", InRs_ReqNo=sample_id, InRs_ReqDate=req_date, InRs_Map_code="A1c",
+               InRs_Result=5.6, InRs_SlNo=serial)
+    return tuple(row[col] for col in MIRROR_COLUMNS)
+
+
+class _FakeServer:
+    """Serves rows above the high-water mark the way the SELECT in sync_from_server would."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.marks = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, high_water_mark):
+        self.marks.append(high_water_mark)
+        slno = MIRROR_COLUMNS.index("InRs_SlNo")
+        self._pending = sorted((row for row in self.rows if row[slno] > high_water_mark), key=lambda row: row[slno])
+
+    def fetchmany(self, size):
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+def test_stored_dates_are_day_first(tmp_path, monkeypatch):
+    _use_mirror(tmp_path, monkeypatch)
+    columns = ["InRs_Machine", "InRs_ReqNo", "InRs_ReqDate", "InRs_Map_code", "InRs_Result", "InRs_SlNo"]
+
+    assert local_mirror.store_rows(columns, [("VARIANT", "701", "03/04/2024 10:15", "A1c", 5.6, 1),
+                                             ("VARIANT", "702", "12/04/2024 09:00", "A1c", 6.2, 2)])
+
+    assert local_mirror.fetch_date_range() == (datetime(2024, 4, 3, 10, 15), datetime(2024, 4, 12, 9, 0))
+    df = local_mirror.fetch_result_frame(start_date=date(2024, 4, 3), end_date=date(2024, 4, 3))
+    assert list(df["InRs_ReqNo"]) == ["701"]  # 3 April, not 4 March
+    assert local_mirror.fetch_sample_ids(start_date=date(2024, 4, 1), end_date=date(2024, 4, 30)) == ["702", "701"]
+
+
+def test_sync_copies_only_rows_above_the_high_water_mark(tmp_path, monkeypatch):
+    _use_mirror(tmp_path, monkeypatch)
+    server = _FakeServer([_server_row(serial, f"80{serial}", datetime(2024, 4, serial, 8, 0)) for serial in (1, 2, 3)])
+
+    @contextmanager
+    def pooled_connection():
+        yield server
+
+    monkeypatch.setattr(db_connection, "pooled_connection", pooled_connection)
+
+    assert local_mirror.sync_from_server("results", chunk_size=2) == 3
+    server.rows.append(_server_row(4, "804", datetime(2024, 4, 4, 8, 0)))
+    assert local_mirror.sync_from_server("results", chunk_size=2) == 1
+    assert local_mirror.sync_from_server("results", chunk_size=2) == 0
+
+    assert server.marks == [0, 3, 4]
+    df = local_mirror.fetch_result_frame()
+    assert list(df["InRs_SlNo"]) == [1, 2, 3, 4]
+    assert df["InRs_ReqDate"].iloc[-1] == datetime(2024, 4, 4, 8, 0)
@@ -0,0 +1,80 @@
+# tests/test_metrics.py
+
+import json
+import logging
+import multiprocessing
+import os
+
+from utils import metrics
+
+_context = multiprocessing.get_context("fork")
+
+
+def _span_line(stage, duration_ms=12.0):
+    return json.dumps({"stage": stage, "outcome": "ok", "bytes": None, "duration_ms": duration_ms}) + "\n"
+
+
+def _stage_total(text, stage):
+    prefix = f'{metrics.METRIC_PREFIX}_stage_total{{stage="{stage}",outcome="ok"}} '
+    return next((int(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix)), 0)
+
+
+def _fresh_log(monkeypatch, path):
+    monkeypatch.setitem(metrics.METRICS_CONFIG, "json_log", str(path))
+    monkeypatch.setattr(metrics, "_log_position", None)
+    monkeypatch.setattr(metrics, "_logged_aggregates", metrics._Aggregates())
+
+
+def _log_span(stage):
+    with metrics.span(stage):
+        pass
+
+
+def test_endpoint_counts_spans_of_other_processes():
+    metrics.render_logged_prometheus()  # Counts start here
+    before = _stage_total(metrics.render_logged_prometheus(), "worker_stage")
+
+    process = _context.Process(target=_log_span, args=("worker_stage",))
+    process.start()
+    process.join()
+    _log_span("worker_stage")
+
+    assert _stage_total(metrics.render_logged_prometheus(), "worker_stage") == before + 2
+    assert _stage_total(metrics.render_prometheus(), "worker_stage") == 1  # This process's own spans only
+
+
+def test_endpoint_follows_the_log_across_a_rotation(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    path.write_text(_span_line("old"))
+    _fresh_log(monkeypatch, path)
+    metrics.render_logged_prometheus()
+
+    with open(path, "a") as f:
+        f.write(_span_line("parse") + '{"stage": "par')  # Last line still being written
+    assert _stage_total(metrics.render_logged_prometheus(), "parse") == 1
+
+    with open(path, "a") as f:
+        f.write('se", "outcome": "ok", "bytes": null, "duration_ms": 3.0}\n' + _span_line("parse"))
+    os.replace(path, f"{path}.1")
+    path.write_text(_span_line("parse") + _span_line("render"))
+
+    text = metrics.render_logged_prometheus()
+    assert _stage_total(text, "parse") == 4
+    assert _stage_total(text, "render") == 1
+    assert _stage_total(text, "old") == 0  # Logged before the endpoint started
+
+
+def test_processes_sharing_the_log_rotate_it_once(tmp_path):
+    path = str(tmp_path / "spans.jsonl")
+    handlers = [metrics._SharedRotatingFileHandler(path, maxBytes=200, backupCount=5) for _ in range(2)]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    for index in range(8):
+        handlers[index % 2].emit(logging.makeLogRecord({"msg": _span_line(f"s{index}").strip()}))
+    for handler in handlers:
+        handler.close()
+
+    files = [path] + [f"{path}.{number}" for number in range(1, 6) if os.path.exists(f"{path}.{number}")]
+    lines = [line for name in files for line in open(name).read().splitlines()]
+    assert sorted(json.loads(line)["stage"] for line in lines) == [f"s{index}" for index in range(8)]
+    assert all(os.path.getsize(name) <= 200 for name in files)
@@ -0,0 +1,85 @@
+# tests/test_pipeline.py
+
+import random
+import threading
+
+from benchmarks.synthetic_reports import make_report
+from utils import pipeline
+
+
+def _tasks(count):
+    return [(f"report{index}.pdf", 0, f"cid{index}") for index in range(count)]
+
+
+def test_next_pages_are_read_while_the_current_batch_is_finished(monkeypatch):
+    second_batch_read = threading.Event()
+    overlapped = []
+
+    def read_page(pdf_path, page_number=0, correlation_id=None):
+        if pdf_path == "report1.pdf":
+            second_batch_read.set()
+        return {"pdf_path": pdf_path}
+
+    def finish_records(records, batch_size):
+        if records[0]["pdf_path"] == "report0.pdf":
+            # The prefetch thread must read the next PDF while this batch is detected and saved
+            overlapped.append(second_batch_read.wait(5))
+        return [dict(record) for record in records]
+
+    monkeypatch.setattr(pipeline, "_read_page", read_page)
+    monkeypatch.setattr(pipeline, "_finish_records", finish_records)
+
+    results = list(pipeline._read_pages(_tasks(3), batch_size=1, workers=1))
+
+    assert overlapped == [True]
+    assert [task[0] for task, _ in results] == ["report0.pdf", "report1.pdf", "report2.pdf"]
+    assert [result["pdf_path"] for _, result in results] == ["report0.pdf", "report1.pdf", "report2.pdf"]
+
+
+def test_unreadable_page_yields_none(monkeypatch):
+    def read_page(pdf_path, page_number=0, correlation_id=None):
+        if pdf_path == "report1.pdf":
+            raise RuntimeError("damaged")
+        return {"pdf_path": pdf_path}
+
+    monkeypatch.setattr(pipeline, "_read_page", read_page)
+    monkeypatch.setattr(pipeline, "_finish_records", lambda records, batch_size: [dict(r) for r in records])
+
+    results = [result for _, result in pipeline._read_pages(_tasks(3), batch_size=2, workers=1)]
+
+    assert results.count(None) == 1
+    assert sorted(result["pdf_path"] for result in results if result) == ["report0.pdf", "report2.pdf"]
+
+
+def test_prefetch_thread_and_reader_processes_agree(tmp_path):
+    rng = random.Random(5)
+    tasks = []
+    for index in range(3):
+        path = str(tmp_path / f"report{index}.pdf")
+        make_report(path, str(100000 + index), f"0{index + 1}/04/2024 09:30", rng)
+        tasks.append((path, 0, f"cid{index}"))
+
+    def summary(workers):
+        return [(result["sample_id"], result["report_generated"], [peak.as_tuple() for peak in result["peaks"]])
+                for _, result in pipeline._read_pages(tasks, batch_size=2, workers=workers)]
+
+    threaded = summary(1)
+    assert [sample_id for sample_id, _, _ in threaded] == ["100000", "100001", "100002"]
+    assert threaded == summary(2)
+
+
+def test_pooled_workers_share_the_page_readers(monkeypatch):
+    monkeypatch.setattr(pipeline, "PAGE_WORKERS", 4)
+
+    assert [pipeline.pooled_page_workers(pool) for pool in (1, 2, 3, 4, 8)] == [4, 2, 1, 1, 1]
+
+
+def test_runs_of_a_sample_keep_their_own_trace_files():
+    first = pipeline.parse_words([])
+    first.sample_id, first.report_generated = "601", "03/04/2024 10:15"
+    rerun = pipeline.parse_words([])
+    rerun.sample_id, rerun.report_generated = "601", "04/04/2024 08:05"
+
+    assert pipeline._trace_name(first, "report") == "601_20240403-101500"
+    assert pipeline._trace_name(rerun, "report") == "601_20240404-080500"
+    assert pipeline._trace_name(pipeline.parse_words([]), "report_p002") == "report_p002"
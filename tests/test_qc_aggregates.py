@@ -0,0 +1,84 @@
+# tests/test_qc_aggregates.py
+
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sql_queries.qc_aggregates import (SOURCE_COLUMNS, combine_stats, fetch_daily_stats, update_aggregates,
+                                       welford_add, welford_remove)
+
+
+def _empty():
+    return [0, 0.0, 0.0, math.inf, -math.inf]
+
+
+def _expected(values):
+    values = np.asarray(values)
+    return [len(values), values.mean(), ((values - values.mean()) ** 2).sum(), values.min(), values.max()]
+
+
+def _values(count, seed):
+    rng = random.Random(seed)
+    return [round(rng.gauss(5.6, 0.4), 2) for _ in range(count)]
+
+
+def test_add_matches_numpy():
+    values, stats = _values(200, 1), _empty()
+    for value in values:
+        welford_add(stats, value)
+
+    assert stats == pytest.approx(_expected(values))
+
+
+def test_remove_matches_numpy_and_flags_the_bounds():
+    values, stats = _values(50, 2), _empty()
+    for value in values:
+        welford_add(stats, value)
+    middle = sorted(values)[25]
+
+    flags = [welford_remove(stats, value) for value in (middle, max(values), min(values))]
+    remaining = sorted(values)[1:-1]
+    remaining.remove(middle)
+
+    assert flags == [False, True, True]
+    assert stats[:3] == pytest.approx(_expected(remaining)[:3])
+
+
+def test_removing_the_last_value_resets_the_bounds():
+    stats = _empty()
+    welford_add(stats, 5.0)
+    welford_remove(stats, 5.0)
+    welford_add(stats, 7.0)
+
+    assert stats == [1, 7.0, 0.0, 7.0, 7.0]
+
+
+def test_combine_matches_numpy():
+    days = [_values(count, seed) for count, seed in ((30, 3), (1, 4), (45, 5))]
+    rows = []
+    for values in days:
+        stats = _empty()
+        for value in values:
+            welford_add(stats, value)
+        rows.append({"count": stats[0], "mean": stats[1], "m2": stats[2]})
+
+    count, mean, sd = combine_stats(pd.DataFrame(rows))
+    everything = np.concatenate(days)
+    assert (count, mean, sd) == pytest.approx((len(everything), everything.mean(), everything.std(ddof=1)))
+
+
+def _row(req_no, result):
+    return ("V2-QC", "03/04/2024 10:15", req_no, "A1c", result, 6.1, 0.51)
+
+
+def test_resaved_row_recomputes_the_day_bounds():
+    update_aggregates(SOURCE_COLUMNS, [_row("701", 5.2), _row("702", 5.9), _row("703", 6.4)])
+    update_aggregates(SOURCE_COLUMNS, [_row("703", 5.5), _row("701", 5.7)])  # Old max and min replaced
+
+    day = fetch_daily_stats("A1c", "InRs_Result", machine="V2-QC").iloc[0]
+    assert (day["count"], day["min"], day["max"]) == (3, 5.5, 5.9)
+    assert day["mean"] == pytest.approx(np.mean([5.7, 5.9, 5.5]))
+    assert day["sd"] == pytest.approx(np.std([5.7, 5.9, 5.5], ddof=1))
@@ -0,0 +1,70 @@
+# tests/test_report_parser.py
+#
+# The coordinate parser against the regex extractor it replaced, on synthetic
+# reports. Run from the repository root: python -m pytest -q
+
+import logging
+import random
+from datetime import datetime
+
+import fitz  # PyMuPDF
+import pytest
+
+from benchmarks.synthetic_reports import make_report
+from utils.pdf_extractor import extract_table_from_text
+from utils.report_parser import parse_report_date, parse_words, peaks_from_frame, NOT_FOUND
+
+
+@pytest.fixture(params=[1, 2, 3])
+def report(request, tmp_path):
+    """(words, text, rows) of one synthetic report page."""
+    path = str(tmp_path / "report.pdf")
+    rows = make_report(path, "123456789", "05/03/2024 10:15", random.Random(request.param))
+    with fitz.open(path) as doc:
+        page = doc.load_page(0)
+        return page.get_text("words"), page.get_text("text"), rows
+
+
+def _expected(text):
+    df, sample_id, report_generated = extract_table_from_text(text)
+    return [peak.as_tuple() for peak in peaks_from_frame(df)], sample_id, report_generated
+
+
+def test_dash_cells_match_regex_extractor(report):
+    words, text, _ = report
+    record = parse_words(words)
+
+    peaks, sample_id, report_generated = _expected(text)
+    assert [peak.as_tuple() for peak in record.peaks] == peaks
+    assert (record.sample_id, record.report_generated) == (sample_id, report_generated)
+    assert any(None in peak for peak in peaks)  # The "---" cells are missing values
+
+
+def test_blank_cells_stay_in_their_columns(report):
+    words, text, _ = report
+    # The same page with every "---" cell left blank
+    record = parse_words([word for word in words if word[4] != "---"])
+
+    peaks, _, _ = _expected(text)
+    assert [peak.as_tuple() for peak in record.peaks] == peaks
+
+
+def test_two_values_under_one_column_are_logged(report, caplog):
+    words, text, _ = report
+    a1c = [word for word in words if word[4] == "A1c"][0]
+    peak_area = max((word for word in words if abs(word[1] - a1c[1]) < 1), key=lambda word: word[0])
+    stray = (peak_area[0] + 30, peak_area[1], peak_area[2] + 30, peak_area[3], "999") + tuple(peak_area[5:])
+
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        record = parse_words(words + [stray])
+
+    peaks, _, _ = _expected(text)
+    assert [peak.as_tuple() for peak in record.peaks] == peaks  # The first value is kept
+    assert "more than one value under 'Peak Area'" in caplog.text
+
+
+def test_report_date_is_day_first():
+    assert parse_report_date("05/03/2024 10:15") == datetime(2024, 3, 5, 10, 15)
+    assert parse_report_date(" 05/03/2024   10:15 ") == datetime(2024, 3, 5, 10, 15)
+    assert parse_report_date("2024-03-05 10:15:00") == datetime(2024, 3, 5, 10, 15)
+    assert parse_report_date(NOT_FOUND) is None
@@ -0,0 +1,47 @@
+# tests/test_result_cache.py
+
+import random
+
+from benchmarks.synthetic_reports import make_report
+from utils import pipeline
+from utils.report_parser import PeakRecord
+from utils.result_cache import ResultCache
+
+
+def _result(table_saved):
+    sample = {"peaks": [PeakRecord("A1c", 6.1, None, 0.51, 55000)], "sample_id": "601",
+              "report_generated": "03/04/2024 10:15", "figure_path": None, "trace_path": None, "page_number": 0}
+    return dict(sample, samples=[sample], sample_count=1, table_saved=table_saved)
+
+
+def test_saved_flag_is_per_table(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("hash", _result(table_saved=True), "results_a")
+
+    assert cache.get("hash", "results_a")["table_saved"] is True
+    assert cache.get("hash", "results_b")["table_saved"] is False
+    assert cache.get("other", "results_a") is None
+
+    cache.put("hash", _result(table_saved=True), "results_b")
+    assert cache.get("hash", "results_a")["table_saved"] is True  # Saving elsewhere keeps the first table's flag
+
+
+def test_cached_pdf_is_saved_to_another_table(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "report.pdf")
+    make_report(pdf_path, "602", "03/04/2024 10:15", random.Random(6))
+    saved_to = []
+
+    def save_tables_to_db(samples, table_name):
+        saved_to.append((table_name, [sample_id for sample_id, _, _ in samples]))
+        return True
+
+    monkeypatch.setattr(pipeline, "save_tables_to_db", save_tables_to_db)
+
+    first = pipeline.ingest_pdf(pdf_path, "results_a")
+    again = pipeline.ingest_pdf(pdf_path, "results_a")
+    other = pipeline.ingest_pdf(pdf_path, "results_b")
+
+    assert (first["cached"], first["table_saved"]) == (False, True)
+    assert (again["cached"], again["table_saved"]) == (True, True)
+    assert (other["cached"], other["table_saved"]) == (True, True)
+    assert saved_to == [("results_a", ["602"]), ("results_b", ["602"])]
@@ -0,0 +1,35 @@
+# tests/test_save_table_to_db.py
+
+from datetime import datetime
+
+from config import read_config
+from sql_queries.local_mirror import fetch_result_frame
+from sql_queries.save_table_to_db import _prepare_rows, save_tables_to_db
+from utils.report_parser import PeakRecord
+
+TABLE_NAME = read_config()["database"]["table_name"]
+
+
+def _peaks(area=5.6):
+    return [PeakRecord("A1c", 6.1, None, 0.51, 55000), PeakRecord("P3", None, area, 0.79, 40000)]
+
+
+def test_report_date_is_bound_day_first():
+    rows = _prepare_rows("501", "03/04/2024 10:15", _peaks())
+
+    assert [row[1] for row in rows] == [datetime(2024, 4, 3, 10, 15)] * 2
+
+
+def test_unreadable_report_date_is_not_saved():
+    assert _prepare_rows("502", "31/31/2024 10:15", _peaks()) == []
+
+
+def test_same_report_written_as_different_text_is_one_row():
+    saved = save_tables_to_db([("503", "03/04/2024 10:15", _peaks(5.6)),
+                               ("503", " 03/04/2024  10:15", _peaks(5.9))], TABLE_NAME)
+
+    df = fetch_result_frame(sample_id="503")
+    assert saved
+    assert len(df) == 2  # One row per peak, not per spelling of the date
+    assert set(df["InRs_ReqDate"]) == {datetime(2024, 4, 3, 10, 15)}
+    assert df.loc[df["InRs_Map_code"] == "P3", "InRs_Result"].item() == 5.9  # Last occurrence wins
@@ -0,0 +1,195 @@
+# utils/figure_locator.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+DETECTION_CONFIG = config["detection"]
+# Shared by every process that ingests reports (apps, job/batch/watch workers)
+LAYOUT_CACHE_PATH = os.path.join(config["cache"]["cache_dir"], "figure_layouts.sqlite")
+
+# A chromatogram trace is drawn with hundreds of segments; tables and rules with a few dozen
+MIN_TRACE_SEGMENTS = 50
+# Drawings closer than this (PDF points) belong to the same plot
+MERGE_TOLERANCE = 4
+# How far outside the plotted lines axis labels may sit (PDF points)
+LABEL_MARGIN = 30
+# Tick labels and axis titles that are pulled into the plot box
+AXIS_LABEL_PATTERN = re.compile(r"^[\d.,%()\-]+$|^(time|min\.?|\(min\.?\)|%|absorbance|mau)$", re.IGNORECASE)
+
+_initialised = False
+
+
+@contextmanager
+def _connect():
+    global _initialised
+    os.makedirs(os.path.dirname(LAYOUT_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(LAYOUT_CACHE_PATH, timeout=30)
+    try:
+        with conn:  # Commits on success, rolls back on error
+            if not _initialised:
+                conn.execute("CREATE TABLE IF NOT EXISTS layouts (fingerprint TEXT PRIMARY KEY, x0 REAL, y0 REAL, "
+                             "x1 REAL, y1 REAL, updated_at REAL NOT NULL)")
+                _initialised = True
+            yield conn
+    finally:
+        conn.close()
+
+
+def _known_figure_rect(fingerprint):
+    """Remembered figure rectangle of a layout (by any process), or None."""
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT x0, y0, x1, y1 FROM layouts WHERE fingerprint = ?", (fingerprint,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Could not read figure layout cache: {e}")
+        return None
+    return fitz.Rect(row) if row else None
+
+
+def layout_fingerprint(page, words=None):
+    """
+    Identifies a report template: page size plus the position of its fixed,
+    alphabetic labels. Values (sample IDs, dates, numbers) are ignored.
+    Pass the page's get_text("words") if it was already extracted.
+    """
+    digest = hashlib.sha1()
+    digest.update(f"{round(page.rect.width)}x{round(page.rect.height)}r{page.rotation}".encode())
+    for x0, y0, _, _, word, *_ in sorted(words if words is not None else page.get_text("words"), key=lambda w: (round(w[1]), round(w[0]))):
+        if word.rstrip(":").isalpha():
+            digest.update(f"{word}@{round(x0 / 5)},{round(y0 / 5)};".encode())
+    return digest.hexdigest()
+
+
+def _line_extent(drawing):
+    """Returns (bounding rect, segment count) of the line and curve items of a drawing."""
+    # Computed from the points themselves: drawing["rect"] is not reliable for multi-subpath shapes
+    segments = [item for item in drawing["items"] if item[0] in ("l", "c")]
+    if not segments:
+        return None, 0
+    rect = fitz.Rect(segments[0][1], segments[0][1])
+    for item in segments:
+        for point in item[1:]:
+            rect.include_point(point)
+    return rect, len(segments)
+
+
+def find_plot_area(page, drawings=None):
+    """
+    Finds the chromatogram from vector paths: drawings are clustered by
+    proximity and the cluster with the most line/curve segments is the plot.
+    Returns the fitz.Rect of its axes and trace (no labels) or None.
+    """
+    clusters = []  # [rect, segment count]
+    for drawing in drawings if drawings is not None else page.get_drawings():
+        rect, segments = _line_extent(drawing)
+        if segments == 0:
+            continue
+        grown = rect + (-MERGE_TOLERANCE, -MERGE_TOLERANCE, MERGE_TOLERANCE, MERGE_TOLERANCE)
+        for cluster in clusters:
+            if cluster[0].intersects(grown):
+                cluster[0] |= rect
+                cluster[1] += segments
+                break
+        else:
+            clusters.append([rect, segments])
+
+    # Clusters can grow into each other; merge until stable
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                grown = clusters[i][0] + (-MERGE_TOLERANCE, -MERGE_TOLERANCE, MERGE_TOLERANCE, MERGE_TOLERANCE)
+                if grown.intersects(clusters[j][0]):
+                    clusters[i][0] |= clusters[j][0]
+                    clusters[i][1] += clusters[j][1]
+                    del clusters[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    if not clusters:
+        return None
+    plot_rect, segments = max(clusters, key=lambda cluster: cluster[1])
+    area_ratio = plot_rect.get_area() / page.rect.get_area()
+    if segments < MIN_TRACE_SEGMENTS or not 0.02 <= area_ratio <= 0.6:
+        return None
+    return plot_rect
+
+
+def locate_plot_from_drawings(page, drawings=None):
+    """Plot area from the vector drawings plus the nearby tick labels and axis titles, or None."""
+    plot_rect = find_plot_area(page, drawings)
+    if plot_rect is None:
+        return None
+
+    search_rect = plot_rect + (-LABEL_MARGIN, -LABEL_MARGIN, LABEL_MARGIN, LABEL_MARGIN)
+    for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+        word_rect = fitz.Rect(x0, y0, x1, y1)
+        if search_rect.contains(word_rect) and AXIS_LABEL_PATTERN.match(word):
+            plot_rect |= word_rect
+
+    return plot_rect
+
+
+def _iou(a, b):
+    intersection = (a & b).get_area() if a.intersects(b) else 0.0
+    union = a.get_area() + b.get_area() - intersection
+    return intersection / union if union else 0.0
+
+
+def locate_figure_rect(page, fingerprint=None, trust_unknown=False, drawings=None):
+    """
+    Fast path for the figure detector. Returns the plot rectangle in PDF
+    coordinates when this layout has been seen before and the vector-located
+    plot agrees with it, otherwise None (the caller should run the model and
+    remember_figure_rect() its result). With trust_unknown (no model
+    available) the vector-located plot is returned for new layouts as well.
+    """
+    if not DETECTION_CONFIG["vector_locator"]:
+        return None
+
+    fingerprint = fingerprint or layout_fingerprint(page)
+    known_rect = _known_figure_rect(fingerprint)
+    if known_rect is None:
+        return locate_plot_from_drawings(page, drawings) if trust_unknown else None
+
+    vector_rect = locate_plot_from_drawings(page, drawings)
+    if vector_rect is None:
+        # Same template but a raster chromatogram: it is still in the same place
+        return known_rect
+    if _iou(vector_rect, known_rect) >= DETECTION_CONFIG["locator_min_iou"]:
+        return vector_rect
+
+    logger.info("Vector-located plot disagrees with the known layout; falling back to the model.")
+    return None
+
+
+def remember_figure_rect(fingerprint, rect):
+    """
+    Stores the figure rectangle (PDF coordinates) for a layout fingerprint.
+    One row per layout, so concurrent workers never overwrite each other's layouts.
+    """
+    try:
+        with _connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO layouts (fingerprint, x0, y0, x1, y1, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (fingerprint, *(round(value, 2) for value in rect), time.time()))
+    except sqlite3.Error as e:
+        logger.error(f"Could not write figure layout cache: {e}")
+
+
+def pixels_to_rect(box, dpi, derotation_matrix=fitz.Identity):
+    """Maps a pixel box of a page rendered at dpi back to PDF coordinates (page.derotation_matrix undoes rotation)."""
+    return (fitz.Rect(box) * fitz.Matrix(72 / dpi, 72 / dpi)) * derotation_matrix
@@ -0,0 +1,228 @@
+# utils/image_store.py
+#
+# Content-addressed store for chromatogram crops and full-page renders.
+# An image is keyed by the SHA-256 of its pixels and written once, as lossless
+# (or lossy) WebP or PNG, into a sharded tree, with a small WebP thumbnail for
+# the dashboard:
+#   <STORE_DIR>/figures/ab/cd/<digest>.webp
+#   <STORE_DIR>/pages/ab/cd/<digest>.webp
+#   <STORE_DIR>/thumbs/ab/cd/<digest>.webp
+# A SQLite index maps sample IDs to their latest figure. Page renders (and
+# optionally figures) are deleted by collect_garbage() after their retention
+# period. Run from the repository root:
+#   python -m utils.image_store --gc
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+IMAGES_CONFIG = config["images"]
+
+FIGURE, PAGE = "figures", "pages"
+THUMBNAIL_QUALITY = 80
+# Files younger than this are never treated as orphans (another process may be indexing them)
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def image_digest(image):
+    """Content address of an RGB array: SHA-256 of its shape and pixels."""
+    digest = hashlib.sha256(f"{image.shape}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """
+    Sharded, content-addressed image files plus a SQLite index of
+    (kind, digest) -> file, thumbnail, size, sample ID and source name.
+    Identical images are stored once. Safe to share between processes.
+    """
+
+    def __init__(self, root, image_format="webp", lossless=True, quality=90, thumbnail_px=320):
+        self.root = root
+        self.image_format = image_format
+        self.lossless = lossless
+        self.quality = quality
+        self.thumbnail_px = thumbnail_px
+        self.index_path = os.path.join(root, "index.sqlite")
+
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    kind TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    thumb_path TEXT,
+                    size INTEGER NOT NULL,
+                    sample_id TEXT,
+                    name TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (kind, digest)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_images_sample ON images (sample_id, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _path(self, kind, digest, extension):
+        return os.path.join(self.root, kind, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+    def _encode(self, image, extension, params):
+        import cv2  # Only writers pay for OpenCV; the dashboard just looks paths up
+
+        ok, encoded = cv2.imencode(f".{extension}", cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+        if not ok:
+            raise ValueError(f"Could not encode image as {extension}")
+        return encoded.tobytes()
+
+    def _write(self, path, data):
+        # Atomic: readers never see a half-written image
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _encode_params(self):
+        import cv2
+
+        if self.image_format == "png":
+            return [cv2.IMWRITE_PNG_COMPRESSION, 9]
+        # OpenCV switches WebP to lossless above quality 100
+        return [cv2.IMWRITE_WEBP_QUALITY, 101 if self.lossless else self.quality]
+
+    def _thumbnail(self, image):
+        import cv2
+
+        height, width = image.shape[:2]
+        scale = min(1.0, self.thumbnail_px / max(height, width))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        thumbnail = cv2.resize(image, size, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+        return self._encode(thumbnail, "webp", [cv2.IMWRITE_WEBP_QUALITY, THUMBNAIL_QUALITY])
+
+    def put(self, image, kind=FIGURE, sample_id=None, name=None):
+        """
+        Stores an RGB array (once per content) and returns its path. Figures
+        also get a thumbnail; sample_id links the image to a sample for
+        figure_for_sample().
+        """
+        digest = image_digest(image)
+        path = self._path(kind, digest, self.image_format)
+        thumb_path = self._path("thumbs", digest, "webp") if kind == FIGURE else None
+
+        if not os.path.exists(path):
+            self._write(path, self._encode(image, self.image_format, self._encode_params()))
+        if thumb_path and not os.path.exists(thumb_path):
+            self._write(thumb_path, self._thumbnail(image))
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (kind, digest, path, thumb_path, size, sample_id, name, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, digest, path, thumb_path, os.path.getsize(path), sample_id, name, time.time()),
+            )
+        return path
+
+    def figure_for_sample(self, sample_id):
+        """Latest figure of a sample as {"path", "thumb_path"}, or None (also when its files are gone)."""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT path, thumb_path FROM images WHERE kind = ? AND sample_id = ? "
+                    "ORDER BY created_at DESC LIMIT 1", (FIGURE, str(sample_id))
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Image store lookup failed: {e}")
+            return None
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return {"path": row[0], "thumb_path": row[1] if row[1] and os.path.exists(row[1]) else row[0]}
+
+    def collect_garbage(self, page_retention_days=30.0, figure_retention_days=0.0):
+        """
+        Deletes page renders older than page_retention_days, figures older than
+        figure_retention_days (0 keeps them forever) and files no index row
+        points to. Returns (files deleted, bytes freed).
+        """
+        now = time.time()
+        expired = []
+        with self._connect() as conn:
+            for kind, days in ((PAGE, page_retention_days), (FIGURE, figure_retention_days)):
+                if days > 0:
+                    cutoff = now - days * 24 * 3600
+                    expired += conn.execute("SELECT path, thumb_path FROM images WHERE kind = ? AND created_at < ?",
+                                            (kind, cutoff)).fetchall()
+                    conn.execute("DELETE FROM images WHERE kind = ? AND created_at < ?", (kind, cutoff))
+            indexed = {path for row in conn.execute("SELECT path, thumb_path FROM images") for path in row if path}
+
+        deleted, freed = 0, 0
+        expired_files = {path for row in expired for path in row if path}
+        candidates = set(expired_files)
+        for kind in (FIGURE, PAGE, "thumbs"):
+            for directory, _, files in os.walk(os.path.join(self.root, kind)):
+                candidates.update(os.path.join(directory, name) for name in files)
+        for path in candidates:
+            try:
+                if path in indexed:
+                    continue
+                if path not in expired_files and now - os.path.getmtime(path) < ORPHAN_GRACE_SECONDS:
+                    continue
+                size = os.path.getsize(path)
+                os.remove(path)
+                deleted, freed = deleted + 1, freed + size
+            except OSError:
+                continue  # Already removed by another process
+        if deleted:
+            logger.info(f"Image store: deleted {deleted} file(s), {freed / (1024 * 1024):.1f} MB freed")
+        return deleted, freed
+
+    def usage(self):
+        """Number of stored images and bytes per kind (thumbnails not included)."""
+        with self._connect() as conn:
+            return {kind: {"count": count, "bytes": size or 0} for kind, count, size in
+                    conn.execute("SELECT kind, COUNT(*), SUM(size) FROM images GROUP BY kind").fetchall()}
+
+
+# Shared store instance
+image_store = ImageStore(IMAGES_CONFIG["store_dir"], IMAGES_CONFIG["format"], IMAGES_CONFIG["lossless"],
+                         IMAGES_CONFIG["quality"], IMAGES_CONFIG["thumbnail_px"])
+
+
+def collect_garbage():
+    """Applies the configured retention policy to the shared store."""
+    try:
+        return image_store.collect_garbage(IMAGES_CONFIG["page_retention_days"],
+                                           IMAGES_CONFIG["figure_retention_days"])
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Image store garbage collection failed: {e}")
+        return 0, 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clean up the image store.")
+    parser.add_argument("--gc", action="store_true", help="Apply the retention policy and remove orphaned files")
+    args = parser.parse_args()
+
+    if args.gc:
+        deleted, freed = collect_garbage()
+        print(f"Deleted {deleted} file(s), {freed / (1024 * 1024):.1f} MB freed")
+    for kind, usage in image_store.usage().items():
+        print(f"{kind}: {usage['count']} image(s), {usage['bytes'] / (1024 * 1024):.1f} MB")
@@ -0,0 +1,286 @@
+# utils/inference.py
+#
+# CPU inference backends for the layout model. Each backend takes BGR page
+# images and returns Detectron2 outputs ({"instances": Instances} in page
+# pixels), which layoutparser's gather_output() turns into a Layout.
+#   eager        the PyTorch model, one batched forward pass
+#   torchscript  a traced export of the same network
+#   onnx         an ONNX Runtime export, optionally with dynamic int8 weights
+# Exports are traced on the first page seen, written to INFERENCE.EXPORT_DIR
+# and rebuilt when the checkpoint is newer. Compare a backend with eager using
+# benchmarks/benchmark_backends.py before switching INFERENCE.BACKEND.
+
+import abc
+import os
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+try:
+    import onnxruntime
+except ImportError:  # Only needed for INFERENCE.BACKEND = onnx
+    onnxruntime = None
+
+# Load configuration
+config = read_config()
+INFERENCE_CONFIG = config["inference"]
+MODEL_PATH = config["paths"]["model_path"]
+
+ONNX_OPSET = 11
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def configure_threads(intra_op_threads=INFERENCE_CONFIG["intra_op_threads"],
+                      inter_op_threads=INFERENCE_CONFIG["inter_op_threads"]):
+    """Applies the PyTorch CPU thread settings (0 keeps the default). Call before the first forward pass."""
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:  # Can only be set once, before any inter-op work
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"Torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def get_predictor(model):
+    """The Detectron2 DefaultPredictor inside a layoutparser model, or None for other model types."""
+    predictor = getattr(model, "model", None)
+    if all(hasattr(predictor, attr) for attr in ("model", "aug", "input_format")) and hasattr(model, "gather_output"):
+        return predictor
+    return None
+
+
+def preprocess(predictor, image, max_input_size=INFERENCE_CONFIG["max_input_size"]):
+    """DefaultPredictor preprocessing of one BGR image plus the optional longest-edge cap. Returns a CHW float32 tensor."""
+    if predictor.input_format == "RGB":
+        image = image[:, :, ::-1]
+    resized = np.ascontiguousarray(predictor.aug.get_transform(image).apply_image(image))
+    height, width = resized.shape[:2]
+    if max_input_size and max(height, width) > max_input_size:
+        scale = max_input_size / max(height, width)
+        resized = cv2.resize(resized, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return torch.as_tensor(resized.astype("float32").transpose(2, 0, 1))
+
+
+def _is_current(path, source=MODEL_PATH):
+    """True if path exists and is not older than source."""
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def _inference(model, inputs):
+    # Raw detections in input-tensor coordinates; predict() rescales them to the page
+    instances = model.inference(inputs, do_postprocess=False)[0]
+    return [{"instances": instances}]
+
+
+class EagerBackend:
+    """The PyTorch model as loaded, all pages in one forward pass."""
+
+    name = "eager"
+
+    def __init__(self, predictor, max_input_size=INFERENCE_CONFIG["max_input_size"]):
+        self.predictor = predictor
+        self.max_input_size = max_input_size
+
+    def predict(self, bgr_images):
+        inputs = []
+        for image in bgr_images:
+            height, width = image.shape[:2]
+            # height/width make GeneralizedRCNN return boxes in page pixels whatever the input size
+            inputs.append({"image": preprocess(self.predictor, image, self.max_input_size),
+                           "height": height, "width": width})
+        with torch.no_grad():
+            return self.predictor.model(inputs)
+
+
+class _ExportedBackend(abc.ABC):
+    """
+    Shared by the exported backends: the network is traced through
+    Detectron2's TracingAdapter on one sample page, then run one page at a
+    time; the adapter's output schema rebuilds Instances from the flat tensors.
+    """
+
+    name = None
+
+    def __init__(self, predictor, sample_image, max_input_size=INFERENCE_CONFIG["max_input_size"],
+                 export_dir=INFERENCE_CONFIG["export_dir"]):
+        from detectron2.export import TracingAdapter
+
+        self.predictor = predictor
+        self.max_input_size = max_input_size
+        sample = preprocess(predictor, sample_image, max_input_size)
+        self.adapter = TracingAdapter(predictor.model, [{"image": sample}], _inference)
+        with torch.no_grad():
+            self.adapter(*self.adapter.flattened_inputs)  # Records adapter.outputs_schema
+
+        os.makedirs(export_dir, exist_ok=True)
+        height, width = sample.shape[1:]
+        self.export_stem = os.path.join(
+            export_dir, f"{os.path.splitext(os.path.basename(MODEL_PATH))[0]}.{height}x{width}")
+
+    @abc.abstractmethod
+    def _run(self, tensor):
+        """Runs the exported network on one preprocessed page; returns its flat output tensors."""
+
+    def predict(self, bgr_images):
+        from detectron2.modeling.postprocessing import detector_postprocess
+        from detectron2.structures import Instances
+
+        outputs = []
+        for image in bgr_images:
+            height, width = image.shape[:2]
+            tensor = preprocess(self.predictor, image, self.max_input_size)
+            instances = self.adapter.outputs_schema(self._run(tensor))[0]["instances"]
+            # The schema remembers the sample's size; this page's input size may differ
+            instances = Instances(tuple(tensor.shape[1:]), **instances.get_fields())
+            outputs.append({"instances": detector_postprocess(instances, height, width)})
+        return outputs
+
+
+class TorchScriptBackend(_ExportedBackend):
+    """Traced TorchScript module (frozen when possible)."""
+
+    name = "torchscript"
+
+    def __init__(self, predictor, sample_image, **kwargs):
+        super().__init__(predictor, sample_image, **kwargs)
+        path = f"{self.export_stem}.torchscript.pt"
+        if not _is_current(path):
+            logger.info(f"Exporting TorchScript model to {path}")
+            with torch.no_grad():
+                traced = torch.jit.trace(self.adapter, self.adapter.flattened_inputs)
+            try:
+                traced = torch.jit.freeze(traced.eval())
+            except Exception as e:
+                logger.warning(f"Could not freeze the TorchScript model, saving it unfrozen: {e}")
+            torch.jit.save(traced, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        self.module = torch.jit.load(path, map_location="cpu")
+
+    def _run(self, tensor):
+        with torch.no_grad():
+            return self.module(tensor)
+
+
+class OnnxBackend(_ExportedBackend):
+    """ONNX Runtime session on the CPU provider, optionally on a dynamically int8-quantised copy."""
+
+    name = "onnx"
+
+    def __init__(self, predictor, sample_image, quantize=INFERENCE_CONFIG["quantize"],
+                 intra_op_threads=INFERENCE_CONFIG["intra_op_threads"],
+                 inter_op_threads=INFERENCE_CONFIG["inter_op_threads"], **kwargs):
+        if onnxruntime is None:
+            raise ImportError("onnxruntime is not installed")
+        super().__init__(predictor, sample_image, **kwargs)
+
+        path = f"{self.export_stem}.onnx"
+        if not _is_current(path):
+            logger.info(f"Exporting ONNX model to {path}")
+            with torch.no_grad():
+                torch.onnx.export(self.adapter, self.adapter.flattened_inputs, f"{path}.tmp",
+                                  opset_version=ONNX_OPSET, input_names=["image"])
+            os.replace(f"{path}.tmp", path)
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantized_path = f"{self.export_stem}.int8.onnx"
+            if not _is_current(quantized_path, path):
+                logger.info(f"Quantising ONNX model to {quantized_path}")
+                quantize_dynamic(path, f"{quantized_path}.tmp", weight_type=QuantType.QInt8)
+                os.replace(f"{quantized_path}.tmp", quantized_path)
+            path = quantized_path
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads  # 0 lets ONNX Runtime decide
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run(self, tensor):
+        outputs = self.session.run(None, {self.input_name: tensor.numpy()})
+        return tuple(torch.from_numpy(output) for output in outputs)
+
+
+BACKENDS = {"eager": EagerBackend, "torchscript": TorchScriptBackend, "onnx": OnnxBackend}
+
+
+def get_backend(model, sample_image, name=INFERENCE_CONFIG["backend"], **options):
+    """
+    Returns the inference backend for a layoutparser Detectron2 model, built
+    once per model, backend and input size. Falls back to eager (with an
+    error in the log) if the export or the runtime is unavailable.
+    """
+    predictor = get_predictor(model)
+    max_input_size = options.get("max_input_size", INFERENCE_CONFIG["max_input_size"])
+    # Same page size -> same input size, so one export serves every page of a layout
+    key = (id(model), name, sample_image.shape[:2], tuple(sorted(options.items())))
+
+    with _backends_lock:
+        if key not in _backends:
+            try:
+                if name == "eager":
+                    backend = EagerBackend(predictor, max_input_size)
+                else:
+                    backend = BACKENDS[name](predictor, sample_image, **options)
+                logger.info(f"Layout model inference backend: {name}")
+            except Exception as e:
+                logger.error(f"Could not set up the {name} inference backend, using eager: {e}")
+                backend = EagerBackend(predictor, max_input_size)
+            _backends[key] = backend
+        return _backends[key]
+
+
+def predict(model, bgr_images):
+    """Detectron2 outputs for a batch of BGR pages from the configured backend (eager if that backend fails)."""
+    backend = get_backend(model, bgr_images[0])
+    if backend.name != "eager":
+        try:
+            return backend.predict(bgr_images)
+        except Exception as e:
+            logger.error(f"{backend.name} inference failed, retrying with eager: {e}")
+    return EagerBackend(backend.predictor, backend.max_input_size).predict(bgr_images)
+
+
+def _figure_box(model, output):
+    layout = model.gather_output(output)
+    figure = next((element for element in layout if element.type == "Figure"), None)
+    return None if figure is None else tuple(float(value) for value in figure.coordinates)
+
+
+def check_parity(model, bgr_images, name=INFERENCE_CONFIG["backend"],
+                 tolerance=INFERENCE_CONFIG["parity_tolerance"], **options):
+    """
+    Runs eager and the named backend on the same pages and compares the first
+    "Figure" box of each. Returns (passed, deviations) where deviations holds
+    the largest coordinate difference in pixels per page (None if only one
+    side found a figure, which fails the check).
+    """
+    predictor = get_predictor(model)
+    reference = EagerBackend(predictor, options.get("max_input_size", INFERENCE_CONFIG["max_input_size"]))
+    candidate = get_backend(model, bgr_images[0], name, **options)
+    if name != "eager" and candidate.name == "eager":
+        return False, []
+
+    deviations = []
+    for expected, actual in zip(reference.predict(bgr_images), candidate.predict(bgr_images)):
+        expected_box, actual_box = _figure_box(model, expected), _figure_box(model, actual)
+        if expected_box is None and actual_box is None:
+            deviations.append(0.0)
+        elif expected_box is None or actual_box is None:
+            deviations.append(None)
+        else:
+            deviations.append(max(abs(a - b) for a, b in zip(expected_box, actual_box)))
+    passed = all(deviation is not None and deviation <= tolerance for deviation in deviations)
+    return passed, deviations
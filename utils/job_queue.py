@@ -0,0 +1,371 @@
+# utils/job_queue.py
+#
+# Persistent job queue that decouples uploads from processing. The apps
+# enqueue a saved PDF (or a batch of PDFs) and return immediately; a bounded
+# pool of worker processes (started by the Streamlit process, or by a separate
+# `python -m utils.job_queue`) runs ingest_pdf / ingest_pdfs on one job at a
+# time per worker. Jobs live in SQLite, so they survive restarts and several
+# processes can share one queue.
+#   python -m utils.job_queue --workers 2
+
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import re
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import read_config
+from utils.result_cache import encode_result, decode_result
+from utils.image_store import collect_garbage
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+QUEUE_CONFIG = config["queue"]
+UPLOAD_DIR = config["paths"]["upload_dir"]
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def upload_path(name, upload_dir=UPLOAD_DIR):
+    """
+    Where to save an uploaded PDF before queueing it: the client's base name,
+    reduced to safe characters, behind a timestamp and random prefix, so
+    uploads with the same name (in one batch or from several instruments)
+    never overwrite each other.
+    """
+    name = re.sub(r"[^\w.-]", "_", os.path.basename(name.replace("\\", "/"))).lstrip(".") or "report.pdf"
+    if not name.lower().endswith(".pdf"):
+        name = f"{name}.pdf"
+    return os.path.join(upload_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}-{name}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Exists, owned by someone else
+        return True
+
+
+class JobQueue:
+    """
+    SQLite-backed FIFO of ingestion jobs with admission control: enqueue()
+    and enqueue_batch() refuse new work while max_pending reports are
+    waiting. A batch job carries its PDF list and per-file progress. A job goes
+    queued -> running -> done | failed; running jobs whose worker process
+    died are put back in the queue by requeue_stale(), at most max_attempts
+    times, so a PDF that crashes its worker cannot loop forever.
+    """
+
+    def __init__(self, path, max_pending=20, max_attempts=3):
+        self.path = path
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # Status polling does not block the workers
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pdf_path TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    worker_pid INTEGER,
+                    result TEXT,
+                    error TEXT,
+                    pdf_paths TEXT,
+                    report_count INTEGER NOT NULL DEFAULT 1,
+                    progress TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, id)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)  # Explicit transactions below
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, pdf_path, table_name):
+        """Adds a job and returns its id, or None if the queue is full (or unavailable)."""
+        return self._insert(pdf_path, table_name)
+
+    def enqueue_batch(self, pdf_paths, table_name):
+        """Adds one job for several PDFs (processed together by ingest_pdfs). Returns its id or None."""
+        return self._insert(pdf_paths[0], table_name, list(pdf_paths))
+
+    def _insert(self, pdf_path, table_name, pdf_paths=None):
+        report_count = len(pdf_paths) if pdf_paths else 1
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                pending = conn.execute("SELECT COALESCE(SUM(report_count), 0) FROM jobs WHERE status = ?",
+                                       (QUEUED,)).fetchone()[0]
+                if pending >= self.max_pending:
+                    conn.execute("ROLLBACK")
+                    logger.warning(f"Job queue full ({pending} reports waiting); refusing {pdf_path}")
+                    return None
+                job_id = conn.execute(
+                    "INSERT INTO jobs (pdf_path, table_name, status, created_at, pdf_paths, report_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (pdf_path, table_name, QUEUED, time.time(), json.dumps(pdf_paths) if pdf_paths else None,
+                     report_count),
+                ).lastrowid
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"Could not enqueue {pdf_path}: {e}")
+            return None
+        logger.info(f"Job {job_id} queued: {pdf_path}" + (f" and {report_count - 1} more" if pdf_paths else ""))
+        return job_id
+
+    def claim(self):
+        """
+        Marks the oldest queued job as running in this process. Returns
+        (id, pdf_path, table_name, pdf_paths) or None; pdf_paths is None
+        unless it is a batch job.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # One claimer at a time across processes
+            row = conn.execute(
+                "SELECT id, pdf_path, table_name, pdf_paths FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = ?, started_at = ?, worker_pid = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (RUNNING, time.time(), os.getpid(), row[0]))
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        return row[0], row[1], row[2], json.loads(row[3]) if row[3] else None
+
+    def set_progress(self, job_id, progress):
+        """Stores a batch job's per-file status rows (see ingest_pdfs)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def finish(self, job_id, result=None):
+        """Marks a job done; result is the ingest_pdf result (batch jobs keep their progress rows instead)."""
+        encoded = encode_result(result, ("data_is_valid", "cached", "correlation_id")) if result is not None else None
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, result = ? WHERE id = ?",
+                         (DONE, time.time(), encoded, job_id))
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                         (FAILED, time.time(), str(error), job_id))
+
+    def get(self, job_id):
+        """
+        Job status as a dict: id, status, pdf_path, created_at, started_at,
+        finished_at, error, position (jobs ahead while queued), result (the
+        ingest_pdf result dict once done) and, for batch jobs, pdf_paths and
+        progress (per-file status rows). None for an unknown id.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, pdf_path, created_at, started_at, finished_at, error, result, pdf_paths, progress "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            position = 0
+            if row[1] == QUEUED:
+                position = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?",
+                                        (QUEUED, job_id)).fetchone()[0]
+        job = dict(zip(("id", "status", "pdf_path", "created_at", "started_at", "finished_at", "error"), row[:7]))
+        job["position"] = position
+        job["result"] = decode_result(row[7]) if row[7] else None
+        job["pdf_paths"] = json.loads(row[8]) if row[8] else None
+        job["progress"] = json.loads(row[9]) if row[9] else None
+        return job
+
+    def pending_reports(self):
+        """Number of reports waiting in queued jobs (what admission compares with max_pending)."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(report_count), 0) FROM jobs WHERE status = ?",
+                                (QUEUED,)).fetchone()[0]
+
+    def counts(self):
+        """Number of jobs per status."""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def requeue_stale(self):
+        """
+        Puts running jobs whose worker process is gone back in the queue, or
+        fails them once they were claimed max_attempts times. Returns how many
+        were requeued.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [(job_id, attempts) for job_id, pid, attempts in conn.execute(
+                "SELECT id, worker_pid, attempts FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+                if pid is None or not _pid_alive(pid)]
+            requeued = 0
+            for job_id, attempts in stale:
+                if attempts >= self.max_attempts:
+                    conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                                 (FAILED, time.time(), f"Worker process died {attempts} times on this job", job_id))
+                    logger.error(f"Job {job_id} failed: its worker died {attempts} times")
+                else:
+                    conn.execute("UPDATE jobs SET status = ?, started_at = NULL, worker_pid = NULL WHERE id = ?",
+                                 (QUEUED, job_id))
+                    requeued += 1
+            conn.execute("COMMIT")
+        if requeued:
+            logger.warning(f"Requeued {requeued} job(s) from dead workers")
+        return requeued
+
+    def purge(self, keep_days=QUEUE_CONFIG["keep_days"]):
+        """Deletes finished jobs older than keep_days."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                         (DONE, FAILED, time.time() - keep_days * 24 * 3600))
+
+
+# Shared queue instance
+job_queue = JobQueue(QUEUE_CONFIG["path"], QUEUE_CONFIG["max_pending"], QUEUE_CONFIG["max_attempts"])
+
+_supervisor = None
+_worker_count = 0
+_supervisor_lock = threading.Lock()
+# PyMuPDF is not thread-safe, so each worker is its own process. They are
+# forked, like batch_ingest's pool: spawn would re-run __main__, which under
+# Streamlit is the app script, and the apps never import PyMuPDF or torch
+# before forking. Workers are started and restarted by a supervisor process,
+# which has a single thread to fork from (a fork from a thread of the app can
+# copy a lock another thread holds). None of them is daemonic, so workers can
+# have processes of their own.
+_context = multiprocessing.get_context("fork")
+_stop = None
+# Seconds between the supervisor's checks for dead workers
+SUPERVISE_INTERVAL = 5.0
+
+
+def _work(index, pool_workers, poll_interval, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent stops workers between jobs
+    from utils.model import start_warmup  # Workers pay for the PDF/vision imports, not the UI
+    from utils.pipeline import ingest_pdf, ingest_pdfs, pooled_page_workers
+    from utils.metrics import write_prometheus
+
+    start_warmup()  # Each worker process loads its own layout model
+    root, extension = os.path.splitext(config["metrics"]["prometheus_file"])
+    metrics_path = f"{root}-worker{index}{extension}"
+    page_workers = pooled_page_workers(pool_workers)
+    parent = multiprocessing.parent_process()
+
+    while not stop.is_set() and parent.is_alive():
+        try:
+            job = job_queue.claim()
+        except sqlite3.Error as e:
+            logger.error(f"Could not claim a job: {e}")
+            job = None
+        if job is None:
+            time.sleep(poll_interval)  # Not stop.wait(): a Ctrl-C during set() would break its condition
+            continue
+
+        job_id, pdf_path, table_name, pdf_paths = job
+        try:
+            if pdf_paths:
+                ingest_pdfs(pdf_paths, table_name, progress=lambda rows: job_queue.set_progress(job_id, rows),
+                            workers=page_workers)
+                job_queue.finish(job_id)
+            else:
+                job_queue.finish(job_id, ingest_pdf(pdf_path, table_name, page_workers))
+            logger.info(f"Job {job_id} done: {pdf_path}")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            job_queue.fail(job_id, e)
+        write_prometheus(metrics_path, labels={"worker": str(index)})
+
+
+def _start_worker(index, workers, poll_interval, stop):
+    process = _context.Process(target=_work, args=(index, workers, poll_interval, stop), name=f"job-worker-{index}")
+    process.start()
+    return process
+
+
+def _supervise(workers, poll_interval, stop):
+    """
+    Runs the worker processes: restarts any that die (OOM kill, crash in
+    native code) and requeues their jobs, until stop is set or the parent
+    exits.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = multiprocessing.parent_process()
+    processes = [_start_worker(index, workers, poll_interval, stop) for index in range(workers)]
+
+    while not stop.is_set() and parent.is_alive():
+        time.sleep(SUPERVISE_INTERVAL)
+        dead = [index for index, process in enumerate(processes) if not process.is_alive()]
+        if not dead or stop.is_set():
+            continue
+        for index in dead:
+            logger.error(f"Job worker {index} died (exit code {processes[index].exitcode}); restarting it")
+        job_queue.requeue_stale()
+        for index in dead:
+            processes[index] = _start_worker(index, workers, poll_interval, stop)
+
+    stop.set()  # Also when the parent died without stopping the workers
+    for process in processes:
+        process.join()
+
+
+def start_workers(workers=QUEUE_CONFIG["workers"], poll_interval=QUEUE_CONFIG["poll_interval"]):
+    """Starts the worker processes of this process once (later calls are no-ops). Returns the process count."""
+    global _supervisor, _stop, _worker_count
+    with _supervisor_lock:
+        if _supervisor is None:
+            _stop = _context.Event()
+            job_queue.requeue_stale()
+            job_queue.purge()
+            collect_garbage()  # Image store retention
+            _supervisor = _context.Process(target=_supervise, args=(workers, poll_interval, _stop),
+                                           name="job-supervisor")
+            _supervisor.start()
+            _worker_count = workers
+            atexit.register(stop_workers)  # Non-daemonic workers would otherwise keep the parent from exiting
+            logger.info(f"Started {workers} job worker process(es)")
+        return _worker_count
+
+
+def stop_workers(timeout=None):
+    """Lets each worker finish its current job, then stops it."""
+    if _supervisor is None:
+        return
+    _stop.set()
+    _supervisor.join(timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued report uploads.")
+    parser.add_argument("--workers", type=int, default=QUEUE_CONFIG["workers"])
+    args = parser.parse_args()
+
+    start_workers(args.workers)
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Job queue: {job_queue.counts()}")
+    except KeyboardInterrupt:
+        logger.info("Stopping job workers after their current jobs...")
+        stop_workers()
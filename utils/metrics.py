@@ -0,0 +1,362 @@
+# utils/metrics.py
+#
+# Per-stage spans for the report pipeline (render, text, parse, detect, crop,
+# db_write, db_fetch). A span records its stage, duration, outcome, optional
+# byte size and the correlation ID of the report it belongs to. Every span is
+#   - appended as one JSON line to METRICS.JSON_LOG (shared by all processes,
+#     rotated at JSON_LOG_MAX_MB),
+#   - aggregated in-process into Prometheus counters and histograms, written
+#     by write_prometheus(),
+#   - kept in a short in-memory history of this process (recent_spans()).
+# The job workers and page readers run in processes of their own, so the
+# apps' "Pipeline stats" panel reads the tail of the JSON log, and the
+# /metrics endpoint (start_metrics_server()) aggregates the spans every
+# process appends to it.
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+import numpy as np
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+METRICS_CONFIG = config["metrics"]
+
+METRIC_PREFIX = "biorad_pipeline"
+# Histogram buckets (seconds): sub-10 ms text parsing up to multi-second detection
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+
+class _Aggregates:
+    """Prometheus counters and histograms of a stream of spans."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)                          # (stage, outcome) -> spans
+        self.bucket_counts = defaultdict(lambda: [0] * len(BUCKETS))  # stage -> cumulative counts per bucket
+        self.duration_sums = defaultdict(float)                 # stage -> seconds
+        self.duration_counts = defaultdict(int)                 # stage -> spans
+        self.byte_sums = defaultdict(int)                       # stage -> bytes
+
+    def add(self, record):
+        stage, seconds = record["stage"], record["duration_ms"] / 1000
+        self.counts[(stage, record["outcome"])] += 1
+        self.duration_sums[stage] += seconds
+        self.duration_counts[stage] += 1
+        if record.get("bytes"):
+            self.byte_sums[stage] += record["bytes"]
+        buckets = self.bucket_counts[stage]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+
+    def render(self, labels=None):
+        """The aggregates in the Prometheus text exposition format, with optional extra labels."""
+        extra = "".join(f',{name}="{value}"' for name, value in (labels or {}).items())
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent in each pipeline stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+        ]
+        for stage in sorted(self.duration_counts):
+            for bound, count in zip(BUCKETS, self.bucket_counts[stage]):
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"{extra}}} {count}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"{extra}}} '
+                         f'{self.duration_counts[stage]}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{stage}"{extra}}} '
+                         f'{self.duration_sums[stage]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{stage}"{extra}}} '
+                         f'{self.duration_counts[stage]}')
+
+        lines += [f"# HELP {METRIC_PREFIX}_stage_total Pipeline stage executions by outcome.",
+                  f"# TYPE {METRIC_PREFIX}_stage_total counter"]
+        for (stage, outcome), count in sorted(self.counts.items()):
+            lines.append(f'{METRIC_PREFIX}_stage_total{{stage="{stage}",outcome="{outcome}"{extra}}} {count}')
+
+        lines += [f"# HELP {METRIC_PREFIX}_stage_bytes_total Bytes produced by each pipeline stage.",
+                  f"# TYPE {METRIC_PREFIX}_stage_bytes_total counter"]
+        for stage, total in sorted(self.byte_sums.items()):
+            lines.append(f'{METRIC_PREFIX}_stage_bytes_total{{stage="{stage}"{extra}}} {total}')
+        return "\n".join(lines) + "\n"
+
+
+_lock = threading.Lock()
+_recent = deque(maxlen=METRICS_CONFIG["recent_spans"])
+_aggregates = _Aggregates()       # Spans of this process
+_json_logger = None
+_server = None
+_log_lock = threading.Lock()
+_logged_aggregates = _Aggregates()  # Spans of every process, read from the JSON log by the /metrics endpoint
+_log_position = None               # (inode, offset) of the JSON log read so far
+
+
+def new_correlation_id():
+    return uuid.uuid4().hex[:12]
+
+
+def get_correlation_id():
+    """Correlation ID of the report being processed in this context, or None."""
+    return _correlation_id.get()
+
+
+@contextmanager
+def correlation_scope(correlation_id=None):
+    """Tags every span in the with-block (same thread) with one correlation ID, new unless given."""
+    token = _correlation_id.set(correlation_id or new_correlation_id())
+    try:
+        yield _correlation_id.get()
+    finally:
+        _correlation_id.reset(token)
+
+
+class _SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler for a file that several processes append to: a
+    process whose file was rotated by another one reopens the new file
+    instead of writing on (and rotating again) the old one.
+    """
+
+    def shouldRollover(self, record):
+        if self.stream is not None:
+            try:
+                inode = os.stat(self.baseFilename).st_ino
+            except OSError:
+                inode = None
+            if inode != os.fstat(self.stream.fileno()).st_ino:
+                self.stream.close()
+                self.stream = self._open()
+        return super().shouldRollover(record)
+
+
+def _get_json_logger():
+    global _json_logger
+    if _json_logger is None:
+        json_logger = logging.getLogger("pipeline_spans")
+        json_logger.setLevel(logging.INFO)
+        json_logger.propagate = False  # Keep spans out of the console log
+        if not json_logger.handlers:
+            os.makedirs(os.path.dirname(METRICS_CONFIG["json_log"]), exist_ok=True)
+            handler = _SharedRotatingFileHandler(METRICS_CONFIG["json_log"], encoding="utf-8",
+                                                 maxBytes=int(METRICS_CONFIG["json_log_max_mb"] * 1024 * 1024),
+                                                 backupCount=METRICS_CONFIG["json_log_backups"])
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            json_logger.addHandler(handler)
+        _json_logger = json_logger
+    return _json_logger
+
+
+def record_span(record):
+    """Aggregates one finished span (see span()) and writes its JSON log line."""
+    with _lock:
+        _recent.append(record)
+        _aggregates.add(record)
+
+    try:
+        _get_json_logger().info(json.dumps(
+            {"ts": datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), **record}, default=str))
+    except OSError as e:
+        logger.error(f"Could not write span to {METRICS_CONFIG['json_log']}: {e}")
+
+
+@contextmanager
+def span(stage, correlation_id=None, **fields):
+    """
+    Times the with-block as one pipeline stage. Yields the span record (a
+    dict): set record["bytes"], record["outcome"] or extra fields inside the
+    block. An exception escaping the block marks the span "error".
+    """
+    record = {"stage": stage, "correlation_id": correlation_id or get_correlation_id(),
+              "outcome": "ok", "bytes": None, **fields}
+    if not METRICS_CONFIG["enabled"]:
+        yield record
+        return
+
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record["outcome"] = "error"
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        record_span(record)
+
+
+def recent_spans(limit=None):
+    """The most recent spans of this process, oldest first."""
+    with _lock:
+        spans = list(_recent)
+    return spans[-limit:] if limit else spans
+
+
+def logged_spans(limit=METRICS_CONFIG["recent_spans"], chunk_bytes=1 << 20):
+    """The most recent spans of all processes (job workers included), read from the tail of the JSON log."""
+    try:
+        with open(METRICS_CONFIG["json_log"], "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - chunk_bytes))
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    if size > chunk_bytes:
+        lines = lines[1:]  # First line may be cut
+    spans = []
+    for line in lines[-limit:]:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue  # Line still being written by another process
+    return spans
+
+
+def stage_summary(limit=None, spans=None):
+    """Latency breakdown per stage of spans (default: this process's recent spans), for the stats panel."""
+    durations, errors = defaultdict(list), defaultdict(int)
+    for record in spans if spans is not None else recent_spans(limit):
+        durations[record["stage"]].append(record["duration_ms"])
+        errors[record["stage"]] += record["outcome"] != "ok"
+    return [
+        {
+            "stage": stage,
+            "count": len(values),
+            "p50 ms": round(float(np.percentile(values, 50)), 1),
+            "p95 ms": round(float(np.percentile(values, 95)), 1),
+            "last ms": round(values[-1], 1),
+            "not ok": errors[stage],
+        }
+        for stage, values in durations.items()
+    ]
+
+
+def render_prometheus(labels=None):
+    """This process's aggregates in the Prometheus text exposition format, with optional extra labels."""
+    with _lock:
+        return _aggregates.render(labels)
+
+
+def _rotated_log_lines(path, inode, offset):
+    """Lines appended after offset to the log file with this inode, now rotated to path.1."""
+    try:
+        with open(f"{path}.1", "rb") as f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                return []  # Rotated more than once since the last read
+            f.seek(offset)
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def _new_logged_spans():
+    """
+    Spans appended to the JSON log by any process since the previous call
+    (the first call only notes the end of the log), following rotations.
+    Call with _log_lock held.
+    """
+    global _log_position
+    path = METRICS_CONFIG["json_log"]
+    lines = []
+    try:
+        with open(path, "rb") as f:
+            inode, size = os.fstat(f.fileno()).st_ino, f.seek(0, os.SEEK_END)
+            if _log_position is None:
+                _log_position = (inode, size)
+            previous_inode, offset = _log_position
+            if inode != previous_inode:
+                lines += _rotated_log_lines(path, previous_inode, offset)
+                offset = 0
+            elif offset > size:  # Truncated
+                offset = 0
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        if _log_position is None:
+            _log_position = (None, 0)  # Nothing logged yet: count the file from its start
+        return []
+    except OSError:
+        return []
+    end = data.rfind(b"\n") + 1  # A line still being written is read next time
+    _log_position = (inode, offset + end)
+    lines += data[:end].splitlines()
+
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue
+    return spans
+
+
+def render_logged_prometheus(labels=None):
+    """
+    Aggregates of the spans of every process (job workers, page readers,
+    batch workers) logged since the first call, in the Prometheus text
+    exposition format.
+    """
+    with _log_lock:
+        for record in _new_logged_spans():
+            _logged_aggregates.add(record)
+        return _logged_aggregates.render(labels)
+
+
+def write_prometheus(path=None, labels=None):
+    """Writes render_prometheus(labels) atomically to path (default METRICS.PROMETHEUS_FILE). Returns the path or None."""
+    path = path or METRICS_CONFIG["prometheus_file"]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(render_prometheus(labels))
+        os.replace(f"{path}.tmp", path)
+        return path
+    except OSError as e:
+        logger.error(f"Could not write metrics file {path}: {e}")
+        return None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_logged_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def start_metrics_server(port=METRICS_CONFIG["port"]):
+    """
+    Serves GET /metrics (render_logged_prometheus()) on a daemon thread, once
+    per process; no-op when port is 0. Returns the port or None.
+    """
+    global _server
+    with _lock:
+        if _server is None and port:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                # Another process (e.g. a second app) already serves this port
+                logger.error(f"Could not start metrics endpoint on port {port}: {e}")
+                return None
+            render_logged_prometheus()  # Counts start now
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Metrics endpoint: http://0.0.0.0:{port}/metrics")
+    return _server.server_address[1] if _server is not None else None
@@ -1,18 +1,40 @@
 # Utils/model.py
+#
+# Lazy facade over the layout model. Importing this module is cheap: torch and
+# the Detectron2 checkpoint are only loaded by the first get_model() call, or
+# ahead of time on a background thread by start_warmup(). model_status()
+# reports readiness so the UI can render before the model is available.
+
+import threading
+import time
 
-import torch
 from utils.logger import app_logger as logger
 from config import read_config
-import streamlit as st
 
 # Load configuration
 config = read_config()
 MODEL_PATH = config["paths"]["model_path"]
 
-@st.cache_resource
+NOT_LOADED = "not loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+_model = None
+_status = NOT_LOADED
+_load_seconds = None
+_load_lock = threading.Lock()       # Held for the whole load so concurrent callers wait for one load
+_loaded = threading.Event()
+_warmup_thread = None
+
+
 def load_model():
     """Loads the Detectron2 model"""
+    import torch  # Deferred: importing torch alone takes seconds
+    from utils.inference import configure_threads
+
     try:
+        configure_threads()
         model = torch.load(MODEL_PATH, map_location=torch.device("cpu"))
         logger.info(f"Model loaded successfully from: {MODEL_PATH}")
         return model
@@ -20,5 +42,49 @@ def load_model():
         logger.error(f"Error loading model: {e}")
         return None
 
-model = load_model()
 
+def _load_once():
+    global _model, _status, _load_seconds
+    with _load_lock:
+        if _loaded.is_set():
+            return _model
+        _status = LOADING
+        started = time.perf_counter()
+        try:
+            _model = load_model()
+        except Exception as e:  # e.g. torch itself is missing
+            logger.error(f"Error loading model: {e}")
+            _model = None
+        _load_seconds = time.perf_counter() - started
+        _status = READY if _model is not None else FAILED
+        _loaded.set()
+        return _model
+
+
+def get_model(wait=True):
+    """
+    Returns the layout model, loading it on first use (once per process).
+    Returns None if it failed to load, or, with wait=False, while it is
+    still loading.
+    """
+    if _loaded.is_set():
+        return _model
+    if not wait:
+        return None
+    return _load_once()
+
+
+def start_warmup():
+    """Starts loading the model on a daemon thread and returns immediately (no-op after the first call)."""
+    global _warmup_thread, _status
+    with _load_lock:
+        if _warmup_thread is not None or _loaded.is_set():
+            return
+        _status = LOADING
+        _warmup_thread = threading.Thread(target=_load_once, name="model-warmup", daemon=True)
+    _warmup_thread.start()
+
+
+def model_status():
+    """Readiness for the UI: {"status": not loaded|loading|ready|failed, "load_seconds": float or None}."""
+    return {"status": _status, "load_seconds": _load_seconds}
@@ -2,25 +2,43 @@
 
 import fitz  # PyMuPDF
 import re
+import numpy as np
 import pandas as pd
-from pdf2image import convert_from_path
 from config import read_config
-import os
 
 from utils.logger import app_logger as logger
 
 # Load configuration
 config = read_config()
 UPLOAD_DIR = config["paths"]["upload_dir"]
-IMAGE_DIR = config["paths"]["image_dir"]
+
+# The layout model sees a small render; the saved figure is rendered sharp from the vector page
+DETECT_DPI = config["detection"]["detect_dpi"]
+FIGURE_DPI = config["detection"]["figure_dpi"]
+
+
+def render_page(page, dpi, clip=None):
+    """
+    Renders a PyMuPDF page straight into an RGB NumPy array (height x width x 3).
+    clip limits the render to a rectangle of the displayed (rotated) page.
+    """
+    pixmap = page.get_pixmap(dpi=dpi, alpha=False, colorspace=fitz.csRGB, clip=clip)
+    image = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+    return image
+
+
+def render_region(page, rect, dpi=FIGURE_DPI):
+    """Renders only rect (PDF coordinates, unrotated, as from the figure locator) of a page at dpi."""
+    return render_page(page, dpi, clip=fitz.Rect(rect) * page.rotation_matrix)
+
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF."""
     logger.info(f"Extracting text from PDF: {pdf_path}")
     
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(0)
-    text = page.get_text("text")
+    with fitz.open(pdf_path) as doc:
+        page = doc.load_page(0)
+        text = page.get_text("text")
     
     logger.info("Text extraction completed.")
     return text
@@ -73,33 +91,3 @@ def extract_table_from_text(text):
         logger.warning("No table data found.")
 
     return df, sample_id, report_generated
-
-
-
-def extract_images_from_pdf(pdf_path):
-    """Converts PDF to image"""
-    # image = convert_from_path(pdf_path)[0]
-    # filename = os.path.splitext(os.path.basename(pdf_path))[0]
-    # image_path = os.path.join(IMAGE_DIR, f"{filename}.jpg")
-    # image.save(image_path, "JPEG")
-    # return image_path
-
-    try:
-        logger.info(f"Starting image extraction from PDF: {pdf_path}")
-
-        # Convert PDF to image
-        image = convert_from_path(pdf_path)[0]
-
-        if not image:
-            logger.warning("No images were extracted from the pdf.")
-            return None
-        
-        # Svae the extracted image
-        filename = os.path.splitext(os.path.basename(pdf_path))[0]
-        image_path = os.path.join(IMAGE_DIR, f"{filename}.jpg")
-        image.save(image_path, "JPEG")
-        logger.info(f"Image extracted and saved: {image_path}")
-        return image_path
-    except Exception as e:
-        logger.error(f"Error extracting image from PDF {pdf_path}: {e}")
-        return None
\ No newline at end of file
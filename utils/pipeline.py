@@ -0,0 +1,422 @@
+# utils/pipeline.py
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import fitz  # PyMuPDF
+
+from utils.pdf_extractor import render_page, render_region, DETECT_DPI, FIGURE_DPI
+from utils.report_parser import parse_words, parse_report_date, NOT_FOUND
+from utils.model import get_model, model_status, FAILED
+from utils.utils import save_figure_crop, detect_figure_boxes, BATCH_SIZE, PAGE_WORKERS
+from utils.figure_locator import (layout_fingerprint, locate_figure_rect, locate_plot_from_drawings,
+                                  remember_figure_rect, pixels_to_rect, find_plot_area)
+from utils.trace_extractor import extract_trace_from_drawings, extract_trace_from_image, save_trace
+from utils.result_cache import result_cache, hash_pdf_file
+from sql_queries.save_table_to_db import save_tables_to_db
+from utils.metrics import span, correlation_scope, get_correlation_id, new_correlation_id
+from utils.logger import app_logger as logger
+
+# PyMuPDF is not thread-safe: the prefetch thread of _read_pages and the thread
+# finishing the current batch take turns on it
+_fitz_lock = threading.Lock()
+
+
+def _render_figure(page, rect, correlation_id):
+    """Renders only the figure rectangle (PDF coordinates) of a page, at FIGURE_DPI."""
+    with span("render", correlation_id, dpi=FIGURE_DPI, region="figure") as stage:
+        figure = render_region(page, rect, FIGURE_DPI)
+        stage["bytes"] = figure.nbytes
+    return figure
+
+
+def _read_page(pdf_path, page_number=0, correlation_id=None):
+    """
+    Opens a PDF once and reads one page (the first by default): the parsed
+    report fields and peaks, the vector chromatogram trace if there is one and
+    the figure. When the vector locator recognises the layout, only the figure
+    rectangle is rendered (at FIGURE_DPI); otherwise the page is rendered at
+    the small DETECT_DPI for the layout model and the figure is rendered later
+    by _finish_records. The record can be pickled, so pages can be read in
+    reader processes (see _read_pages). PyMuPDF is not thread-safe: within
+    one process, call this only while holding _fitz_lock.
+    """
+    correlation_id = correlation_id or get_correlation_id() or new_correlation_id()
+    with fitz.open(pdf_path) as doc:
+        page = doc.load_page(page_number)
+        # Multi-sample exports get one figure/trace file per page
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        if doc.page_count > 1:
+            name = f"{name}_p{page_number + 1:03d}"
+        drawings = page.get_drawings()
+        with span("text", correlation_id) as stage:
+            words = page.get_text("words")
+            stage["bytes"] = sum(len(word[4]) for word in words)
+        with span("parse", correlation_id) as stage:
+            report = parse_words(words)
+            if not report.peaks:
+                stage["outcome"] = "no_table"
+        record = {
+            "pdf_path": pdf_path,
+            "page_number": page_number,
+            "name": name,
+            "correlation_id": correlation_id,
+            "report": report,
+            "image": None,   # DETECT_DPI page render, only while waiting for the model
+            "figure": None,  # FIGURE_DPI render of the figure rectangle
+            "fingerprint": layout_fingerprint(page, words),
+            "derotation": page.derotation_matrix,
+            "trace": None,
+        }
+        # Never waits for the model: known layouts do not need it, and new ones are detected by _finish_records
+        model_failed = model_status()["status"] == FAILED
+        rect = locate_figure_rect(page, record["fingerprint"], trust_unknown=model_failed, drawings=drawings)
+        if rect is not None:
+            record["figure"] = _render_figure(page, rect, correlation_id)
+        elif not model_failed:
+            with span("render", correlation_id, dpi=DETECT_DPI, region="page") as stage:
+                record["image"] = render_page(page, DETECT_DPI)
+                stage["bytes"] = record["image"].nbytes
+
+        try:
+            plot_area = find_plot_area(page, drawings)
+            if plot_area is not None:
+                record["trace"] = extract_trace_from_drawings(page, plot_area, drawings)
+        except Exception as e:
+            logger.error(f"Error extracting vector trace from {pdf_path}: {e}")
+    return record
+
+
+def _trace_name(report, name):
+    """
+    Trace file name of a page: sample ID and report date, so every run of a
+    sample keeps its own trace; the page name when either is missing.
+    """
+    report_date = parse_report_date(report.report_generated)
+    if report.sample_id == NOT_FOUND or report_date is None:
+        return name
+    return f"{report.sample_id}_{report_date:%Y%m%d-%H%M%S}"
+
+
+def _finish_records(records, batch_size):
+    """
+    Runs the model only on pages the vector locator could not place (waiting
+    for it to load if needed), renders the detected figure rectangles at
+    FIGURE_DPI and saves the figures.
+    """
+    pending = [record for record in records if record["image"] is not None]
+    if pending:
+        model_ready = get_model() is not None  # The only place where ingestion waits for the model to load
+        boxes = [None] * len(pending)
+        if model_ready:
+            try:
+                # One span per forward pass; it covers every report in the batch
+                with span("detect", ",".join(record["correlation_id"] for record in pending), pages=len(pending)):
+                    boxes = detect_figure_boxes([record["image"] for record in pending], batch_size, DETECT_DPI)
+            except Exception as e:
+                logger.error(f"Error detecting figures: {e}")
+        for record, box in zip(pending, boxes):
+            record["image"] = None  # The low-resolution render is not needed any more
+            if box is None and model_ready:
+                continue
+            try:
+                with _fitz_lock, fitz.open(record["pdf_path"]) as doc:
+                    page = doc.load_page(record["page_number"])
+                    if box is None:
+                        # The model failed to load: fall back to the plot located from the vector drawings
+                        rect = locate_plot_from_drawings(page)
+                        if rect is None:
+                            continue
+                    else:
+                        rect = pixels_to_rect(box, DETECT_DPI, record["derotation"])
+                        remember_figure_rect(record["fingerprint"], rect)
+                    record["figure"] = _render_figure(page, rect, record["correlation_id"])
+            except Exception as e:
+                logger.error(f"Error rendering the figure of {record['name']}: {e}")
+
+    results = []
+    for record in records:
+        name = record["name"]
+        report = record["report"]
+
+        figure_path = None
+        trace = record["trace"]
+        cropped_figure = record["figure"]
+        if cropped_figure is not None:
+            with span("crop", record["correlation_id"]) as stage:
+                sample_id = report.sample_id if report.sample_id != NOT_FOUND else None
+                figure_path = save_figure_crop(cropped_figure, name, sample_id)
+                stage["bytes"] = os.path.getsize(figure_path)
+            logger.info(f"Figure extracted: {figure_path}")
+            if trace is None:
+                # Raster-only chromatogram: trace it from the crop
+                try:
+                    trace = extract_trace_from_image(cropped_figure)
+                except Exception as e:
+                    logger.error(f"Error tracing chromatogram in {name}: {e}")
+        else:
+            logger.warning(f"No figure detected in page: {name}")
+
+        trace_path = None
+        if trace is not None:
+            trace_path = save_trace(trace, _trace_name(report, name))
+
+        results.append({
+            "peaks": report.peaks,
+            "sample_id": report.sample_id,
+            "report_generated": report.report_generated,
+            "figure_path": figure_path,
+            "trace_path": trace_path,
+            "page_number": record["page_number"],
+            "correlation_id": record["correlation_id"],
+        })
+    return results
+
+
+def _is_sample_page(result):
+    return bool(result["peaks"]) or result["sample_id"] != NOT_FOUND
+
+
+def _read_page_locked(pdf_path, page_number=0, correlation_id=None):
+    with _fitz_lock:
+        return _read_page(pdf_path, page_number, correlation_id)
+
+
+def _read_pages(tasks, batch_size=BATCH_SIZE, workers=PAGE_WORKERS):
+    """
+    Reads (pdf_path, page_number, correlation_id) tasks and finishes them
+    batch_size at a time, yielding (task, result) in task order; result is
+    None for a page that could not be read. Reading always runs ahead of
+    detection: with several workers, pages are read in parallel by `workers`
+    processes (PyMuPDF is not thread-safe); with one, a background thread
+    reads the next batch (of this or the next PDF) while the current one is
+    detected and saved. At most 2 * workers + batch_size pages (2 * batch_size
+    with one worker) are held at any moment.
+    """
+    if workers > 1 and len(tasks) > 1:
+        reader = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+        read, ahead = _read_page, 2 * workers
+    else:
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-prefetch")
+        read, ahead = _read_page_locked, batch_size
+    waiting, in_flight, batch = deque(tasks), deque(), []
+
+    def read_ahead():
+        # Keep the readers busy without letting rendered pages pile up
+        while waiting and len(in_flight) < ahead:
+            task = waiting.popleft()
+            in_flight.append((task, reader.submit(read, *task)))
+
+    try:
+        read_ahead()
+        while in_flight:
+            task, future = in_flight.popleft()
+            try:
+                batch.append((task, future.result()))
+            except Exception as e:
+                logger.error(f"Error reading page {task[1] + 1} of {task[0]}: {e}")
+                yield task, None
+            read_ahead()  # Before finishing the batch, so the next pages are read while it is detected
+
+            if batch and (len(batch) >= batch_size or not in_flight):
+                yield from zip((task for task, _ in batch), _finish_records([record for _, record in batch], batch_size))
+                batch = []
+    finally:
+        reader.shutdown(cancel_futures=True)
+
+
+def _page_tasks(pdf_path, page_count, correlation_id):
+    """One _read_pages task per page; pages of a multi-page PDF get their own correlation ID suffix."""
+    return [(pdf_path, page_number, correlation_id if page_count == 1 else f"{correlation_id}-p{page_number + 1}")
+            for page_number in range(page_count)]
+
+
+def _keep_page(result, page_count, pdf_path):
+    if page_count == 1 or _is_sample_page(result):
+        return True
+    logger.info(f"Skipping page {result['page_number'] + 1} of {pdf_path}: no sample data")
+    return False
+
+
+def iter_report_pages(pdf_path, batch_size=BATCH_SIZE, workers=PAGE_WORKERS):
+    """
+    Yields one result per sample page of a report PDF, in page order, so a
+    whole-run export with many samples is handled like many single reports.
+    Pages are read ahead by `workers` processes (or one prefetch thread) and
+    detected batch_size at a time (see _read_pages), however long the PDF. Pages without a sample ID or
+    peak table (cover or summary pages) are skipped; a single-page PDF always
+    yields its page.
+    """
+    with _fitz_lock, fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    tasks = _page_tasks(pdf_path, page_count, get_correlation_id() or new_correlation_id())
+    for _, result in _read_pages(tasks, batch_size, workers):
+        if result is not None and _keep_page(result, page_count, pdf_path):
+            yield result
+
+
+def pooled_page_workers(pool_workers):
+    """
+    Page readers for each of pool_workers processes that ingest at once (job
+    queue, batch and watch-folder pools), so the pool has PAGE_WORKERS page
+    readers in all rather than pool_workers * PAGE_WORKERS processes.
+    """
+    return max(1, PAGE_WORKERS // max(1, pool_workers))
+
+
+def ingest_pdf(pdf_path, table_name, workers=PAGE_WORKERS):
+    """
+    Extracts a report and saves its rows, reusing the cached result when the
+    same PDF bytes were seen before. A report whose rows were already committed
+    is never inserted again. A multi-sample export saves every sample page in
+    one transaction; the result's top-level fields describe the first sample,
+    "samples" lists every sample (peaks, IDs, figure per page) and
+    "sample_count" and "row_count" cover all of them. Adds "table_saved", "data_is_valid", "cached"
+    and the "correlation_id" that tags this report's spans and log lines.
+    Pages are read by `workers` processes (see iter_report_pages).
+    """
+    with correlation_scope() as correlation_id:
+        logger.info(f"Ingesting {pdf_path} (correlation ID {correlation_id})")
+        result = _ingest_pdf(pdf_path, table_name, workers)
+        result["correlation_id"] = correlation_id
+        return result
+
+
+def _valid_samples(result, samples):
+    """Samples whose rows can be saved; sets result's "data_is_valid" and "row_count"."""
+    valid = [
+        sample for sample in samples
+        if sample["peaks"] and sample["sample_id"] not in (None, NOT_FOUND)
+        and sample["report_generated"] not in (None, NOT_FOUND)
+    ]
+    result["data_is_valid"] = bool(valid)
+    result["row_count"] = sum(len(sample["peaks"]) for sample in valid)
+    return valid
+
+
+def _sample_rows(samples):
+    return [(sample["sample_id"], sample["report_generated"], sample["peaks"]) for sample in samples]
+
+
+def _ingest_pdf(pdf_path, table_name, workers):
+    pdf_hash = hash_pdf_file(pdf_path)
+    result = result_cache.get(pdf_hash, table_name)
+    cached = result is not None
+
+    if result is None:
+        samples = list(iter_report_pages(pdf_path, workers=workers)) or [_empty_result()]
+        result = dict(samples[0], sample_count=len(samples), samples=samples, table_saved=False)
+    samples = result["samples"]
+
+    # Check if the extracted data is valid before saving to the database
+    valid = _valid_samples(result, samples)
+
+    if result["data_is_valid"] and not result["table_saved"]:
+        # Every sample of a multi-sample export in one transaction
+        result["table_saved"] = save_tables_to_db(_sample_rows(valid), table_name)
+        if result["table_saved"]:
+            logger.info(f"Data successfully saved to the database ({len(valid)} sample(s)).")
+        else:
+            logger.error("Failed to save data to the database.")
+        result_cache.put(pdf_hash, result, table_name)
+    elif not cached:
+        logger.warning("Missing required data (table, sample ID, or report date).")
+        result_cache.put(pdf_hash, result, table_name)
+
+    result["cached"] = cached
+    return result
+
+
+def ingest_pdfs(pdf_paths, table_name, progress=None, batch_size=BATCH_SIZE, workers=PAGE_WORKERS):
+    """
+    Multi-file version of ingest_pdf for a tray of uploads. The pages of all
+    files share `workers` reader processes (or one prefetch thread) and are detected
+    batch_size at a time, and every new sample of every file is saved with a
+    single save_tables_to_db call at the end. progress, if given, is called
+    with the list of per-file status dicts (file, status, pages, samples,
+    rows, seconds) whenever one changes. Returns {pdf_path: result}, with
+    result None for a file that could not be opened.
+    """
+    started = time.perf_counter()
+    pdf_paths = list(dict.fromkeys(pdf_paths))  # Results are keyed by path; callers pass unique upload paths
+    files = {pdf_path: {"file": os.path.basename(pdf_path), "status": "queued", "pages": "",
+                        "samples": 0, "rows": 0, "seconds": None} for pdf_path in pdf_paths}
+
+    def update(pdf_path, **changes):
+        files[pdf_path].update(changes)
+        if progress is not None:
+            progress([dict(row) for row in files.values()])
+
+    with correlation_scope() as batch_correlation_id:
+        logger.info(f"Ingesting {len(pdf_paths)} PDFs (correlation ID {batch_correlation_id})")
+        results, hashes, page_counts, samples, tasks = {}, {}, {}, {}, []
+        correlation_ids = {pdf_path: new_correlation_id() for pdf_path in pdf_paths}
+        for pdf_path in pdf_paths:
+            try:
+                hashes[pdf_path] = hash_pdf_file(pdf_path)
+                cached = result_cache.get(hashes[pdf_path], table_name)
+                if cached is not None:
+                    results[pdf_path] = dict(cached, cached=True, correlation_id=correlation_ids[pdf_path])
+                    samples[pdf_path] = cached["samples"]
+                    update(pdf_path, status="cached", samples=cached["sample_count"])
+                    continue
+                with _fitz_lock, fitz.open(pdf_path) as doc:
+                    page_counts[pdf_path] = doc.page_count
+            except Exception as e:
+                logger.error(f"Error opening {pdf_path}: {e}")
+                results[pdf_path] = None
+                update(pdf_path, status="failed")
+                continue
+            tasks += _page_tasks(pdf_path, page_counts[pdf_path], correlation_ids[pdf_path])
+            samples[pdf_path] = []
+            update(pdf_path, status="processing", pages=f"0/{page_counts[pdf_path]}")
+
+        pages_done = dict.fromkeys(page_counts, 0)
+        for (pdf_path, _, _), result in _read_pages(tasks, batch_size, workers):
+            if result is not None and _keep_page(result, page_counts[pdf_path], pdf_path):
+                samples[pdf_path].append(result)
+            pages_done[pdf_path] += 1
+            changes = {"pages": f"{pages_done[pdf_path]}/{page_counts[pdf_path]}"}
+            if pages_done[pdf_path] == page_counts[pdf_path]:
+                changes.update(status="extracted", samples=len(samples[pdf_path]),
+                               seconds=round(time.perf_counter() - started, 1))
+            update(pdf_path, **changes)
+
+        # Results of the processed files, sorted back into page order
+        for pdf_path in page_counts:
+            file_samples = sorted(samples[pdf_path], key=lambda sample: sample["page_number"]) or [_empty_result()]
+            samples[pdf_path] = file_samples
+            results[pdf_path] = dict(file_samples[0], sample_count=len(file_samples), samples=file_samples,
+                                     table_saved=False, cached=False, correlation_id=correlation_ids[pdf_path])
+
+        # One transaction for every file that has unsaved rows
+        valid = {pdf_path: _valid_samples(result, samples[pdf_path])
+                 for pdf_path, result in results.items() if result is not None}
+        to_save = [pdf_path for pdf_path, rows in valid.items() if rows and not results[pdf_path]["table_saved"]]
+        saved = bool(to_save) and save_tables_to_db(
+            [row for pdf_path in to_save for row in _sample_rows(valid[pdf_path])], table_name)
+
+        for pdf_path, result in results.items():
+            if result is None:
+                continue
+            if pdf_path in to_save:
+                result["table_saved"] = saved
+                update(pdf_path, status="saved" if saved else "save failed", rows=result["row_count"])
+            elif not result["data_is_valid"]:
+                update(pdf_path, status="no data")
+            else:
+                update(pdf_path, rows=result["row_count"])
+            if pdf_path in to_save or not result["cached"]:
+                result_cache.put(hashes[pdf_path], result, table_name)
+
+        logger.info(f"Ingested {len(pdf_paths)} PDFs in {time.perf_counter() - started:.1f}s "
+                    f"({len(to_save)} saved {'successfully' if saved else 'with errors'})")
+    return results
+
+
+def _empty_result():
+    """Result for a PDF without any readable page."""
+    return {"peaks": [], "sample_id": NOT_FOUND, "report_generated": NOT_FOUND, "figure_path": None,
+            "trace_path": None, "page_number": None, "correlation_id": get_correlation_id()}
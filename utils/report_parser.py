@@ -0,0 +1,193 @@
+# utils/report_parser.py
+#
+# Single-pass parser for Variant Turbo II report pages built on PyMuPDF word
+# coordinates. Words are grouped into visual lines; one walk over the lines
+# picks up the Sample ID and Report Generated fields and the peak table,
+# assigning each table cell to the column whose header sits above it. Values
+# are converted to numbers while parsing and kept in small slotted records;
+# pandas is only needed where a table is shown (peaks_to_frame).
+
+import re
+from datetime import datetime
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+PEAK_NAMES = frozenset(config["parser"]["peaks"])
+
+SAMPLE_ID_PATTERN = re.compile(r"Sample\s*ID\s*:\s*(\d+)")
+REPORT_GENERATED_PATTERN = re.compile(r"Report\s*Generated\s*:\s*([\d/]+\s*[\d:]+)")
+NOT_FOUND = "Not found"
+# "Report Generated" is printed day first (05/03/2024 10:15 is 5 March)
+REPORT_DATE_FORMATS = ("%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+
+# Words whose vertical centres are this close (points) are on the same line
+LINE_TOLERANCE = 3.0
+# A horizontal gap wider than this (points) separates two header cells
+CELL_GAP = 8.0
+
+# Column titles as printed, in the order of PeakRecord's value fields
+TABLE_COLUMNS = ["Peak Name", "NGSP %", "Area %", "Retention Time (min)", "Peak Area"]
+
+
+def parse_report_date(value):
+    """
+    Report date as a datetime, or None if it cannot be read. Accepts
+    datetimes (rows read back from a database), the report's day-first text
+    and ISO text; a date is never guessed month-first.
+    """
+    if isinstance(value, datetime):
+        return value if value == value else None  # NaT is a datetime that is not equal to itself
+    if not isinstance(value, str):
+        return None
+    text = " ".join(value.split())
+    for date_format in REPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+class PeakRecord:
+    """One row of the peak table. Missing values ("---" or blank) are None."""
+
+    __slots__ = ("name", "ngsp", "area_percent", "retention_time", "peak_area")
+
+    def __init__(self, name, ngsp=None, area_percent=None, retention_time=None, peak_area=None):
+        self.name = name
+        self.ngsp = ngsp
+        self.area_percent = area_percent
+        self.retention_time = retention_time
+        self.peak_area = peak_area
+
+    def as_tuple(self):
+        return self.name, self.ngsp, self.area_percent, self.retention_time, self.peak_area
+
+    def __repr__(self):
+        return f"PeakRecord{self.as_tuple()}"
+
+
+class ReportRecord:
+    """Header fields and peaks of one report page. peaks is empty when no table was found."""
+
+    __slots__ = ("sample_id", "report_generated", "peaks")
+
+    def __init__(self, sample_id=NOT_FOUND, report_generated=NOT_FOUND, peaks=None):
+        self.sample_id = sample_id
+        self.report_generated = report_generated
+        self.peaks = peaks if peaks is not None else []
+
+
+def _number(word):
+    """Float value of a table cell, or None for "---", blanks and anything non-numeric."""
+    try:
+        return float(word.replace(",", ""))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _lines(words):
+    """Groups PyMuPDF words (x0, y0, x1, y1, text, ...) into visual lines, top to bottom, each sorted left to right."""
+    lines, current, current_center = [], [], None
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        center = (word[1] + word[3]) / 2
+        if current and center - current_center > LINE_TOLERANCE:
+            lines.append(sorted(current, key=lambda w: w[0]))
+            current = []
+        if not current:
+            current_center = center
+        current.append(word)
+    if current:
+        lines.append(sorted(current, key=lambda w: w[0]))
+    return lines
+
+
+def _header_cells(line):
+    """Splits the table header line into cells at wide gaps. Returns [(x0, x1), ...]."""
+    cells = [[line[0][0], line[0][2]]]
+    for word in line[1:]:
+        if word[0] - cells[-1][1] > CELL_GAP:
+            cells.append([word[0], word[2]])
+        else:
+            cells[-1][1] = word[2]
+    return [tuple(cell) for cell in cells]
+
+
+def _nearest_column(word, columns):
+    """Index of the header cell whose centre is closest to the word's centre."""
+    center = (word[0] + word[2]) / 2
+    return min(range(len(columns)), key=lambda i: abs(center - (columns[i][0] + columns[i][1]) / 2))
+
+
+def parse_words(words):
+    """Parses a report page from page.get_text("words") in one pass. Returns a ReportRecord."""
+    record = ReportRecord()
+    value_columns = None
+
+    for line in _lines(words):
+        tokens = [word[4] for word in line]
+        first = tokens[0]
+
+        if first in PEAK_NAMES and len(tokens) > 1:
+            values = [None] * 4
+            cells = line[1:]
+            if value_columns is not None and len(value_columns) == 4:
+                # Positional: each cell goes under the header it is aligned with, so blank cells are harmless
+                assigned = set()
+                for cell in cells:
+                    column = _nearest_column(cell, value_columns)
+                    if column in assigned:
+                        logger.warning(f"Peak {first}: more than one value under '{TABLE_COLUMNS[column + 1]}', "
+                                       f"keeping the first: {' '.join(tokens)}")
+                        continue
+                    assigned.add(column)
+                    values[column] = _number(cell[4])
+            elif len(cells) == 4:
+                values = [_number(cell[4]) for cell in cells]
+            else:
+                logger.warning(f"Skipping peak row with {len(cells)} values: {' '.join(tokens)}")
+                continue
+            record.peaks.append(PeakRecord(first, *values))
+            continue
+
+        text = " ".join(tokens)
+        if first == "Peak" and len(tokens) > 1 and tokens[1] == "Name":
+            value_columns = _header_cells(line)[1:]
+        elif record.sample_id == NOT_FOUND and (match := SAMPLE_ID_PATTERN.search(text)):
+            record.sample_id = match.group(1)
+        elif record.report_generated == NOT_FOUND and (match := REPORT_GENERATED_PATTERN.search(text)):
+            record.report_generated = match.group(1)
+
+    if record.sample_id == NOT_FOUND:
+        logger.warning("Sample ID not found.")
+    if record.report_generated == NOT_FOUND:
+        logger.warning("Report Generated Date not found.")
+    if not record.peaks:
+        logger.warning("No table data found.")
+    return record
+
+
+def peaks_to_frame(peaks):
+    """DataFrame of peak records with the report's column titles, for display."""
+    import pandas as pd
+
+    return pd.DataFrame([peak.as_tuple() for peak in peaks], columns=TABLE_COLUMNS)
+
+
+def peaks_from_frame(df):
+    """PeakRecords from a table in the extract_table_from_text layout (strings, "---" for missing)."""
+    return [
+        PeakRecord(row[0], *(_number(value) if isinstance(value, str) else _float_or_none(value) for value in row[1:5]))
+        for row in df[TABLE_COLUMNS].itertuples(index=False, name=None)
+    ]
+
+
+def _float_or_none(value):
+    # NaN (from a numeric frame) is missing too
+    return None if value is None or value != value else float(value)
@@ -0,0 +1,185 @@
+# utils/result_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from config import read_config
+from utils.report_parser import PeakRecord
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+CACHE_CONFIG = config["cache"]
+# Index file name; a new one is used whenever the payload format changes
+INDEX_FILE = "results-v2.sqlite"
+
+
+def hash_pdf_file(pdf_path, chunk_size=1024 * 1024):
+    """Content address of a report: SHA-256 of the PDF on disk, read in chunks."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_sample(sample):
+    return {
+        "peaks": [peak.as_tuple() for peak in sample["peaks"]],
+        "sample_id": sample["sample_id"],
+        "report_generated": sample["report_generated"],
+        "figure_path": sample["figure_path"],
+        "trace_path": sample.get("trace_path"),
+        "page_number": sample.get("page_number"),
+    }
+
+
+def _decode_sample(payload):
+    payload["peaks"] = [PeakRecord(*row) for row in payload["peaks"]]
+    for key in ("figure_path", "trace_path"):
+        if payload.get(key) and not os.path.exists(payload[key]):
+            payload[key] = None
+    return payload
+
+
+def encode_result(result, extra_keys=()):
+    """
+    JSON for a pipeline result dict; peaks are stored as [name, ngsp, area %,
+    retention time, peak area] rows. The top-level fields describe the first
+    sample; "samples" holds every sample of a multi-sample export.
+    """
+    payload = _encode_sample(result)
+    payload["table_saved"] = bool(result.get("table_saved", False))
+    payload["sample_count"] = result["sample_count"]
+    payload["samples"] = [_encode_sample(sample) for sample in result["samples"]]
+    for key in extra_keys:
+        payload[key] = result.get(key)
+    return json.dumps(payload)
+
+
+def decode_result(encoded):
+    """Inverse of encode_result. Figure/trace paths whose files are gone become None."""
+    payload = json.loads(encoded)
+    payload["samples"] = [_decode_sample(sample) for sample in payload["samples"]]
+    return _decode_sample(payload)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of pipeline results, keyed by the PDF hash.
+    Entries hold the parsed table, sample ID, report date and figure path;
+    whether the rows were committed is recorded per results table, so the
+    same PDF ingested into another table is still saved there. The index is
+    a small SQLite file so it is shared safely between worker processes.
+    """
+
+    def __init__(self, cache_dir, max_mb=256.0, max_age_days=30.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    pdf_hash TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS saved (pdf_hash TEXT NOT NULL, table_name TEXT NOT NULL, "
+                         "PRIMARY KEY (pdf_hash, table_name))")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:  # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, pdf_hash, table_name):
+        """
+        Returns the cached result dict for a hash, or None on a miss or an
+        expired entry. Its "table_saved" says whether the rows are in table_name.
+        """
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload, created_at FROM results WHERE pdf_hash = ?", (pdf_hash,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.max_age_seconds:
+                    self._delete(conn, pdf_hash)
+                    return None
+                conn.execute("UPDATE results SET accessed_at = ? WHERE pdf_hash = ?", (now, pdf_hash))
+                saved = conn.execute("SELECT 1 FROM saved WHERE pdf_hash = ? AND table_name = ?",
+                                     (pdf_hash, table_name)).fetchone() is not None
+        except sqlite3.Error as e:
+            logger.error(f"Result cache lookup failed: {e}")
+            return None
+
+        logger.info(f"Result cache hit: {pdf_hash[:12]}")
+        result = decode_result(row[0])
+        result["table_saved"] = saved
+        return result
+
+    def put(self, pdf_hash, result, table_name):
+        """
+        Stores a result dict (peaks, sample_id, report_generated, figure_path,
+        trace_path) and, if result["table_saved"], that its rows are in table_name.
+        """
+        encoded = encode_result(result)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (pdf_hash, payload, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (pdf_hash, encoded, len(encoded), now, now),
+                )
+                if result.get("table_saved"):
+                    conn.execute("INSERT OR IGNORE INTO saved (pdf_hash, table_name) VALUES (?, ?)",
+                                 (pdf_hash, table_name))
+            self.evict()
+        except sqlite3.Error as e:
+            logger.error(f"Result cache write failed: {e}")
+
+    @staticmethod
+    def _delete(conn, pdf_hash):
+        conn.execute("DELETE FROM results WHERE pdf_hash = ?", (pdf_hash,))
+        conn.execute("DELETE FROM saved WHERE pdf_hash = ?", (pdf_hash,))
+
+    def evict(self):
+        """Drops entries older than max_age, then least recently used entries until under max_bytes."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            conn.execute("DELETE FROM saved WHERE pdf_hash NOT IN (SELECT pdf_hash FROM results)")
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = 0
+            for pdf_hash, size in conn.execute(
+                    "SELECT pdf_hash, size FROM results ORDER BY accessed_at ASC").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._delete(conn, pdf_hash)
+                total -= size
+                evicted += 1
+            logger.info(f"Result cache evicted {evicted} entries")
+
+
+# Shared cache instance
+result_cache = ResultCache(CACHE_CONFIG["cache_dir"], CACHE_CONFIG["max_mb"], CACHE_CONFIG["max_age_days"])
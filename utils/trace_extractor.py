@@ -0,0 +1,149 @@
+# utils/trace_extractor.py
+
+import os
+import re
+
+import cv2
+import numpy as np
+
+from config import read_config
+from utils.logger import app_logger as logger
+
+# Load configuration
+config = read_config()
+TRACE_DIR = config["paths"]["trace_dir"]
+
+NUMBER_PATTERN = re.compile(r"^-?\d+(\.\d+)?$")
+# How far outside the axes tick labels are looked for (PDF points)
+TICK_MARGIN = 30
+# Raster fallback: gray level below which a pixel is "ink", and the share of a row/column that makes it an axis
+INK_THRESHOLD = 160
+AXIS_FILL_RATIO = 0.6
+
+
+def _polyline_points(drawing):
+    """Start point of the first segment followed by the end point of every line/curve segment."""
+    segments = [item for item in drawing["items"] if item[0] in ("l", "c")]
+    if not segments:
+        return []
+    return [segments[0][1]] + [item[-1] for item in segments]
+
+
+def _axis_calibration(ticks):
+    """Least-squares (scale, offset) from [(position, value), ...], or None with fewer than two distinct ticks."""
+    if len({value for _, value in ticks}) < 2:
+        return None
+    positions, values = zip(*ticks)
+    scale, offset = np.polyfit(positions, values, 1)
+    return scale, offset
+
+
+def _tick_labels(page, plot_rect):
+    """Numeric words just below the x axis and just left of the y axis, as (center, value) pairs."""
+    x_ticks, y_ticks = [], []
+    for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+        if not NUMBER_PATTERN.match(word):
+            continue
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        if plot_rect.x0 <= center_x <= plot_rect.x1 and plot_rect.y1 <= y0 <= plot_rect.y1 + TICK_MARGIN:
+            x_ticks.append((center_x, float(word)))
+        elif plot_rect.y0 <= center_y <= plot_rect.y1 and plot_rect.x0 - TICK_MARGIN <= x1 <= plot_rect.x0:
+            y_ticks.append((center_y, float(word)))
+    return x_ticks, y_ticks
+
+
+def extract_trace_from_drawings(page, plot_rect, drawings=None):
+    """
+    Recovers the chromatogram polyline from the page's vector paths.
+    Returns a float32 array of shape (2, N): retention time (min) and
+    absorbance. Axes without numeric tick labels are returned as 0..1
+    fractions of the plot area instead. None if no trace path is found.
+    """
+    candidates = [
+        drawing for drawing in (drawings if drawings is not None else page.get_drawings())
+        if plot_rect.intersects(drawing["rect"])
+    ]
+    if not candidates:
+        return None
+
+    # The trace is the path with the most segments inside the plot
+    points = max((_polyline_points(drawing) for drawing in candidates), key=len)
+    if len(points) < 10:
+        return None
+
+    xs = np.array([point.x for point in points], dtype=np.float64)
+    ys = np.array([point.y for point in points], dtype=np.float64)
+    order = np.argsort(xs, kind="stable")
+    xs, ys = xs[order], ys[order]
+
+    x_ticks, y_ticks = _tick_labels(page, plot_rect)
+    x_calibration = _axis_calibration(x_ticks)
+    y_calibration = _axis_calibration(y_ticks)
+
+    if x_calibration:
+        times = xs * x_calibration[0] + x_calibration[1]
+    else:
+        logger.warning("No retention time ticks found; storing the trace x axis as a plot fraction.")
+        times = (xs - plot_rect.x0) / max(plot_rect.width, 1e-6)
+
+    if y_calibration:
+        signal = ys * y_calibration[0] + y_calibration[1]
+    else:
+        # PDF y grows downwards: the baseline is the bottom of the plot
+        signal = (plot_rect.y1 - ys) / max(plot_rect.height, 1e-6)
+
+    return np.vstack([times, signal]).astype(np.float32)
+
+
+def extract_trace_from_image(crop):
+    """
+    Raster fallback: traces the darkest curve column by column in an RGB
+    figure crop, following the row closest to the previous column.
+    Returns a float32 array (2, N) of 0..1 plot fractions, or None.
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    ink = gray < INK_THRESHOLD
+    height, width = ink.shape
+    if height == 0 or width == 0:
+        return None
+
+    # Axes and gridlines are (almost) fully inked rows/columns
+    ink[ink.mean(axis=1) > AXIS_FILL_RATIO, :] = False
+    ink[:, ink.mean(axis=0) > AXIS_FILL_RATIO] = False
+
+    columns, rows = [], []
+    previous_row = None
+    for column in range(width):
+        candidates = np.flatnonzero(ink[:, column])
+        if candidates.size == 0:
+            continue
+        if previous_row is None:
+            row = candidates[-1]  # Start on the baseline
+        else:
+            row = candidates[np.argmin(np.abs(candidates - previous_row))]
+        columns.append(column)
+        rows.append(row)
+        previous_row = row
+
+    if len(columns) < 10:
+        return None
+
+    times = np.asarray(columns, dtype=np.float64) / max(width - 1, 1)
+    signal = (height - 1 - np.asarray(rows, dtype=np.float64)) / max(height - 1, 1)
+    return np.vstack([times, signal]).astype(np.float32)
+
+
+def save_trace(trace, name):
+    """Saves a (2, N) float32 trace as <TRACE_DIR>/<name>.npy and returns its path."""
+    trace_path = os.path.join(TRACE_DIR, f"{name}.npy")
+    np.save(trace_path, np.ascontiguousarray(trace, dtype=np.float32))
+    logger.info(f"Chromatogram trace saved at {trace_path} ({trace.shape[1]} points)")
+    return trace_path
+
+
+def load_trace(name, mmap=True):
+    """Loads a stored trace; memory-mapped by default so thousands of runs can be scanned cheaply."""
+    trace_path = os.path.join(TRACE_DIR, f"{name}.npy")
+    if not os.path.exists(trace_path):
+        return None
+    return np.load(trace_path, mmap_mode="r" if mmap else None)
@@ -1,54 +1,67 @@
 # utils/utis.py
 
-import os
 import cv2
-from utils.model import load_model
+from utils.model import get_model
+from utils.image_store import image_store, FIGURE
 from config import read_config
 from utils.logger import app_logger as logger
 
 # Load configuration
 config = read_config()
-model = load_model()
 
-IMAGE_DIR = config["paths"]["image_dir"]
+BATCH_SIZE = config["detection"]["batch_size"]
+PAGE_WORKERS = config["detection"]["page_workers"]
+# Left padding of a detected figure: 50 px at the original 200 DPI render
+LEFT_PADDING_POINTS = 18
 
-def save_figure(image_name):
-    """Detects and extracts the first figure from the image."""
-    
-    # Construct full image path using IMAGE_DIR
-    image_path = os.path.join(IMAGE_DIR, image_name)
 
-    if not os.path.exists(image_path):
-        logger.error(f"Image not found at {image_path}")
-        raise FileNotFoundError(f"Image not found at {image_path}")
+def _first_figure_box(layout, left_padding=50):
+    """Picks the first "Figure" block of a layout and applies the usual left padding (pixels)."""
+    first_figure = next((element for element in layout if element.type == "Figure"), None)
 
-    logger.info(f"Processing image: {image_path}")
-    image = cv2.imread(image_path)
-
-    if model is None:
-        logger.error("Model is not loaded. Cannot process image.")
+    if first_figure is None:
         return None
 
-    try:
-        layout = model.detect(image)
-        first_figure = next((element for element in layout if element.type == "Figure"), None)
+    x1, y1, x2, y2 = map(int, first_figure.coordinates)
+    x1 = max(0, x1 - left_padding)  # Adjust x1
+    return x1, y1, x2, y2
+
+
+def _detect_layouts(model, bgr_images):
+    """
+    Runs the layout model over a list of BGR images with the configured
+    inference backend (see utils.inference) when the layoutparser model wraps
+    a Detectron2 DefaultPredictor; otherwise falls back to one detect() per image.
+    """
+    from utils.inference import get_predictor, predict  # torch is loaded with the model anyway
 
-        if first_figure:
-            x1, y1, x2, y2 = map(int, first_figure.coordinates)
-            x1 = max(0, x1 - 50)  # Adjust x1
+    if get_predictor(model) is None:
+        return [model.detect(image) for image in bgr_images]
+    return [model.gather_output(output) for output in predict(model, bgr_images)]
 
-            cropped_figure = image[y1:y2, x1:x2]
 
-            # Save cropped figure back to IMAGE_DIR
-            figure_path = os.path.join(IMAGE_DIR, image_name.replace(".jpg", "_graph.jpg"))
-            cv2.imwrite(figure_path, cropped_figure[..., ::-1])
+def detect_figure_boxes(images, batch_size=BATCH_SIZE, dpi=200):
+    """
+    Returns the first figure box (x1, y1, x2, y2) or None for each RGB page
+    image rendered at dpi, batch_size pages per forward pass.
+    """
+
+    model = get_model()
+    if model is None:
+        logger.error("Model is not loaded. Cannot process image.")
+        return [None] * len(images)
+
+    boxes = []
+    for start in range(0, len(images), max(1, batch_size)):
+        # The model has always been fed BGR frames (cv2.imread)
+        batch = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for image in images[start:start + batch_size]]
+        boxes.extend(_first_figure_box(layout, round(LEFT_PADDING_POINTS * dpi / 72))
+                     for layout in _detect_layouts(model, batch))
+    return boxes
 
-            logger.info(f"Figure extracted and saved at {figure_path}")
-            return figure_path
-        else:
-            logger.warning(f"No figure detected in image: {image_path}")
 
-    except Exception as e:
-        logger.error(f"Error processing image {image_name}: {e}")
-    
-    return None
+def save_figure_crop(cropped_figure, name, sample_id=None):
+    """Saves an RGB figure crop (and its thumbnail) in the image store and returns its path."""
+    figure_path = image_store.put(cropped_figure, FIGURE, sample_id, name)
+    logger.info(f"Figure extracted and saved at {figure_path}")
+    return figure_path
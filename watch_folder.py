@@ -0,0 +1,266 @@
+# watch_folder.py
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_ingest import init_worker, ingest_file
+from config import read_config
+from utils.logger import app_logger as logger
+
+# inotify (via watchdog) is optional; without it the folder is polled
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+# Load config
+config = read_config()
+TABLE_NAME = config["database"]["table_name"]
+UPLOAD_DIR = config["paths"]["upload_dir"]
+WATCH_CONFIG = config["watch"]
+
+# Statuses that mean "never pick this file up again"
+DONE_STATUSES = ("ok", "skipped")
+
+
+class _PdfEventHandler(FileSystemEventHandler):
+    """Forwards created/modified/moved PDF paths to the watcher."""
+
+    def __init__(self, notify):
+        self.notify = notify
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        path = getattr(event, "dest_path", None) or event.src_path
+        if path.lower().endswith(".pdf"):
+            self.notify(os.path.abspath(path))
+
+
+class FolderWatcher:
+    """
+    Watches a folder for instrument exports and ingests each PDF once it has
+    stopped growing. Completed files are recorded in a JSON state file so a
+    restart does not reprocess the folder.
+    """
+
+    def __init__(self, watch_dir, state_file, workers=2, settle_seconds=2.0, poll_interval=1.0,
+                 timeout=120, table_name=TABLE_NAME, use_inotify=True):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.state_file = state_file
+        self.workers = max(1, workers)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.table_name = table_name
+        self.use_inotify = use_inotify and WATCHDOG_AVAILABLE
+
+        self.state = self._load_state()
+        self.candidates = {}   # path -> (size, mtime, time the size/mtime was last seen changing)
+        self.in_flight = {}    # future -> (path, size, mtime)
+        self.attempted = set()  # (path, size, mtime) already handed to a worker in this session
+        self.events = set()    # paths reported by inotify, drained by the main loop
+        self.events_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    # ---- State -------------------------------------------------------------
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read watch state {self.state_file}, starting fresh: {e}")
+            return {}
+
+    def _save_state(self):
+        # Write to a temp file first so a crash never leaves a truncated state file
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_file)
+
+    def _is_done(self, path, size, mtime):
+        if (path, size, mtime) in self.attempted:
+            return True
+        entry = self.state.get(path)
+        return (entry is not None and entry["status"] in DONE_STATUSES
+                and entry["size"] == size and entry["mtime"] == mtime)
+
+    # ---- Discovery ---------------------------------------------------------
+
+    def _notify(self, path):
+        with self.events_lock:
+            self.events.add(path)
+
+    def _scan(self):
+        """Lists every PDF currently in the folder."""
+        try:
+            with os.scandir(self.watch_dir) as entries:
+                return [os.path.abspath(entry.path) for entry in entries
+                        if entry.is_file() and entry.name.lower().endswith(".pdf")]
+        except OSError as e:
+            logger.error(f"Could not scan {self.watch_dir}: {e}")
+            return []
+
+    def _discover(self, full_scan):
+        if full_scan:
+            paths = self._scan()
+        else:
+            with self.events_lock:
+                paths, self.events = list(self.events), set()
+
+        busy = {path for path, _, _ in self.in_flight.values()}
+        now = time.monotonic()
+        for path in paths:
+            if path in busy:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.candidates.pop(path, None)  # Deleted or renamed before we got to it
+                continue
+            if self._is_done(path, stat.st_size, stat.st_mtime):
+                continue
+            previous = self.candidates.get(path)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+                self.candidates[path] = (stat.st_size, stat.st_mtime, now)
+
+    def _ready_candidates(self):
+        """Yields candidates whose size and mtime have not changed for settle_seconds."""
+        now = time.monotonic()
+        for path, (size, mtime, changed_at) in list(self.candidates.items()):
+            if now - changed_at < self.settle_seconds:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.candidates[path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.candidates[path] = (stat.st_size, stat.st_mtime, now)  # Still being written
+                continue
+            if size == 0:
+                continue
+            yield path, size, mtime
+
+    # ---- Processing --------------------------------------------------------
+
+    def _submit_ready(self, executor):
+        # Bounded queue: never keep more than 2x workers files in flight
+        for path, size, mtime in self._ready_candidates():
+            if len(self.in_flight) >= self.workers * 2:
+                break
+            del self.candidates[path]
+            self.attempted.add((path, size, mtime))
+            future = executor.submit(ingest_file, path, self.table_name, self.timeout, self.workers)
+            self.in_flight[future] = (path, size, mtime)
+            logger.info(f"Queued {path}")
+
+    def _collect_finished(self):
+        finished = [future for future in self.in_flight if future.done()]
+        for future in finished:
+            path, size, mtime = self.in_flight.pop(future)
+            try:
+                summary = future.result()
+            except Exception as e:  # Worker crashed
+                summary = {"status": "failed", "sample_id": None, "rows": 0, "error": str(e)}
+
+            if summary["status"] == "ok":
+                logger.info(f"Ingested {path}: sample {summary['sample_id']}, {summary['rows']} rows")
+            else:
+                logger.error(f"{summary['status']} for {path}: {summary['error']}")
+
+            # Failures are recorded too but are retried after a restart or a new write
+            self.state[path] = {
+                "status": summary["status"],
+                "size": size,
+                "mtime": mtime,
+                "sample_id": summary["sample_id"],
+                "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        if finished:
+            self._save_state()
+
+    def stop(self, *args):
+        logger.info("Stopping watcher...")
+        self.stop_event.set()
+
+    def run(self):
+        """Blocks until stop() is called (SIGINT/SIGTERM when run from the command line)."""
+        os.makedirs(self.watch_dir, exist_ok=True)
+
+        observer = None
+        if self.use_inotify:
+            observer = Observer()
+            observer.schedule(_PdfEventHandler(self._notify), self.watch_dir, recursive=False)
+            observer.start()
+            logger.info(f"Watching {self.watch_dir} (inotify)")
+        else:
+            logger.info(f"Watching {self.watch_dir} (polling every {self.poll_interval}s)")
+
+        # Pick up whatever arrived while the service was down
+        self._discover(full_scan=True)
+        # With inotify a full rescan is only a safety net for missed events
+        rescan_every = 60.0 if observer else self.poll_interval
+        last_scan = time.monotonic()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+                while not self.stop_event.is_set():
+                    full_scan = time.monotonic() - last_scan >= rescan_every
+                    self._discover(full_scan)
+                    if full_scan:
+                        last_scan = time.monotonic()
+                    self._collect_finished()
+                    self._submit_ready(executor)
+                    self.stop_event.wait(min(self.poll_interval, self.settle_seconds / 2 or self.poll_interval))
+
+                # Let in-flight files finish so their state is recorded
+                while self.in_flight:
+                    time.sleep(0.2)
+                    self._collect_finished()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch the instrument export folder and ingest new PDF reports.")
+    parser.add_argument("--dir", default=WATCH_CONFIG["export_dir"], help="Folder to watch (default [WATCH] EXPORT_DIR)")
+    parser.add_argument("--state-file", default=WATCH_CONFIG["state_file"], help="JSON file recording ingested files")
+    parser.add_argument("-w", "--workers", type=int, default=WATCH_CONFIG["workers"], help="Worker processes")
+    parser.add_argument("--settle", type=float, default=WATCH_CONFIG["settle_seconds"],
+                        help="Seconds a file must stay unchanged before it is processed")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_CONFIG["poll_interval"],
+                        help="Polling interval in seconds")
+    parser.add_argument("-t", "--timeout", type=int, default=120, help="Per-file timeout in seconds (0 disables)")
+    parser.add_argument("--poll", action="store_true", help="Force polling even if inotify is available")
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("no folder to watch: set [WATCH] EXPORT_DIR or pass --dir")
+    if os.path.abspath(args.dir) == os.path.abspath(UPLOAD_DIR):
+        parser.error("UPLOAD_DIR cannot be watched: the apps already queue the uploads saved there")
+
+    watcher = FolderWatcher(args.dir, args.state_file, args.workers, args.settle, args.poll_interval,
+                            args.timeout, use_inotify=not args.poll)
+    signal.signal(signal.SIGINT, watcher.stop)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())